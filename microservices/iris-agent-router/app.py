@@ -1,9 +1,41 @@
+import asyncio
+import json
+import time
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from core.agents.agent_router import iris_agent # Import the LangGraph agent
+from core import metrics
+# The LangGraph agent
+from core.agents.agent_router import conversation_agent, asummarize_conversation, acheck_admission
+from core.agents.checkpointer import thread_config, thread_lock
+from core.agents.deadline import DeadlineExceeded, new_deadline
+from core.agents.intent_classifier import intent_classifier
+from core.tools.embeddings import warm_up
+from core.tools.finance_tools import ASSET_PRELOAD, preload_assets, arecord_chat_turn
+from core.tools.http_client import close_async_clients
+from core.tools.llm_scheduler import SchedulerBusy
+from core.tools.ollama_pool import ollama_pool
 
-app = FastAPI(title="IRIS Agent Router", version="v1")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model and LanceDB handle once per process
+    warm_up()
+    # Build the intent centroids before the first request
+    intent_classifier.warm_up()
+    if ASSET_PRELOAD:
+        # Tradability checks on the ADVICE path then become cache hits
+        await asyncio.to_thread(preload_assets)
+    # Tracks backend health and loaded models for the Ollama pool
+    ollama_pool.start_health_checks()
+    yield
+    await ollama_pool.stop_health_checks()
+    await close_async_clients()
+
+app = FastAPI(title="IRIS Agent Router", version="v1", lifespan=lifespan)
 
 class ChatRequest(BaseModel):
     user_id: str
@@ -19,33 +51,112 @@ async def health_check():
         "status": "healthy",
         "service": "iris-agent-router"
     }
-    
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """In-process latency and counter metrics (JSON)."""
+    return metrics.snapshot()
+
+def build_initial_state(request: ChatRequest, timeout: float = None) -> dict:
+    """Turn input for the LangGraph agent.
+
+    Merged into the user's checkpointed thread: the new message is appended
+    and per-turn fields are reset, while pending_trade carries over. The
+    deadline bounds the whole turn (REQUEST_TIMEOUT, or the caller's shorter
+    X-Request-Timeout).
+    """
+    return {
+        "user_id": request.user_id,
+        "messages": [("human", request.prompt)],
+        "intent": "",
+        "tool_outputs": {},
+        "deadline": new_deadline(timeout)
+    }
+
 @app.post("/api/v1/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, background_tasks: BackgroundTasks,
+                        x_request_timeout: Optional[float] = Header(None)):
     """Endpoint for routing chat prompts through the LangGraph agent."""
     try:
-        # Initial State for the LangGraph agent
-        initial_state = {
-            "user_id": request.user_id,
-            "messages": [("human", request.prompt)],
-            "intent": "",
-            "tool_outputs": {}
-        }
-        
-        # Run the compiled LangGraph agent
-        final_state = iris_agent.invoke(initial_state)
-        
+        # Reject up front when the response model's queue is already full
+        await acheck_admission(request.user_id)
+        initial_state = build_initial_state(request, x_request_timeout)
+
+        # Run the compiled LangGraph agent (async path: never blocks the event loop);
+        # the thread state is checkpointed once, when the turn completes. Turns of
+        # one user run one at a time (and never interleave with a summary update).
+        async with thread_lock(request.user_id):
+            final_state = await conversation_agent.ainvoke(initial_state, thread_config(request.user_id),
+                                                           durability="exit")
+
         # Extract the final AI response
         final_msg_obj = final_state['messages'][-1]
         final_message = final_msg_obj.content if hasattr(final_msg_obj, 'content') else final_msg_obj[1]
-        
+        await arecord_chat_turn(request.user_id, request.prompt, final_message)
+        # Keeps the thread's prompt bounded; runs after the response is sent
+        background_tasks.add_task(asummarize_conversation, request.user_id)
+
         return ChatResponse(response=final_message)
-    
+
+    except SchedulerBusy as e:
+        raise HTTPException(status_code=503, detail="Agent is busy, please retry.",
+                            headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        print(f"Agent execution abandoned: {e}")
+        raise HTTPException(status_code=504, detail="Agent timed out.")
     except Exception as e:
         import traceback
         traceback.print_exc()
         print(f"Agent execution failed: {e}")
         raise HTTPException(status_code=500, detail=f"Internal Agent Error: {e}")
 
+async def stream_chat_events(request: ChatRequest, timeout: float = None):
+    """Runs the agent and yields NDJSON events: progress, token, done (or error)."""
+    start = time.perf_counter()
+    first_token = True
+    final_message = ""
+    try:
+        initial_state = build_initial_state(request, timeout)
+        async with thread_lock(request.user_id):
+            async for mode, chunk in conversation_agent.astream(initial_state, thread_config(request.user_id),
+                                                                stream_mode=["custom", "updates"], durability="exit"):
+                if mode == "custom":
+                    if chunk.get("event") == "token":
+                        if first_token:
+                            metrics.observe("chat.stream.time_to_first_token", time.perf_counter() - start)
+                            first_token = False
+                        final_message += chunk["text"]
+                    yield json.dumps(chunk) + "\n"
+                elif mode == "updates" and "classify" in chunk:
+                    intent = (chunk["classify"] or {}).get("intent", "")
+                    yield json.dumps({"event": "progress", "node": "classify", "message": f"intent: {intent}"}) + "\n"
+        metrics.observe("chat.stream.total", time.perf_counter() - start)
+        await arecord_chat_turn(request.user_id, request.prompt, final_message)
+        yield json.dumps({"event": "done", "response": final_message}) + "\n"
+    except SchedulerBusy as e:
+        yield json.dumps({"event": "error", "status": 503, "retry_after": e.retry_after,
+                          "detail": "Agent is busy, please retry."}) + "\n"
+    except DeadlineExceeded as e:
+        print(f"Agent stream abandoned: {e}")
+        yield json.dumps({"event": "error", "status": 504, "detail": "Agent timed out."}) + "\n"
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Agent stream failed: {e}")
+        yield json.dumps({"event": "error", "detail": f"Internal Agent Error: {e}"}) + "\n"
+
+@app.post("/api/v1/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, x_request_timeout: Optional[float] = Header(None)):
+    """Streams the agent's progress and response tokens as chunked NDJSON."""
+    try:
+        await acheck_admission(request.user_id)
+    except SchedulerBusy as e:
+        return JSONResponse(status_code=503, content={"detail": "Agent is busy, please retry."},
+                            headers={"Retry-After": str(e.retry_after)})
+    background_tasks = BackgroundTasks()
+    background_tasks.add_task(asummarize_conversation, request.user_id)
+    return StreamingResponse(stream_chat_events(request, x_request_timeout), media_type="application/x-ndjson",
+                             background=background_tasks)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,16 +1,89 @@
+import asyncio
 import os
+import re
 from typing import TypedDict, Annotated
+from langchain_core.runnables import RunnableLambda
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
-from langchain_ollama import OllamaLLM
+from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage, convert_to_messages
+from langchain_ollama import ChatOllama, OllamaLLM
 
 # Helper function imports (must be implemented in finance_tools.py)
-from core.tools.finance_tools import get_market_data, lookup_rag_context, execute_trade_action, get_portfolio_details, get_activity_log, get_past_conversations, get_current_price, build_user_context
+from core.tools.finance_tools import (get_market_data_batch, lookup_rag_context, execute_trade_action,
+                                      get_current_price, build_user_context_segments)
+from core.tools.finance_tools import (aget_market_data_batch, alookup_rag_context, aexecute_trade_action,
+                                      aget_current_price, abuild_user_context_segments)
+from core.tools.fanout import fan_out, afan_out
+from core.tools.llm_scheduler import llm_scheduler, priority_for, SchedulerBusy, BACKGROUND_PRIORITY
+from core.tools.ollama_pool import ollama_pool
+from core.tools import trade_orders
+from core import metrics
+from core.agents.context_assembler import assemble_context
+from core.agents import trade_extractor
+from core.agents.intent_classifier import intent_classifier
+from core.agents.context_planner import plan_context, is_follow_up, PROVIDERS, USER_CONTEXT_PARTS
+from core.tools.embeddings import embedding_service
+from core.tools.semantic_cache import response_cache, is_cacheable, market_snapshot
+from core.tools.finance_tools import asset_cache, asset_symbols
+from core.agents.checkpointer import checkpointer, CHECKPOINTS_ENABLED, thread_config, thread_lock
+from core.agents import conversation_summary
+from core.agents import deadline
+from core.agents.deadline import DeadlineExceeded
 
 # Ollama LLM setup using the K8s service DNS name
 OLLAMA_SERVICE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:14b")
-LLM = OllamaLLM(model=OLLAMA_MODEL, base_url=OLLAMA_SERVICE_URL)
+# Small model for the mechanical tasks (CPU-only nodes spend their cycles on the response)
+OLLAMA_SMALL_MODEL = os.getenv("OLLAMA_SMALL_MODEL", "qwen2.5:1.5b")
+# Model per LLM task. Intent classification uses MiniLM centroids (intent_classifier), not an LLM.
+TASK_MODELS = {
+    "response": os.getenv("OLLAMA_RESPONSE_MODEL", OLLAMA_MODEL),
+    "extraction": os.getenv("OLLAMA_EXTRACTION_MODEL", OLLAMA_SMALL_MODEL),
+    "summary": os.getenv("OLLAMA_SUMMARY_MODEL", OLLAMA_SMALL_MODEL),
+}
+# Keep the models (and their prompt KV caches) loaded between turns
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+def _response_llm(base_url: str):
+    # Responses use the chat endpoint so the stable prompt prefix is reused across turns
+    return ChatOllama(model=TASK_MODELS["response"], base_url=base_url, keep_alive=OLLAMA_KEEP_ALIVE)
+
+def _extraction_llm(base_url: str):
+    # Trade extraction: deterministic, JSON-constrained (schema passed per call) and capped in length
+    return OllamaLLM(model=TASK_MODELS["extraction"], base_url=base_url, format="json", temperature=0,
+                     num_predict=trade_extractor.EXTRACTION_NUM_PREDICT, keep_alive=OLLAMA_KEEP_ALIVE)
+
+def _summary_llm(base_url: str):
+    # Background conversation summaries: deterministic and capped in length
+    return OllamaLLM(model=TASK_MODELS["summary"], base_url=base_url, temperature=0,
+                     num_predict=conversation_summary.SUMMARY_NUM_PREDICT, keep_alive=OLLAMA_KEEP_ALIVE)
+
+LLM = _response_llm(OLLAMA_SERVICE_URL)
+EXTRACTION_LLM = _extraction_llm(OLLAMA_SERVICE_URL)
+SUMMARY_LLM = _summary_llm(OLLAMA_SERVICE_URL)
+
+# Clients of the primary backend (OLLAMA_BASE_URL) per task; clients for the
+# other backends of the Ollama pool are created on first use
+_primary_clients = {"response": LLM, "extraction": EXTRACTION_LLM, "summary": SUMMARY_LLM}
+_TASK_FACTORIES = {"response": _response_llm, "extraction": _extraction_llm, "summary": _summary_llm}
+_pool_clients = {}
+
+def _task_llm(task: str, base_url: str):
+    """The task's LLM client for an Ollama pool backend."""
+    if base_url == OLLAMA_SERVICE_URL.rstrip("/"):
+        return _primary_clients[task]
+    if (task, base_url) not in _pool_clients:
+        _pool_clients[(task, base_url)] = _TASK_FACTORIES[task](base_url)
+    return _pool_clients[(task, base_url)]
+
+# In-flight limits are per backend
+llm_scheduler.backends = len(ollama_pool.backends)
+
+# Per-provider timeout budgets (seconds) for the concurrent context fetch
+USER_CONTEXT_TIMEOUT = float(os.getenv("USER_CONTEXT_TIMEOUT", "6"))
+MARKET_DATA_TIMEOUT = float(os.getenv("MARKET_DATA_TIMEOUT", "6"))
+RAG_TIMEOUT = float(os.getenv("RAG_TIMEOUT", "3"))
 
 # 1. Define the Graph State
 # 1. Define the Graph State
@@ -21,6 +94,9 @@ class AgentState(TypedDict):
     tool_outputs: dict # Store results from tool calls
     next_step: str # Determining next action
     pending_trade: dict # For confirmation flow (None if no pending trade)
+    context_plan: list # Context providers this turn needs (see context_planner)
+    summary: str # Running summary of the turns folded out of messages (see conversation_summary)
+    deadline: float # Absolute end-to-end deadline of the turn, epoch seconds (see deadline.py)
 
 # Load Prompts
 import yaml
@@ -40,6 +116,20 @@ except Exception as e:
     }
 
 # 2. Define the Nodes (Functions)
+# Whole-word keyword rules: the confirmation flow and the fallback when the
+# embedding classifier is unavailable or not confident ('ok' must not match "book")
+_CONFIRM_RE = re.compile(r"\b(yes|yeah|yep|confirm|sure|do it|execute|ok|okay|go ahead)\b")
+_CANCEL_RE = re.compile(r"\b(no|nope|cancel|stop|don't|dont)\b")
+_TRADE_RE = re.compile(r"\b(buy|sell|invest|execute)\b")
+_ADVICE_RE = re.compile(r"\b(price|analy[sz]e|market|outlook|risk|goals?|portfolio|holdings)\b")
+
+def _keyword_intent(last_msg: str) -> str:
+    if _TRADE_RE.search(last_msg):
+        return "TRADE"
+    if _ADVICE_RE.search(last_msg):
+        return "ADVICE"
+    return "GENERAL_CHAT"
+
 def classify_intent(state: AgentState):
     """Classifies user intent."""
     last_msg_obj = state['messages'][-1]
@@ -49,62 +139,301 @@ def classify_intent(state: AgentState):
     # Check if we are waiting for confirmation
     pending = state.get('pending_trade')
     if pending:
-        # Simple confirmation check
-        if any(w in last_msg for w in ['yes', 'confirm', 'sure', 'do it', 'execute', 'ok']):
-            return {"intent": "CONFIRM_TRADE"}
-        elif any(w in last_msg for w in ['no', 'cancel', 'stop', 'don\'t']):
+        # Simple confirmation check; a negation wins ("no, don't do it", "ok cancel")
+        if _CANCEL_RE.search(last_msg):
             return {"intent": "CANCEL_TRADE", "pending_trade": None} # Clear pending
+        elif _CONFIRM_RE.search(last_msg):
+            return {"intent": "CONFIRM_TRADE"}
         else:
             # User might be asking a question or changing subject
             # Let's pivot, but maybe keep pending? Or clear it? 
             # Safer to clear it if conversation drifts.
             return {"intent": "GENERAL_CHAT", "pending_trade": None}
 
-    intent = "GENERAL_CHAT"
-    if 'buy' in last_msg or 'sell' in last_msg or 'invest' in last_msg or 'execute' in last_msg:
-        intent = 'TRADE'
-    elif 'price' in last_msg or 'analyze' in last_msg or 'market' in last_msg or 'outlook' in last_msg:
-        intent = 'ADVICE'
-    elif 'risk' in last_msg or 'goal' in last_msg or 'portfolio' in last_msg or 'holdings' in last_msg:
-        intent = 'ADVICE'
+    try:
+        intent = intent_classifier.classify(last_msg_text)
+    except Exception as e:
+        print(f"Intent classifier failed: {e}")
+        intent = None
+    if intent is None:
+        metrics.incr("intent.keywords")
+        intent = _keyword_intent(last_msg)
         
     return {"intent": intent}
 
+def _emit(event: dict):
+    try:
+        get_stream_writer()(event)
+    except (RuntimeError, KeyError):
+        # Node called directly (tests/scripts), not inside a graph run
+        pass
+
+def emit_progress(node: str, message: str):
+    """Emits a progress event on the custom stream (no-op outside a streamed run)."""
+    _emit({"event": "progress", "node": node, "message": message})
+
+def _last_message_text(state: AgentState) -> str:
+    last_msg_obj = state['messages'][-1]
+    return last_msg_obj.content if hasattr(last_msg_obj, 'content') else last_msg_obj[1]
+
+# Upper bound on tickers looked up per turn ("compare AAPL MSFT NVDA ...")
+MAX_CONTEXT_TICKERS = int(os.getenv("MAX_CONTEXT_TICKERS", "8"))
+
+def _is_listed(symbol: str) -> bool:
+    """Whether an upper-case word outside the built-in symbol dictionary is a tradable ticker."""
+    if asset_symbols:
+        # Preloaded asset table: words that are not listed ("CFO", "NYSE") are no tickers
+        return symbol in asset_symbols and asset_cache.peek(symbol) is not False
+    # Cached tradability: True/False, None for unknown symbols; not cached yet -> validated by the
+    # market fetch, which leaves unknown symbols out of the context
+    return asset_cache.peek(symbol, True) not in (False, None)
+
+def _mentioned_tickers(text: str) -> list:
+    """All tickers mentioned (symbols, cashtags and company names), validated against the asset table."""
+    tickers = [symbol for symbol, known in trade_extractor.find_symbols(text) if known or _is_listed(symbol)]
+    return tickers[:MAX_CONTEXT_TICKERS]
+
+def _extract_tickers(text: str) -> list:
+    return _mentioned_tickers(text) or ["SPY"]
+
+def plan_context_node(state: AgentState):
+    """Decides which context providers this turn needs, so cheap turns skip the I/O."""
+    text = _last_message_text(state)
+    plan = plan_context(state.get("intent", ""), text, ticker_mentioned=bool(_mentioned_tickers(text)))
+    metrics.incr(f"context_plan.{'+'.join(plan) or 'none'}")
+    return {"context_plan": plan}
+
+def _aggregate_context(state: AgentState, tickers: list, results: dict):
+    """Assembles the context block within the token budget; returns (context, token report)."""
+    segments = dict(results.get("user_context") or {})
+    segments["market"] = results.get("market_data", "")
+    segments["rag"] = results.get("rag", "")
+    return assemble_context(segments, intent=state.get("intent", "GENERAL_CHAT"), tickers=tickers)
+
+def _is_shared_turn(state: AgentState, text: str) -> bool:
+    """Generic questions are answered from shared context only, so the answer can be cached for all users.
+
+    Follow-ups are never shared: the answer is generated without the thread
+    and summary, which they need to make sense.
+    """
+    return (response_cache.enabled and is_cacheable(state.get("intent", ""), text, state.get("pending_trade"))
+            and not is_follow_up(text))
+
+def _turn_plan(state: AgentState, shared: bool) -> list:
+    plan = state.get("context_plan")
+    if plan is None:
+        plan = list(PROVIDERS) # Not planned (node called directly): fetch everything
+    if shared:
+        # No private context; the market snapshot keys the response cache
+        plan = [p for p in plan if p not in USER_CONTEXT_PARTS and p != "market"] + ["market"]
+    return plan
+
+def _skip_thread_history(state: AgentState, plan: list) -> list:
+    """Drops the gateway history fetch when the checkpointed thread already carries earlier messages.
+
+    They are in the prompt already.
+    """
+    if "history" in plan and len(state.get("messages", [])) > 1:
+        metrics.incr("context.history.thread")
+        return [p for p in plan if p != "history"]
+    return plan
+
+async def _aembed(text: str):
+    return await asyncio.to_thread(embedding_service.encode, text)
+
+def _context_tasks(user_id: str, tickers: list, text: str, plan: list, user_context_fn, market_data_fn, rag_fn,
+                   embed_fn=None, budget: float = None) -> dict:
+    """Fan-out task table for the planned context providers.
+
+    With `embed_fn` (shared turns) the question embedding for the response
+    cache lookup is fetched alongside. `budget` (the request's remaining
+    context budget) caps every provider's timeout.
+    """
+    def timeout(seconds):
+        return seconds if budget is None else min(seconds, budget)
+
+    tasks = {}
+    parts = tuple(p for p in USER_CONTEXT_PARTS if p in plan)
+    if parts:
+        tasks["user_context"] = (user_context_fn, (user_id, parts), timeout(USER_CONTEXT_TIMEOUT),
+                                 {"portfolio": "User context temporarily unavailable."})
+    if "market" in plan:
+        tasks["market_data"] = (market_data_fn, (tickers,), timeout(MARKET_DATA_TIMEOUT),
+                                f"Market data for {', '.join(tickers)} temporarily unavailable.")
+    if "rag" in plan:
+        tasks["rag"] = (rag_fn, (text,), timeout(RAG_TIMEOUT), "")
+    if embed_fn is not None:
+        tasks["embedding"] = (embed_fn, (text,), timeout(RAG_TIMEOUT), None)
+    return tasks
+
+def _context_skipped(budget) -> bool:
+    """True when the request has too little time left to fetch any context."""
+    if budget is not None and budget < deadline.MIN_CONTEXT_BUDGET:
+        metrics.incr("deadline.context_skipped")
+        return True
+    return False
+
+def _response_cache_outputs(state: AgentState, tickers: list, text: str, embedding, prices: list) -> dict:
+    """tool_outputs for a shared turn: the cached answer on a hit, else the key to store the new answer under."""
+    snapshots = [market_snapshot(t, p) for t, p in zip(tickers, prices)]
+    if embedding is None or None in snapshots:
+        metrics.incr("response_cache.bypass")
+        return {}
+    partition = f"{state['intent']}|{','.join(snapshots)}"
+    cached = response_cache.lookup(partition, embedding)
+    if cached is not None:
+        return {"cached_response": cached}
+    return {"response_cache": {"partition": partition, "query": text}}
+
+def _store_cached_response(state: AgentState, response_text: str):
+    key = state.get("tool_outputs", {}).get("response_cache")
+    if key and response_text:
+        try:
+            # Embedding is memoised from the lookup, so this does not re-run the model
+            response_cache.store(key["partition"], embedding_service.encode(key["query"]), response_text)
+        except Exception as e:
+            print(f"Response cache store failed: {e}")
+
 def fetch_financial_data(state: AgentState):
     """Fetches real-time market data and RAG context."""
     user_id = state.get("user_id", "test-user")
-    last_msg_obj = state['messages'][-1]
-    text = last_msg_obj.content if hasattr(last_msg_obj, 'content') else last_msg_obj[1]
+    text = _last_message_text(state)
+    shared = _is_shared_turn(state, text)
+    plan = _skip_thread_history(state, _turn_plan(state, shared))
+    budget = deadline.context_budget(state)
+    if _context_skipped(budget):
+        return {"tool_outputs": {}} # Out of time: answer without context
     
-    # 1. Extract potential Ticker (Naïve)
-    ticker = "SPY"
-    words = text.split()
-    for w in words:
-        w_clean = w.strip(".,?!")
-        if w_clean.isupper() and len(w_clean) <= 5 and w_clean.isalpha() and w_clean not in ["BUY", "SELL", "WHAT", "HOW", "WHY", "IS", "THE"]:
-            ticker = w_clean
-            break
-
-    # 2. Fetch Context
-    # Using the High-Speed Memory Store (Redis backed)
-    user_personal_context = build_user_context(user_id)
+    # 1. Extract every mentioned ticker (SPY when none)
+    tickers = _extract_tickers(text)
+
+    results, tool_outputs = {}, {}
+    if shared:
+        # Response cache first: the quotes (they key the partition) and the question embedding;
+        # a hit answers without the RAG search
+        results, _ = fan_out(_context_tasks(user_id, tickers, text, ["market"], build_user_context_segments,
+                                            get_market_data_batch, lookup_rag_context,
+                                            embed_fn=embedding_service.encode, budget=budget))
+        # Quotes are already in the quote cache from the market data fetch
+        prices = [get_current_price(t) for t in tickers]
+        tool_outputs = _response_cache_outputs(state, tickers, text, results["embedding"], prices)
+        if "cached_response" in tool_outputs:
+            return {"tool_outputs": tool_outputs}
+        plan = [p for p in plan if p != "market"]
+        budget = deadline.context_budget(state)
+
+    # 2. Fetch the planned context concurrently (each provider has its own budget and fallback)
+    # User context uses the High-Speed Memory Store (Redis backed); quotes are fetched in one batch
+    fetched, _ = fan_out(_context_tasks(user_id, tickers, text, plan, build_user_context_segments,
+                                        get_market_data_batch, lookup_rag_context, budget=budget))
+    results.update(fetched)
     
-    # Fetch dynamic data based on query
-    market_data = get_market_data(ticker) 
-    rag_context = lookup_rag_context(text)
+    # 3. Aggregate (ranked by intent/ticker relevance and trimmed to the token budget)
+    full_context, token_report = _aggregate_context(state, tickers, results)
+    tool_outputs.update({"context_data": full_context, "context_tokens": token_report})
+    return {"tool_outputs": tool_outputs}
+
+async def afetch_financial_data(state: AgentState):
+    """Async variant of fetch_financial_data."""
+    user_id = state.get("user_id", "test-user")
+    text = _last_message_text(state)
+    shared = _is_shared_turn(state, text)
+    plan = _skip_thread_history(state, _turn_plan(state, shared))
+    budget = deadline.context_budget(state)
+    if _context_skipped(budget):
+        emit_progress("fetch_data", "skipping context (deadline)")
+        return {"tool_outputs": {}}
+    tickers = _extract_tickers(text)
+
+    results, tool_outputs = {}, {}
+    if "market" in plan:
+        emit_progress("fetch_data", f"fetching market data for {', '.join(tickers)}")
+    if shared:
+        results, _ = await afan_out(_context_tasks(user_id, tickers, text, ["market"], abuild_user_context_segments,
+                                                   aget_market_data_batch, alookup_rag_context, embed_fn=_aembed,
+                                                   budget=budget))
+        prices = [await aget_current_price(t) for t in tickers]
+        tool_outputs = _response_cache_outputs(state, tickers, text, results["embedding"], prices)
+        if "cached_response" in tool_outputs:
+            return {"tool_outputs": tool_outputs}
+        plan = [p for p in plan if p != "market"]
+        budget = deadline.context_budget(state)
+
+    if any(p in plan for p in USER_CONTEXT_PARTS):
+        emit_progress("fetch_data", "fetching portfolio")
+    if "rag" in plan:
+        emit_progress("fetch_data", "searching knowledge")
+    fetched, _ = await afan_out(_context_tasks(user_id, tickers, text, plan, abuild_user_context_segments,
+                                               aget_market_data_batch, alookup_rag_context, budget=budget))
+    results.update(fetched)
+
+    full_context, token_report = _aggregate_context(state, tickers, results)
+    tool_outputs.update({"context_data": full_context, "context_tokens": token_report})
+    return {"tool_outputs": tool_outputs}
+
+def _confirmed_trade_result(pending: dict, raw_result: str, price: float) -> str:
+    total = price * pending['quantity']
+    return (f"{raw_result}\n"
+            f"Details: Symbol={pending['symbol']}, Action={pending['action']}, "
+            f"Quantity={pending['quantity']}, Stats='Executed', "
+            f"Price Approx=${price:.2f}, Total Est=${total:.2f}")
+
+def _parse_extraction(extraction_response: str):
+    """Parses the LLM extraction JSON into (ticker, action, quantity, amount), or None."""
+    extraction = trade_extractor.parse_llm_extraction(extraction_response)
+    if extraction is None:
+        return None
+    ticker = extraction.symbol
     
-    # 3. Aggregate
-    full_context = f"""
-    {user_personal_context}
+    # Resolution logic (same as before)
+    if not ticker:
+        # ... (Strategy logic omitted for brevity, keeping simple for this update) ...
+        ticker = "SPY" 
+    return ticker, extraction.action, extraction.quantity, extraction.amount
+
+def _rule_based_extraction(text: str):
+    """Deterministic extraction as ((ticker, action, quantity, amount), info), or None if not confident enough."""
+    # Tickers outside the built-in dictionary are trusted if the (preloaded) asset cache knows them
+    extraction = trade_extractor.extract_trade(text, is_tradable=lambda symbol: asset_cache.peek(symbol) is True)
+    if extraction["confidence"] < trade_extractor.MIN_CONFIDENCE:
+        metrics.incr("trade_extraction.low_confidence")
+        return None
+    metrics.incr("trade_extraction.rules")
+    parsed = (extraction["symbol"], extraction["action"], extraction["quantity"], extraction["amount"])
+    return parsed, {"source": "rules", "confidence": extraction["confidence"]}
+
+def _llm_extraction(extraction_response: str):
+    parsed = _parse_extraction(extraction_response)
+    if not parsed:
+        return None
+    metrics.incr("trade_extraction.llm")
+    return parsed, {"source": "llm", "confidence": None}
+
+def _proposed_trade(ticker: str, action: str, quantity: float, amount: float, price_est: float,
+                    extraction: dict = None):
+    """Builds the pending-trade state update that asks the user for confirmation."""
+    # INSTEAD OF EXECUTING, WE SET PENDING STATE
+    pending_trade = {
+        "id": trade_orders.new_trade_id(), # Identity of this proposal: confirming it twice places one order
+        "symbol": ticker,
+        "action": action,
+        "quantity": quantity,
+        "amount": amount
+    }
     
-    [Market Setup]
-    {market_data}
+    # We return a specific tool output that tells the LLM to ask for confirmation
+    total_est = price_est * quantity
     
-    [Knowledge Base]
-    {rag_context}
-    """
+    confirm_msg = (f"Use this data to ask for confirmation: Proposed Trade: {action.upper()} {quantity} shares of "
+                   f"{ticker} at approx ${price_est:.2f} (Total: ${total_est:.2f}).")
     
-    return {"tool_outputs": {"context_data": full_context}}
+    tool_outputs = {"trade_result": confirm_msg} # Hijacking trade_result to pass info for prompt
+    if extraction:
+        tool_outputs["extraction"] = extraction
+    return {
+        "pending_trade": pending_trade, 
+        "tool_outputs": tool_outputs
+    }
 
 def execute_trade_node(state: AgentState):
     """Parses intent. If pending, decodes confirmation. If new, asks for confirmation."""
@@ -114,46 +443,36 @@ def execute_trade_node(state: AgentState):
     if intent == "CONFIRM_TRADE":
         pending = state.get("pending_trade")
         if pending:
+             # No order the client will not hear about
+             deadline.check(state, "execute_trade")
              # Execute
-             raw_result = execute_trade_action(state.get("user_id", "test-user"), pending['symbol'], pending['action'], pending['quantity'], pending['amount'])
+             user_id = state.get("user_id", "test-user")
+             raw_result = execute_trade_action(user_id, pending['symbol'], pending['action'], pending['quantity'],
+                                               pending['amount'],
+                                               client_order_id=trade_orders.client_order_id(user_id, pending))
              
              # Calculate final details for the Prompt
              price = get_current_price(pending['symbol']) # Refetch or use stored estimate? Refetch for accuracy.
-             total = price * pending['quantity']
-             
-             rich_result = (f"{raw_result}\n"
-                            f"Details: Symbol={pending['symbol']}, Action={pending['action']}, "
-                            f"Quantity={pending['quantity']}, Stats='Executed', "
-                            f"Price Approx=${price:.2f}, Total Est=${total:.2f}")
+             rich_result = _confirmed_trade_result(pending, raw_result, price)
                             
              return {"tool_outputs": {"trade_result": rich_result}, "pending_trade": None} # Clear
         else:
              return {"tool_outputs": {"trade_result": "Error: No pending trade found to confirm."}}
 
     # CASE 2: New Trade Request -> Extract & Ask Confirmation
-    last_msg_obj = state['messages'][-1]
-    text = last_msg_obj.content if hasattr(last_msg_obj, 'content') else last_msg_obj[1]
-    
-    extraction_prompt = PROMPTS.get("extraction_template", "").format(user_input=text)
+    text = _last_message_text(state)
     
     try:
-        extraction_response = LLM.invoke(extraction_prompt)
-        import json
-        import re
-        
-        json_match = re.search(r'\{.*\}', extraction_response, re.DOTALL)
-        if json_match:
-            data = json.loads(json_match.group(0))
-            ticker = data.get("symbol")
-            action = data.get("action", "buy")
-            quantity = float(data.get("quantity", 0))
-            amount = float(data.get("amount", 0))
-            strategy = data.get("strategy", "")
-            
-            # Resolution logic (same as before)
-            if not ticker or ticker == "null":
-                # ... (Strategy logic omitted for brevity, keeping simple for this update) ...
-                ticker = "SPY" 
+        # Well-formed requests are parsed without a model round trip
+        extracted = _rule_based_extraction(text)
+        if extracted is None:
+            extraction_prompt = PROMPTS.get("extraction_template", "").format(user_input=text)
+            deadline.check(state, "extraction")
+            with metrics.timed("llm.extraction"):
+                extraction_response = EXTRACTION_LLM.invoke(extraction_prompt, format=trade_extractor.TRADE_SCHEMA)
+            extracted = _llm_extraction(extraction_response)
+        if extracted:
+            (ticker, action, quantity, amount), extraction = extracted
 
             if quantity == 0 and amount > 0:
                 price = get_current_price(ticker)
@@ -163,64 +482,191 @@ def execute_trade_node(state: AgentState):
             if quantity == 0:
                  quantity = 1 # Fallback
             
-            # INSTEAD OF EXECUTING, WE SET PENDING STATE
-            pending_trade = {
-                "symbol": ticker,
-                "action": action,
-                "quantity": quantity,
-                "amount": amount
-            }
+            return _proposed_trade(ticker, action, quantity, amount, get_current_price(ticker), extraction)
             
-            # We return a specific tool output that tells the LLM to ask for confirmation
-            price_est = get_current_price(ticker)
-            total_est = price_est * quantity
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Extraction failed: {e}")
+
+    return {"tool_outputs": {"trade_result": "Failed to understand trade details."}}
+
+async def aexecute_trade_node(state: AgentState):
+    """Async variant of execute_trade_node."""
+    intent = state.get("intent")
+    
+    if intent == "CONFIRM_TRADE":
+        pending = state.get("pending_trade")
+        if pending:
+             deadline.check(state, "execute_trade") # No order the client will not hear about
+             emit_progress("execute_trade", "submitting order")
+             user_id = state.get("user_id", "test-user")
+             raw_result = await aexecute_trade_action(user_id, pending['symbol'], pending['action'],
+                                                      pending['quantity'], pending['amount'],
+                                                      client_order_id=trade_orders.client_order_id(user_id, pending))
+             price = await aget_current_price(pending['symbol'])
+             rich_result = _confirmed_trade_result(pending, raw_result, price)
+             return {"tool_outputs": {"trade_result": rich_result}, "pending_trade": None}
+        else:
+             return {"tool_outputs": {"trade_result": "Error: No pending trade found to confirm."}}
+
+    text = _last_message_text(state)
+    
+    try:
+        emit_progress("execute_trade", "extracting trade details")
+        extracted = _rule_based_extraction(text)
+        if extracted is None:
+            extraction_prompt = PROMPTS.get("extraction_template", "").format(user_input=text)
+            async with deadline.within(state, "extraction"), \
+                    llm_scheduler.slot(TASK_MODELS["extraction"], priority_for("TRADE")):
+                with metrics.timed("llm.extraction"):
+                    extraction_response = await ollama_pool.run(
+                        TASK_MODELS["extraction"],
+                        lambda url: _task_llm("extraction", url).ainvoke(extraction_prompt,
+                                                                         format=trade_extractor.TRADE_SCHEMA),
+                        affinity=state.get("user_id"))
+            extracted = _llm_extraction(extraction_response)
+        if extracted:
+            (ticker, action, quantity, amount), extraction = extracted
+
+            emit_progress("execute_trade", f"fetching quote for {ticker}")
+            price_est = await aget_current_price(ticker)
+            if quantity == 0 and amount > 0 and price_est > 0:
+                quantity = round(amount / price_est, 4)
             
-            confirm_msg = f"Use this data to ask for confirmation: Proposed Trade: {action.upper()} {quantity} shares of {ticker} at approx ${price_est:.2f} (Total: ${total_est:.2f})."
+            if quantity == 0:
+                 quantity = 1 # Fallback
             
-            return {
-                "pending_trade": pending_trade, 
-                "tool_outputs": {"trade_result": confirm_msg} # Hijacking trade_result to pass info for prompt
-            }
+            return _proposed_trade(ticker, action, quantity, amount, price_est, extraction)
             
+    except (SchedulerBusy, DeadlineExceeded):
+        raise # Surface as 503 + Retry-After / 504
     except Exception as e:
         print(f"Extraction failed: {e}")
 
     return {"tool_outputs": {"trade_result": "Failed to understand trade details."}}
 
-def generate_response(state: AgentState):
-    """Generates the final response based on tool outputs."""
+def _build_response_messages(state: AgentState) -> list:
+    """Chat messages for the response, ordered from most to least stable.
+
+    The persona (identical for every turn) and the running summary come first,
+    then the thread's earlier turns verbatim; the per-turn context and trade
+    result are attached to the latest user message. Consecutive turns of a
+    conversation therefore share a long prompt prefix that Ollama can reuse
+    from its KV cache instead of re-prefilling it.
+    """
     tool_data = state.get("tool_outputs", {})
-    
     system_prompt = PROMPTS.get("system_persona", "You are IRIS.")
-    
+
+    messages = convert_to_messages(state['messages'])
+    if "response_cache" in tool_data:
+        messages = messages[-1:] # Shared answer: must not depend on the user's earlier turns
+    elif state.get("summary"):
+        prefix = PROMPTS.get("conversation_summary_prefix", "Earlier conversation: {summary}")
+        system_prompt += "\n\n" + prefix.format(summary=state["summary"])
+
+    turn_context = []
     if "context_data" in tool_data:
         prefix = PROMPTS.get("response_context_prefix", "Context:\n{context_data}")
-        system_prompt += "\n\n" + prefix.format(context_data=tool_data['context_data'])
-        
+        turn_context.append(prefix.format(context_data=tool_data['context_data']))
     if "trade_result" in tool_data:
         prefix = PROMPTS.get("trade_result_prefix", "Result: {trade_result}")
-        system_prompt += "\n\n" + prefix.format(trade_result=tool_data['trade_result'])
-        
-    formatted_msgs = [f"system: {system_prompt}"]
-    for msg in state['messages']:
-        if hasattr(msg, 'content'):
-            role = msg.type
-            content = msg.content
-        else:
-            role, content = msg
-        formatted_msgs.append(f"{role}: {content}")
-        
-    full_prompt = "\n".join(formatted_msgs)
-    response_text = LLM.invoke(full_prompt)
+        turn_context.append(prefix.format(trade_result=tool_data['trade_result']))
+
+    latest = messages[-1]
+    if turn_context:
+        latest = HumanMessage(content="\n\n".join(turn_context + [f"User request: {latest.content}"]))
+    return [SystemMessage(content=system_prompt)] + messages[:-1] + [latest]
+
+def _record_llm_timings(task: str, metadata: dict):
+    """Records Ollama's prefill/decode timings (nanoseconds in the response metadata) for an LLM task."""
+    if not metadata or "prompt_eval_duration" not in metadata:
+        return
+    metrics.observe(f"llm.{task}.prefill", metadata["prompt_eval_duration"] / 1e9)
+    metrics.observe(f"llm.{task}.decode", metadata.get("eval_duration", 0) / 1e9)
+    # Tokens actually prefilled: prompt tokens reused from the KV cache are not counted
+    metrics.incr(f"llm.{task}.prompt_eval_tokens", metadata.get("prompt_eval_count", 0))
+
+def _deadline_fallback(state: AgentState):
+    """Response when the deadline passes before generation: an executed order is still reported, anything else fails."""
+    if state.get("intent") == "CONFIRM_TRADE":
+        return state.get("tool_outputs", {}).get("trade_result")
+    return None
+
+def generate_response(state: AgentState):
+    """Generates the final response based on tool outputs."""
+    cached = state.get("tool_outputs", {}).get("cached_response")
+    if cached is not None:
+        return {"messages": [("ai", cached)]}
+
+    try:
+        deadline.check(state, "respond")
+    except DeadlineExceeded:
+        fallback = _deadline_fallback(state)
+        if fallback is None:
+            raise
+        return {"messages": [("ai", fallback)]}
+
+    with metrics.timed("llm.response"):
+        response = LLM.invoke(_build_response_messages(state))
+    _record_llm_timings("response", response.response_metadata)
+    response_text = response.content
+    _store_cached_response(state, response_text)
+    
+    return {"messages": [("ai", response_text)]}
+
+async def agenerate_response(state: AgentState):
+    """Async variant of generate_response.
+
+    Streams tokens from Ollama and forwards each one on the custom stream so
+    /api/v1/chat/stream can relay them as they are generated.
+    """
+    cached = state.get("tool_outputs", {}).get("cached_response")
+    if cached is not None:
+        emit_progress("respond", "answering from cache")
+        _emit({"event": "token", "text": cached})
+        return {"messages": [("ai", cached)]}
+
+    chunks = []
+    metadata = {}
+    try:
+        # Waits for a generation slot (confirmations ahead of small talk); both the
+        # wait and the generation are cancelled when the request deadline passes
+        async with deadline.within(state, "respond"), \
+                llm_scheduler.slot(TASK_MODELS["response"], priority_for(state.get("intent", ""))):
+            emit_progress("respond", "generating response")
+            messages = _build_response_messages(state)
+            stream = ollama_pool.stream(TASK_MODELS["response"],
+                                        lambda url: _task_llm("response", url).astream(messages),
+                                        affinity=state.get("user_id"))
+            async for chunk in stream:
+                metadata = chunk.response_metadata or metadata # Timings arrive with the final chunk
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    _emit({"event": "token", "text": chunk.content})
+    except DeadlineExceeded:
+        fallback = _deadline_fallback(state)
+        if fallback is None:
+            raise
+        if chunks:
+            fallback = "\n\n" + fallback # After the part already streamed
+        _emit({"event": "token", "text": fallback})
+        return {"messages": [("ai", "".join(chunks) + fallback)]}
+    _record_llm_timings("response", metadata)
+    response_text = "".join(chunks)
+    _store_cached_response(state, response_text)
     
     return {"messages": [("ai", response_text)]}
 
 # 3. Build the LangGraph
+# Each I/O node has a sync and an async implementation: iris_agent.invoke() runs
+# the sync path (used by tests/scripts), iris_agent.ainvoke() the non-blocking one.
 builder = StateGraph(AgentState)
 builder.add_node("classify", classify_intent)
-builder.add_node("fetch_data", fetch_financial_data)
-builder.add_node("execute_trade", execute_trade_node)
-builder.add_node("respond", generate_response)
+builder.add_node("plan", plan_context_node)
+builder.add_node("fetch_data", RunnableLambda(fetch_financial_data, afunc=afetch_financial_data, name="fetch_data"))
+builder.add_node("execute_trade", RunnableLambda(execute_trade_node, afunc=aexecute_trade_node, name="execute_trade"))
+builder.add_node("respond", RunnableLambda(generate_response, afunc=agenerate_response, name="respond"))
 
 builder.set_entry_point("classify")
 
@@ -228,13 +674,14 @@ def router(state):
     intent = state['intent']
     if intent == 'TRADE' or intent == 'CONFIRM_TRADE':
         return "execute_trade"
-    elif intent == 'ADVICE':
-        return "fetch_data"
+    elif state.get('context_plan') == []:
+        return "respond" # Nothing to fetch (small talk, cancellations)
     else:
         return "fetch_data"
 
+builder.add_edge("classify", "plan")
 builder.add_conditional_edges(
-    "classify",
+    "plan",
     router,
     {
         "execute_trade": "execute_trade",
@@ -248,3 +695,75 @@ builder.add_edge("execute_trade", "respond")
 builder.add_edge("respond", END)
 
 iris_agent = builder.compile()
+# Conversation threads persisted per user (thread_id = user_id, see checkpointer.py):
+# pending trades and recent messages carry over between requests
+conversation_agent = builder.compile(checkpointer=checkpointer) if CHECKPOINTS_ENABLED else iris_agent
+
+async def acheck_admission(user_id: str):
+    """Fast admission check at request entry: raises SchedulerBusy when the response model's queue is full.
+
+    The intent is not known yet, so a thread with a pending trade is let
+    through: its turn may be the confirmation, which is always queued
+    (llm_scheduler.slot rejects any other intent once classified).
+    """
+    model = TASK_MODELS["response"]
+    if not llm_scheduler.is_full(model):
+        return
+    if conversation_agent.checkpointer is not None:
+        state = await conversation_agent.aget_state(thread_config(user_id))
+        if state.values.get("pending_trade"):
+            return
+    llm_scheduler.check(model)
+
+# 4. Background summarization (scheduled after the response is sent)
+_summarizing = set()
+
+def _checkpoint_id(snapshot) -> str:
+    return snapshot.config.get("configurable", {}).get("checkpoint_id")
+
+async def asummarize_conversation(user_id: str):
+    """Folds the older turns of a user's thread into its running summary once it passes the token threshold.
+
+    The summary is generated outside the thread lock (it must not hold up the
+    user's next turn) and written under it, only if no turn has checkpointed
+    the thread meanwhile: otherwise the turn's messages would be out of step
+    with the summary, and the fold is retried after the next turn.
+    """
+    agent = conversation_agent
+    if agent.checkpointer is None or user_id in _summarizing:
+        return
+    _summarizing.add(user_id)
+    try:
+        config = thread_config(user_id)
+        snapshot = await agent.aget_state(config)
+        values = snapshot.values
+        messages, summary = values.get("messages", []), values.get("summary", "")
+        if not conversation_summary.needs_summary(messages, summary):
+            return
+        older, _ = conversation_summary.split_for_summary(messages)
+        template = PROMPTS.get("summary_template", conversation_summary.DEFAULT_SUMMARY_TEMPLATE)
+        # Lowest priority: never delays a user-facing generation
+        async with llm_scheduler.slot(TASK_MODELS["summary"], BACKGROUND_PRIORITY):
+            with metrics.timed("llm.summary"):
+                prompt = conversation_summary.summary_prompt(template, summary, older)
+                new_summary = (await ollama_pool.run(TASK_MODELS["summary"],
+                                                     lambda url: _task_llm("summary", url).ainvoke(prompt),
+                                                     affinity=user_id)).strip()
+        if not new_summary:
+            metrics.incr("llm.summary.empty")
+            return
+        async with thread_lock(user_id):
+            if _checkpoint_id(await agent.aget_state(config)) != _checkpoint_id(snapshot):
+                metrics.incr("conversation.summary_stale")
+                return
+            # One checkpoint write: the folded messages leave the thread as they enter the summary
+            removed = [RemoveMessage(id=m.id) for m in older]
+            await agent.aupdate_state(config, {"summary": new_summary, "messages": removed}, as_node="respond")
+        metrics.incr("conversation.summarized")
+    except SchedulerBusy:
+        metrics.incr("conversation.summary_deferred") # Retried after the next turn
+    except Exception as e:
+        metrics.incr("conversation.summary_failed")
+        print(f"Conversation summarization failed for {user_id}: {e}")
+    finally:
+        _summarizing.discard(user_id)
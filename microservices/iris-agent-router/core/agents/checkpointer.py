@@ -0,0 +1,255 @@
+"""Redis-backed LangGraph checkpointer for per-user conversation threads.
+
+Each user's thread (thread_id = user_id) keeps its latest graph state in Redis
+so `pending_trade` and the recent messages survive between HTTP requests: a
+"yes" on the next request resumes the proposed trade directly, and follow-ups
+see the conversation without a gateway history fetch.
+
+Only what the next turn needs is stored, keeping the entries small:
+
+- the latest checkpoint only (no time travel), one key per thread
+- per-turn channels (tool_outputs: the assembled context) are dropped
+- both keys expire after CHECKPOINT_TTL of inactivity
+
+Messages are never trimmed here: only the summarizer removes them, in the same
+checkpoint write that folds them into `summary` (see
+agent_router.asummarize_conversation). `thread_lock` serializes a thread's
+chat turns and that write within the process.
+
+Values use LangGraph's msgpack serializer. Redis errors are logged and treated
+as a missing checkpoint, so an outage degrades to stateless turns.
+"""
+import asyncio
+import os
+import weakref
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+import redis
+import redis.asyncio as aioredis
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from core import metrics
+
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "true").lower() == "true"
+# Idle conversations (and their pending trades) expire after this many seconds
+CHECKPOINT_TTL = int(os.getenv("CHECKPOINT_TTL", "1800"))
+# Rebuilt every turn: not worth persisting
+TRANSIENT_CHANNELS = ("tool_outputs", "deadline")
+
+
+def checkpoint_key(thread_id: str, checkpoint_ns: str = "") -> str:
+    return f"checkpoint:{thread_id}:{checkpoint_ns}"
+
+
+def writes_key(thread_id: str, checkpoint_ns: str = "") -> str:
+    return f"checkpoint_writes:{thread_id}:{checkpoint_ns}"
+
+
+def thread_config(user_id: str) -> dict:
+    """Invocation config for a user's conversation thread."""
+    return {"configurable": {"thread_id": user_id}}
+
+
+_thread_locks = weakref.WeakValueDictionary()
+
+
+def thread_lock(thread_id: str) -> asyncio.Lock:
+    """Lock serializing the writes to a thread (chat turns, summary updates) in this process."""
+    lock = _thread_locks.get(thread_id)
+    if lock is None:
+        lock = _thread_locks[thread_id] = asyncio.Lock()
+    return lock
+
+
+def compact_checkpoint(checkpoint: Checkpoint) -> Checkpoint:
+    """Copy of the checkpoint without per-turn channels."""
+    values = {k: v for k, v in checkpoint["channel_values"].items() if k not in TRANSIENT_CHANNELS}
+    return {**checkpoint, "channel_values": values}
+
+
+class RedisCheckpointSaver(BaseCheckpointSaver):
+    """Latest-checkpoint-per-thread saver on Redis (sync and async clients, binary responses)."""
+
+    def __init__(self, redis_client=None, async_redis_client=None, ttl: int = CHECKPOINT_TTL, serde=None):
+        super().__init__(serde=serde)
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.ttl = ttl
+
+    # --- Serialization ---
+    def _pack(self, value) -> bytes:
+        type_, data = self.serde.dumps_typed(value)
+        return type_.encode() + b":" + data
+
+    def _unpack(self, raw: bytes):
+        type_, _, data = raw.partition(b":")
+        return self.serde.loads_typed((type_.decode(), data))
+
+    @staticmethod
+    def _ids(config: RunnableConfig):
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    @staticmethod
+    def _ref(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint_id}}
+
+    def _encode_checkpoint(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata) -> bytes:
+        parent_id = config["configurable"].get("checkpoint_id")
+        payload = self._pack((compact_checkpoint(checkpoint),
+                              get_checkpoint_metadata(config, metadata), parent_id))
+        metrics.observe("checkpoint.bytes", len(payload))
+        return payload
+
+    def _encode_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                       task_path: str) -> list:
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        return [self._pack((checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, value, task_path))
+                for idx, (channel, value) in enumerate(writes)]
+
+    def _decode_tuple(self, config: RunnableConfig, raw, raw_writes) -> Optional[CheckpointTuple]:
+        if raw is None:
+            return None
+        checkpoint, metadata, parent_id = self._unpack(raw)
+        requested = get_checkpoint_id(config)
+        if requested and requested != checkpoint["id"]:
+            return None  # Only the latest checkpoint is kept
+        thread_id, checkpoint_ns = self._ids(config)
+        pending, seen = [], set()
+        for entry in raw_writes or []:
+            checkpoint_id, task_id, idx, channel, value, _ = self._unpack(entry)
+            if checkpoint_id != checkpoint["id"] or (idx >= 0 and (task_id, idx) in seen):
+                continue
+            seen.add((task_id, idx))
+            pending.append((task_id, channel, value))
+
+        return CheckpointTuple(
+            config=self._ref(thread_id, checkpoint_ns, checkpoint["id"]),
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config=self._ref(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=pending,
+        )
+
+    # --- Sync API ---
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if not self.redis_client:
+            return None
+        thread_id, checkpoint_ns = self._ids(config)
+        try:
+            raw = self.redis_client.get(checkpoint_key(thread_id, checkpoint_ns))
+            raw_writes = None
+            if raw is not None:
+                raw_writes = self.redis_client.lrange(writes_key(thread_id, checkpoint_ns), 0, -1)
+        except Exception as e:
+            print(f"Checkpoint load failed: {e}")
+            return None
+        metrics.incr("checkpoint.hit" if raw is not None else "checkpoint.miss")
+        return self._decode_tuple(config, raw, raw_writes)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        latest = self.get_tuple(config) if config else None
+        if latest and limit != 0:
+            yield latest
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id, checkpoint_ns = self._ids(config)
+        if self.redis_client:
+            try:
+                payload = self._encode_checkpoint(config, checkpoint, metadata)
+                self.redis_client.set(checkpoint_key(thread_id, checkpoint_ns), payload, ex=self.ttl)
+                self.redis_client.delete(writes_key(thread_id, checkpoint_ns))
+            except Exception as e:
+                print(f"Checkpoint save failed: {e}")
+        return self._ref(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        if not self.redis_client or not writes:
+            return
+        key = writes_key(*self._ids(config))
+        try:
+            self.redis_client.rpush(key, *self._encode_writes(config, writes, task_id, task_path))
+            self.redis_client.expire(key, self.ttl)
+        except Exception as e:
+            print(f"Checkpoint writes save failed: {e}")
+
+    def delete_thread(self, thread_id: str) -> None:
+        if self.redis_client:
+            self.redis_client.delete(checkpoint_key(thread_id), writes_key(thread_id))
+
+    # --- Async API ---
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if not self.async_redis_client:
+            return None
+        thread_id, checkpoint_ns = self._ids(config)
+        try:
+            raw = await self.async_redis_client.get(checkpoint_key(thread_id, checkpoint_ns))
+            raw_writes = None
+            if raw is not None:
+                raw_writes = await self.async_redis_client.lrange(writes_key(thread_id, checkpoint_ns), 0, -1)
+        except Exception as e:
+            print(f"Checkpoint load failed: {e}")
+            return None
+        metrics.incr("checkpoint.hit" if raw is not None else "checkpoint.miss")
+        return self._decode_tuple(config, raw, raw_writes)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        latest = await self.aget_tuple(config) if config else None
+        if latest and limit != 0:
+            yield latest
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id, checkpoint_ns = self._ids(config)
+        if self.async_redis_client:
+            try:
+                payload = self._encode_checkpoint(config, checkpoint, metadata)
+                await self.async_redis_client.set(checkpoint_key(thread_id, checkpoint_ns), payload, ex=self.ttl)
+                await self.async_redis_client.delete(writes_key(thread_id, checkpoint_ns))
+            except Exception as e:
+                print(f"Checkpoint save failed: {e}")
+        return self._ref(thread_id, checkpoint_ns, checkpoint["id"])
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        if not self.async_redis_client or not writes:
+            return
+        key = writes_key(*self._ids(config))
+        try:
+            await self.async_redis_client.rpush(key, *self._encode_writes(config, writes, task_id, task_path))
+            await self.async_redis_client.expire(key, self.ttl)
+        except Exception as e:
+            print(f"Checkpoint writes save failed: {e}")
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        if self.async_redis_client:
+            await self.async_redis_client.delete(checkpoint_key(thread_id), writes_key(thread_id))
+
+
+def _redis_clients():
+    # Binary clients: checkpoints are msgpack, unlike the JSON user-context segments
+    try:
+        host, port = os.getenv("REDIS_ADDR", "redis:6379").split(":")
+        return redis.Redis(host=host, port=int(port), db=0), aioredis.Redis(host=host, port=int(port), db=0)
+    except Exception as e:
+        print(f"Checkpoint Redis connection failed: {e}")
+        return None, None
+
+
+checkpointer = RedisCheckpointSaver(*_redis_clients())
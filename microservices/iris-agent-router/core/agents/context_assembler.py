@@ -0,0 +1,144 @@
+"""Token-budgeted assembly of the LLM context block.
+
+Segments (portfolio, transactions, chat history, market data, knowledge base)
+are ranked by relevance to the turn's intent and tickers, then admitted in
+priority order until the token budget is spent: a segment that does not fit
+falls back to its compact form, then to a truncated form, then is dropped.
+Beyond the most recent trades, transactions are represented by the per-user
+aggregates so the prompt (and Ollama prefill time) stays flat as user history
+grows.
+"""
+import math
+import os
+
+from core import metrics
+from core.tools import transaction_aggregates
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Most recent transactions kept verbatim; older ones are aggregated per symbol
+RECENT_TRANSACTIONS = int(os.getenv("CONTEXT_RECENT_TRANSACTIONS", "15"))
+# Segments that would be truncated below this many tokens are dropped instead
+MIN_SEGMENT_TOKENS = 32
+
+# Higher = admitted first. Unknown intents use GENERAL_CHAT.
+INTENT_PRIORITIES = {
+    "ADVICE": {"market": 5, "portfolio": 4, "rag": 3, "transactions": 2, "history": 1},
+    "GENERAL_CHAT": {"history": 5, "portfolio": 4, "rag": 3, "market": 2, "transactions": 1},
+}
+
+# Fixed output order (independent of priority) keeps the prompt prefix stable
+SECTION_ORDER = ("portfolio", "transactions", "history", "market", "rag")
+SECTION_HEADERS = {
+    "portfolio": "## PORTFOLIO",
+    "transactions": "## TRANSACTION HISTORY",
+    "history": "## CHAT HISTORY",
+    "market": "[Market Setup]",
+    "rag": "[Knowledge Base]",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/numeric text)."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keeps whole leading lines of `text` within roughly `max_tokens`."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    marker = "...(truncated)"
+    budget_chars = max(max_tokens - estimate_tokens(marker) - 1, 0) * 4
+    kept, used = [], 0
+    for line in text.splitlines():
+        if used + len(line) + 1 > budget_chars:
+            break
+        kept.append(line)
+        used += len(line) + 1
+    return "\n".join(kept + [marker])
+
+
+def _transaction_line(t: dict) -> str:
+    return f"{t['timestamp'][:10]} {t['type']} {t['shares']} {t['symbol']} @ ${t['price']:.2f}"
+
+
+def summarize_transactions(txns: list, tickers=(), recent: int = RECENT_TRANSACTIONS, aggregates: dict = None):
+    """Returns (full, compact) renderings of a newest-first transaction list.
+
+    full:    the `recent` latest trades verbatim (focus-ticker trades first),
+             plus the per-symbol aggregates.
+    compact: per-symbol aggregates only.
+
+    `aggregates` are the precomputed per-user aggregates; they are built from
+    `txns` only when missing.
+    """
+    if not txns:
+        return "No recorded transactions.", "No recorded transactions."
+    focus = set(tickers)
+    if aggregates is None:
+        aggregates = transaction_aggregates.build(txns)
+    latest = sorted(txns[:recent], key=lambda t: t["symbol"] not in focus)
+
+    per_symbol = transaction_aggregates.format_summary(aggregates, focus)
+    full = "Recent:\n" + "\n".join(_transaction_line(t) for t in latest)
+    if len(txns) > recent:
+        full += "\nPer symbol:\n" + per_symbol
+    return full, "Per symbol:\n" + per_symbol
+
+
+def _priorities(intent: str, tickers, portfolio_text: str, txns) -> dict:
+    priorities = dict(INTENT_PRIORITIES.get(intent, INTENT_PRIORITIES["GENERAL_CHAT"]))
+    focus = set(tickers)
+    if focus and txns and any(t.get("symbol") in focus for t in txns):
+        # The user is asking about something they have traded
+        priorities["transactions"] += 2
+    if focus and any(f"- {symbol}:" in portfolio_text for symbol in focus):
+        priorities["portfolio"] += 1
+    return priorities
+
+
+def assemble_context(segments: dict, intent: str = "GENERAL_CHAT", tickers=(), budget: int = CONTEXT_TOKEN_BUDGET):
+    """Builds the context block within `budget` tokens.
+
+    `segments` may contain: portfolio (str), transactions (list | None),
+    aggregates (dict | None), history (str), market (str), rag (str).
+    Returns (context_text, report) where report maps each segment to the
+    tokens it used, plus "total".
+    """
+    txns = segments.get("transactions")
+    candidates = {}
+    for name in ("portfolio", "history", "market", "rag"):
+        text = (segments.get(name) or "").strip()
+        if text:
+            candidates[name] = (text, None)
+    if txns is not None:
+        candidates["transactions"] = summarize_transactions(txns, tickers, aggregates=segments.get("aggregates"))
+
+    priorities = _priorities(intent, tickers, candidates.get("portfolio", ("", None))[0], txns)
+    remaining = budget
+    chosen = {}
+    for name in sorted(candidates, key=lambda n: -priorities.get(n, 0)):
+        full, compact = candidates[name]
+        header_tokens = estimate_tokens(SECTION_HEADERS[name]) + 1
+        for text in (full, compact):
+            if text and estimate_tokens(text) + header_tokens <= remaining:
+                chosen[name] = text
+                break
+        else:
+            available = remaining - header_tokens
+            if available >= MIN_SEGMENT_TOKENS:
+                chosen[name] = truncate_to_tokens(compact or full, available)
+        if name in chosen:
+            remaining -= estimate_tokens(chosen[name]) + header_tokens
+
+    sections, report = [], {}
+    for name in SECTION_ORDER:
+        if name in chosen:
+            sections.append(f"{SECTION_HEADERS[name]}\n{chosen[name]}")
+            report[name] = estimate_tokens(chosen[name]) + estimate_tokens(SECTION_HEADERS[name]) + 1
+        elif name in candidates:
+            report[name] = 0  # Dropped for budget
+    report["total"] = sum(report.values())
+
+    for name, tokens in report.items():
+        metrics.observe(f"context.tokens.{name}", tokens)
+    return "\n\n".join(sections), report
@@ -0,0 +1,66 @@
+"""Per-turn context planning.
+
+Decides which context providers a turn actually needs, so small talk and
+simple price questions skip the user-context build, the quote and the RAG
+search:
+
+- portfolio / transactions / history: user-context segments (Redis cached)
+- market: asset check + quote for the mentioned (or default) ticker
+- rag:    knowledge-base search (embedding + LanceDB)
+"""
+import re
+
+PROVIDERS = ("portfolio", "transactions", "history", "market", "rag")
+USER_CONTEXT_PARTS = ("portfolio", "transactions", "history")
+
+# Questions about the user's own account
+_PERSONAL_RE = re.compile(r"\b(my|mine|i|i'm|i've|portfolio|holdings?|positions?|balance|account|gains?|loss(es)?"
+                          r"|risk|goals?|retire\w*)\b")
+# Questions about past activity
+_ACTIVITY_RE = re.compile(r"\b(bought|sold|trades?|transactions?|history|activity|last (week|month|year)|so far)\b")
+# Plain quote lookups
+_PRICE_RE = re.compile(r"\b(price|quote|trading at|worth|how much is|cost)\b")
+# Market-wide questions
+_MARKET_RE = re.compile(r"\b(market|outlook|index|indices|s&p|nasdaq|dow|sector|economy|rates?|inflation)\b")
+# Concepts the knowledge base covers
+_KNOWLEDGE_RE = re.compile(r"\b(explain|meaning|how does|how do|why|should|strategy|strategies|etfs?|bonds?|dividends?|"
+                           r"diversif\w*|hedge|allocation|analy[sz]e|outlook|invest\w*)\b")
+# Follow-ups that only make sense with the conversation so far
+_FOLLOW_UP_RE = re.compile(r"\b(it|that|this|those|them|they|again|more|else|earlier|before|above)\b")
+
+
+def is_follow_up(text: str) -> bool:
+    """True when the message refers back to the conversation (pronouns, "again", "earlier", ...)."""
+    return bool(_FOLLOW_UP_RE.search(text.lower()))
+
+
+def plan_context(intent: str, text: str, ticker_mentioned: bool = False) -> list:
+    """Returns the providers (subset of PROVIDERS, in PROVIDERS order) needed for this turn."""
+    if intent not in ("ADVICE", "GENERAL_CHAT"):
+        return []
+    lowered = text.lower()
+    personal = bool(_PERSONAL_RE.search(lowered))
+    planned = set()
+
+    if personal:
+        planned |= {"portfolio", "history"}
+    if _ACTIVITY_RE.search(lowered):
+        planned |= {"transactions", "history"}
+    if is_follow_up(lowered):
+        planned.add("history")
+
+    if intent == "ADVICE":
+        price_only = bool(_PRICE_RE.search(lowered)) and not personal and not _KNOWLEDGE_RE.search(lowered)
+        if ticker_mentioned or _MARKET_RE.search(lowered) or _PRICE_RE.search(lowered):
+            planned.add("market")
+        if not price_only:
+            planned.add("rag")
+        if personal and ticker_mentioned:
+            planned.add("transactions")  # Their trades in the ticker matter
+    else:
+        if ticker_mentioned:
+            planned.add("market")
+        if _KNOWLEDGE_RE.search(lowered) or _MARKET_RE.search(lowered):
+            planned.add("rag")
+
+    return [p for p in PROVIDERS if p in planned]
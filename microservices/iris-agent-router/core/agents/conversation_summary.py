@@ -0,0 +1,55 @@
+"""Rolling summarization of long conversation threads.
+
+The response prompt carries the thread's messages verbatim, so without a
+bound a long session grows the prompt (and Ollama prefill time) linearly.
+Once a thread's messages pass SUMMARY_TOKEN_THRESHOLD, everything but the last
+SUMMARY_KEEP_TURNS turns is folded into a running summary stored in the thread
+state (AgentState.summary) and the folded messages are removed.
+
+This runs as a background task after the response has been sent (see
+agent_router.asummarize_conversation), never on the request path.
+"""
+import os
+
+from core.agents.context_assembler import estimate_tokens
+
+SUMMARY_TOKEN_THRESHOLD = int(os.getenv("SUMMARY_TOKEN_THRESHOLD", "1500"))
+# Most recent user/assistant exchanges kept verbatim
+SUMMARY_KEEP_TURNS = int(os.getenv("SUMMARY_KEEP_TURNS", "3"))
+# Token cap for the summary itself
+SUMMARY_NUM_PREDICT = int(os.getenv("SUMMARY_NUM_PREDICT", "256"))
+
+DEFAULT_SUMMARY_TEMPLATE = "Summary so far:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:"
+
+
+def _role_and_content(msg):
+    if hasattr(msg, "content"):
+        return msg.type, msg.content
+    return msg
+
+
+def format_messages(messages: list) -> str:
+    return "\n".join("{}: {}".format(*_role_and_content(m)) for m in messages)
+
+
+def thread_tokens(messages: list, summary: str = "") -> int:
+    """Estimated prompt tokens of the thread (summary plus verbatim messages)."""
+    return estimate_tokens(summary or "") + sum(estimate_tokens(_role_and_content(m)[1]) for m in messages)
+
+
+def split_for_summary(messages: list, keep_turns: int = SUMMARY_KEEP_TURNS):
+    """Splits messages into (older, recent): recent starts at the keep_turns-th last user message."""
+    human_positions = [i for i, m in enumerate(messages) if _role_and_content(m)[0] in ("human", "user")]
+    if len(human_positions) <= keep_turns:
+        return [], list(messages)
+    cut = human_positions[-keep_turns] if keep_turns else len(messages)
+    return list(messages[:cut]), list(messages[cut:])
+
+
+def needs_summary(messages: list, summary: str = "", threshold: int = SUMMARY_TOKEN_THRESHOLD,
+                  keep_turns: int = SUMMARY_KEEP_TURNS) -> bool:
+    return thread_tokens(messages, summary) > threshold and bool(split_for_summary(messages, keep_turns)[0])
+
+
+def summary_prompt(template: str, summary: str, older: list) -> str:
+    return template.format(summary=summary or "(none)", messages=format_messages(older))
@@ -0,0 +1,80 @@
+"""End-to-end request deadlines.
+
+chat_endpoint stamps each turn with an absolute deadline (AgentState.deadline,
+wall-clock seconds) and the nodes read it:
+
+- context fetches get at most the budget left after RESPONSE_RESERVE (time
+  kept for the generation); below MIN_CONTEXT_BUDGET they are skipped and the
+  response is generated without context,
+- LLM calls (including the wait for a scheduler slot) are cancelled when the
+  deadline passes, which closes the Ollama connection and stops generation,
+- no order is submitted once the deadline has passed.
+
+A missing deadline (nodes called directly by tests/scripts) means no limit.
+The sync graph path only checks the deadline between calls: a running
+`LLM.invoke` cannot be interrupted.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from core import metrics
+
+# Default end-to-end budget of a chat turn (seconds); callers may ask for less
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+# Part of the budget kept for the response generation when fetching context
+RESPONSE_RESERVE = float(os.getenv("DEADLINE_RESPONSE_RESERVE", "10"))
+# Below this the context fetch is not worth starting
+MIN_CONTEXT_BUDGET = float(os.getenv("DEADLINE_MIN_CONTEXT_BUDGET", "0.5"))
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed during `stage`."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def new_deadline(timeout: float = None) -> float:
+    """Absolute deadline for a request starting now (timeout capped at REQUEST_TIMEOUT)."""
+    timeout = REQUEST_TIMEOUT if timeout is None else min(timeout, REQUEST_TIMEOUT)
+    return time.time() + timeout
+
+
+def remaining(state: dict):
+    """Seconds left before the state's deadline, or None without one."""
+    deadline = state.get("deadline")
+    if not deadline:
+        return None
+    return deadline - time.time()
+
+
+def context_budget(state: dict):
+    """Seconds the context fetch may take, or None without a deadline."""
+    left = remaining(state)
+    return None if left is None else left - RESPONSE_RESERVE
+
+
+def check(state: dict, stage: str):
+    """Raises DeadlineExceeded if the deadline has already passed."""
+    left = remaining(state)
+    if left is not None and left <= 0:
+        metrics.incr(f"deadline.exceeded.{stage}")
+        raise DeadlineExceeded(stage)
+
+
+@asynccontextmanager
+async def within(state: dict, stage: str):
+    """Cancels the block when the deadline passes, raising DeadlineExceeded."""
+    check(state, stage)
+    timeout = asyncio.timeout(remaining(state))
+    try:
+        async with timeout:
+            yield
+    except TimeoutError:
+        if not timeout.expired():
+            raise  # A timeout of the call itself, not the deadline
+        metrics.incr(f"deadline.exceeded.{stage}")
+        raise DeadlineExceeded(stage) from None
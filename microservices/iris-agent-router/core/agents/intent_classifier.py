@@ -0,0 +1,130 @@
+"""Nearest-centroid intent classifier over MiniLM sentence embeddings.
+
+Each intent is represented by the normalised mean embedding of its labelled
+examples (core/prompts/intents.yaml). A message is assigned to the closest
+centroid; the softmax over cosine similarities is its confidence. Below the
+confidence threshold the caller falls back to keyword rules.
+
+The classifier only runs once the shared embedding model has been loaded at
+startup (it never loads the model on the request path), so classification
+costs one memoised MiniLM encode plus a 3xD dot product.
+
+Run `python -m core.agents.intent_classifier` to print accuracy on the
+held-out eval set.
+"""
+import os
+import threading
+
+import numpy as np
+import yaml
+
+from core import metrics
+from core.tools.embeddings import embedding_service
+
+INTENTS_PATH = os.path.join(os.path.dirname(__file__), "..", "prompts", "intents.yaml")
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))
+# Softmax temperature over cosine similarities (MiniLM similarities are compressed)
+INTENT_TEMPERATURE = 0.05
+
+
+def load_intent_data(path: str = INTENTS_PATH) -> dict:
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class IntentClassifier:
+    """Nearest-centroid classifier; `embed_many(texts)` and `embed(text)` return embeddings."""
+
+    def __init__(self, embed, embed_many, threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+        self.embed = embed
+        self.embed_many = embed_many
+        self.threshold = threshold
+        self.labels = []
+        self._centroids = None
+        self._lock = threading.Lock()
+
+    @property
+    def fitted(self) -> bool:
+        return self._centroids is not None
+
+    def fit(self, examples: dict):
+        """Builds one centroid per label from {label: [utterances]}."""
+        labels, centroids = [], []
+        for label, texts in examples.items():
+            vectors = _normalize(np.asarray(self.embed_many(list(texts)), dtype=np.float32))
+            labels.append(label)
+            centroids.append(vectors.mean(axis=0))
+        self.labels = labels
+        self._centroids = _normalize(np.stack(centroids))
+        return self
+
+    def predict(self, text: str):
+        """Returns (label, confidence)."""
+        with metrics.timed("intent.classify"):
+            vector = _normalize(np.asarray(self.embed(text), dtype=np.float32))
+            similarities = self._centroids @ vector
+            scaled = np.exp((similarities - similarities.max()) / INTENT_TEMPERATURE)
+            probabilities = scaled / scaled.sum()
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
+
+    def classify(self, text: str):
+        """Confident label, or None (caller falls back to keyword rules)."""
+        label, confidence = self.predict(text)
+        if confidence < self.threshold:
+            metrics.incr("intent.low_confidence")
+            return None
+        metrics.incr(f"intent.embedding.{label}")
+        return label
+
+
+def evaluate(classifier: IntentClassifier, eval_set: dict) -> dict:
+    """Accuracy overall and per label on {label: [utterances]}, plus the fallback rate."""
+    report, correct, total, abstained = {}, 0, 0, 0
+    for label, texts in eval_set.items():
+        hits = 0
+        for text in texts:
+            predicted, confidence = classifier.predict(text)
+            hits += predicted == label
+            abstained += confidence < classifier.threshold
+        report[label] = hits / len(texts)
+        correct += hits
+        total += len(texts)
+    report["accuracy"] = correct / total
+    report["fallback_rate"] = abstained / total
+    return report
+
+
+class _LazyIntentClassifier(IntentClassifier):
+    """Process-wide classifier, fitted on first use once the embedding model is loaded."""
+
+    def warm_up(self):
+        if self.fitted or not embedding_service.loaded:
+            return
+        with self._lock:
+            if not self.fitted:
+                try:
+                    self.fit(load_intent_data()["examples"])
+                except Exception as e:
+                    print(f"Intent classifier warm-up failed (keyword rules in use): {e}")
+
+    def classify(self, text: str):
+        self.warm_up()
+        if not self.fitted:
+            return None
+        return super().classify(text)
+
+
+intent_classifier = _LazyIntentClassifier(embedding_service.encode, embedding_service.encode_many)
+
+
+if __name__ == "__main__":
+    data = load_intent_data()
+    classifier = IntentClassifier(embedding_service.encode, embedding_service.encode_many).fit(data["examples"])
+    for key, value in evaluate(classifier, data["eval"]).items():
+        print(f"{key}: {value:.2%}")
@@ -1,8 +1,13 @@
 """Unit tests for the IRIS LangGraph agent router."""
 import unittest
-from unittest.mock import MagicMock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from langchain_core.messages import AIMessage
 from typing import Dict, Any
 
+from core.fakes import fake_astream
+
 
 class TestAgentRouter(unittest.TestCase):
     """Test suite for the agent router logic."""
@@ -54,23 +59,33 @@ class TestAgentRouter(unittest.TestCase):
         result = classify_intent(state)
         self.assertEqual(result["intent"], "GENERAL_CHAT")
 
-    @patch('core.agents.agent_router.get_past_conversations')
-    @patch('core.agents.agent_router.get_activity_log')
-    @patch('core.agents.agent_router.get_portfolio_details')
-    @patch('core.agents.agent_router.get_market_data')
+    def test_classify_intent_negated_confirmation_cancels(self):
+        """Test that a reply mixing confirm and cancel words cancels the pending trade."""
+        from core.agents.agent_router import classify_intent
+
+        pending = {"symbol": "NVDA", "action": "buy", "quantity": 2.0, "amount": 0.0}
+        for reply in ("no don't do it", "ok cancel"):
+            state: Dict[str, Any] = {"user_id": "test_user", "messages": [("human", reply)],
+                                     "intent": "", "tool_calls": [], "pending_trade": pending}
+            result = classify_intent(state)
+            self.assertEqual(result["intent"], "CANCEL_TRADE", reply)
+            self.assertIsNone(result["pending_trade"])
+
+        state["messages"] = [("human", "yes, do it")]
+        self.assertEqual(classify_intent(state)["intent"], "CONFIRM_TRADE")
+
+    @patch('core.agents.agent_router.get_market_data_batch')
     @patch('core.agents.agent_router.lookup_rag_context')
-    @patch('core.agents.agent_router.build_user_context')
-    def test_fetch_financial_data(self, mock_user_context, mock_rag, mock_market, mock_portfolio, mock_activity, mock_history):
+    @patch('core.agents.agent_router.build_user_context_segments')
+    def test_fetch_financial_data(self, mock_user_context, mock_rag, mock_market):
         """Test that fetch_financial_data retrieves and formats context."""
         from core.agents.agent_router import fetch_financial_data
         
         # Mock the tool responses
-        mock_user_context.return_value = "User Profile: Risk=High. Holdings: TSLA."
+        mock_user_context.return_value = {"portfolio": "User Profile: Risk=High. Holdings: TSLA.",
+                                          "transactions": [], "history": ""}
         mock_market.return_value = "SPY: $450.00, 5-day: +2.5%"
         mock_rag.return_value = "Market outlook is positive"
-        mock_portfolio.return_value = "Total Value: $10000"
-        mock_activity.return_value = "No recent activity"
-        mock_history.return_value = ""
         
         state: Dict[str, Any] = {
             "user_id": "test_user",
@@ -86,14 +101,19 @@ class TestAgentRouter(unittest.TestCase):
         self.assertIn("context_data", result["tool_outputs"])
         self.assertIn("[Market Setup]", result["tool_outputs"]["context_data"])
         self.assertIn("User Profile", result["tool_outputs"]["context_data"])
+        self.assertGreater(result["tool_outputs"]["context_tokens"]["total"], 0)
 
     @patch('core.agents.agent_router.LLM')
     def test_generate_response(self, mock_llm):
         """Test that generate_response invokes the LLM correctly."""
+        from core import metrics
         from core.agents.agent_router import generate_response
-        
+
+        metrics.reset()
         # Mock LLM response
-        mock_llm.invoke.return_value = "Based on current market conditions, tech stocks show moderate growth potential."
+        mock_llm.invoke.return_value = AIMessage(
+            content="Based on current market conditions, tech stocks show moderate growth potential.",
+            response_metadata={"prompt_eval_count": 120, "prompt_eval_duration": 250_000_000})
         
         state: Dict[str, Any] = {
             "user_id": "test_user",
@@ -111,6 +131,37 @@ class TestAgentRouter(unittest.TestCase):
         self.assertEqual(len(result["messages"]), 1)
         self.assertEqual(result["messages"][0][0], "ai")
         self.assertIsInstance(result["messages"][0][1], str)
+        self.assertEqual(metrics.snapshot()["counters"]["llm.response.prompt_eval_tokens"], 120)
+
+    def test_response_messages_share_prefix_across_turns(self):
+        """Test that per-turn context rides on the latest message so earlier turns form a stable prefix."""
+        from core.agents.agent_router import _build_response_messages
+
+        first_turn = [("human", "Should I invest in tech?")]
+        second_turn = first_turn + [("ai", "Tech looks strong."), ("human", "What about bonds?")]
+        first = _build_response_messages({"messages": first_turn, "tool_outputs": {"context_data": "SPY: $450"}})
+        second = _build_response_messages({"messages": second_turn, "tool_outputs": {"context_data": "TLT: $90"}})
+
+        self.assertEqual(first[0], second[0])
+        self.assertNotIn("SPY", first[0].content)
+        self.assertEqual(second[1].content, "Should I invest in tech?")
+        self.assertIn("TLT: $90", second[-1].content)
+        self.assertTrue(second[-1].content.endswith("What about bonds?"))
+
+    def test_mentioned_tickers_checked_against_asset_table(self):
+        """Test that upper-case words outside the symbol dictionary count as tickers only if listed."""
+        from core.agents.agent_router import _mentioned_tickers
+        from core.tools.cache import TieredCache
+
+        text = "My CFO says NVDA and ASML beat the NYSE, LOL"
+        with patch('core.agents.agent_router.asset_cache', TieredCache("asset", ttl=60, negative_ttl=60)) as cache:
+            with patch('core.agents.agent_router.asset_symbols', {"NVDA", "ASML"}):
+                self.assertEqual(_mentioned_tickers(text), ["NVDA", "ASML"])
+            with patch('core.agents.agent_router.asset_symbols', set()):
+                cache.set("CFO", None)
+                cache.set("LOL", None)
+                # NYSE is not cached yet: validated by the market fetch
+                self.assertEqual(_mentioned_tickers(text), ["NVDA", "ASML", "NYSE"])
 
     def test_router_advice(self):
         """Test that ADVICE intent routes to fetch_data node."""
@@ -140,6 +191,205 @@ class TestAgentRouter(unittest.TestCase):
         result = router(state)
         self.assertEqual(result, "fetch_data")
 
+    @patch.dict('core.agents.agent_router._primary_clients')
+    @patch('core.agents.agent_router.alookup_rag_context', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.aget_market_data_batch', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.abuild_user_context_segments', new_callable=AsyncMock)
+    @patch('core.tools.semantic_cache.response_cache.enabled', False)
+    def test_async_graph_uses_async_nodes(self, mock_user_context, mock_market, mock_rag):
+        """Test that ainvoke runs the non-blocking node implementations end to end."""
+        from core.agents import agent_router
+        from core.agents.agent_router import iris_agent
+
+        mock_llm = agent_router._primary_clients["response"] = MagicMock()
+        mock_user_context.return_value = {"portfolio": "User Profile", "transactions": None, "history": ""}
+        mock_market.return_value = "SPY: $450.00"
+        mock_rag.return_value = "Outlook positive"
+        mock_llm.astream = fake_astream(["Async ", "answer"])
+
+        final_state = asyncio.run(iris_agent.ainvoke({
+            "user_id": "test_user",
+            "messages": [("human", "What is the market outlook for my portfolio?")],
+            "intent": "",
+            "tool_outputs": {}
+        }))
+
+        self.assertEqual(final_state["messages"][-1].content, "Async answer")
+        mock_user_context.assert_awaited_once_with("test_user", ("portfolio", "history"))
+        mock_market.assert_awaited_once_with(["SPY"])
+        mock_llm.invoke.assert_not_called()
+
+    @patch.dict('core.agents.agent_router._primary_clients')
+    @patch('core.agents.agent_router.alookup_rag_context', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.aget_market_data_batch', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.abuild_user_context_segments', new_callable=AsyncMock)
+    def test_stream_emits_progress_before_tokens(self, mock_user_context, mock_market, mock_rag):
+        """Test that streamed runs emit node progress first, then LLM tokens in order."""
+        from core.agents import agent_router
+        from core.agents.agent_router import iris_agent
+
+        mock_llm = agent_router._primary_clients["response"] = MagicMock()
+        mock_user_context.return_value = {"portfolio": "User Profile", "transactions": None, "history": ""}
+        mock_market.return_value = "SPY: $450.00"
+        mock_rag.return_value = "Outlook positive"
+        mock_llm.astream = fake_astream(["Hel", "lo"])
+
+        async def collect():
+            events = []
+            async for event in iris_agent.astream({
+                "user_id": "test_user",
+                "messages": [("human", "Can you explain how ETFs work?")],
+                "intent": "",
+                "tool_outputs": {}
+            }, stream_mode="custom"):
+                events.append(event)
+            return events
+
+        events = asyncio.run(collect())
+        kinds = [e["event"] for e in events]
+        self.assertEqual(kinds[-2:], ["token", "token"])
+        self.assertIn("progress", kinds[:kinds.index("token")])
+        self.assertIn("searching knowledge", [e.get("message") for e in events])
+        self.assertEqual("".join(e["text"] for e in events if e["event"] == "token"), "Hello")
+
+    @patch.dict('core.agents.agent_router._primary_clients')
+    @patch('core.agents.agent_router.alookup_rag_context', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.aget_market_data_batch', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.abuild_user_context_segments', new_callable=AsyncMock)
+    def test_small_talk_skips_context_fetch(self, mock_user_context, mock_market, mock_rag):
+        """Test that a greeting goes straight to respond without any context I/O."""
+        from core.agents import agent_router
+        from core.agents.agent_router import iris_agent
+
+        mock_llm = agent_router._primary_clients["response"] = MagicMock()
+        mock_llm.astream = fake_astream(["Hi!"])
+
+        final_state = asyncio.run(iris_agent.ainvoke({
+            "user_id": "test_user",
+            "messages": [("human", "hello")],
+            "intent": "",
+            "tool_outputs": {}
+        }))
+
+        self.assertEqual(final_state["context_plan"], [])
+        self.assertEqual(final_state["messages"][-1].content, "Hi!")
+        mock_user_context.assert_not_awaited()
+        mock_market.assert_not_awaited()
+        mock_rag.assert_not_awaited()
+
+    @patch.dict('core.agents.agent_router._primary_clients')
+    @patch('core.agents.agent_router.aget_current_price', new_callable=AsyncMock)
+    def test_async_trade_extraction_sets_pending(self, mock_price):
+        """Test that the async trade node proposes a trade for confirmation."""
+        from core.agents import agent_router
+        from core.agents.agent_router import aexecute_trade_node
+
+        mock_llm = agent_router._primary_clients["extraction"] = MagicMock()
+        mock_llm.ainvoke = AsyncMock(return_value='{"symbol": "NVDA", "action": "buy", "quantity": 0, "amount": 1000}')
+        mock_price.return_value = 500.0
+
+        result = asyncio.run(aexecute_trade_node({
+            "user_id": "test_user",
+            "messages": [("human", "Invest $1000 in NVDA")],
+            "intent": "TRADE",
+            "tool_outputs": {}
+        }))
+
+        self.assertEqual(result["pending_trade"]["symbol"], "NVDA")
+        self.assertEqual(result["pending_trade"]["quantity"], 2.0)
+        self.assertIn("Proposed Trade", result["tool_outputs"]["trade_result"])
+        self.assertEqual(result["tool_outputs"]["extraction"]["source"], "rules")
+        mock_llm.ainvoke.assert_not_called()
+
+    @patch.dict('core.agents.agent_router._primary_clients')
+    @patch('core.agents.agent_router.aget_current_price', new_callable=AsyncMock)
+    def test_async_trade_extraction_falls_back_to_llm(self, mock_price):
+        """Test that ambiguous trade requests are extracted by the LLM."""
+        from core.agents import agent_router
+        from core import metrics
+        from core.agents.agent_router import aexecute_trade_node
+
+        mock_llm = agent_router._primary_clients["extraction"] = MagicMock()
+        mock_llm.ainvoke = AsyncMock(return_value='{"symbol": "QQQ", "action": "buy", "quantity": 0, "amount": 2500}')
+        mock_price.return_value = 500.0
+
+        result = asyncio.run(aexecute_trade_node({
+            "user_id": "test_user",
+            "messages": [("human", "Invest $2500 in high growth tech")],
+            "intent": "TRADE",
+            "tool_outputs": {}
+        }))
+
+        self.assertEqual(result["pending_trade"]["symbol"], "QQQ")
+        self.assertEqual(result["tool_outputs"]["extraction"]["source"], "llm")
+        self.assertIn("llm.extraction", metrics.snapshot()["timings"])
+        mock_llm.ainvoke.assert_awaited_once()
+        self.assertIn("format", mock_llm.ainvoke.await_args.kwargs)
+
+    @patch.dict('core.agents.agent_router._primary_clients')
+    @patch('core.agents.agent_router.aget_current_price', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.embedding_service')
+    @patch('core.agents.agent_router.alookup_rag_context', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.aget_market_data_batch', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.abuild_user_context_segments', new_callable=AsyncMock)
+    def test_generic_advice_served_from_response_cache(self, mock_user_context, mock_market, mock_rag, mock_embedding,
+                                                       mock_price):
+        """Test that a repeated generic ADVICE question skips the LLM and the private user context."""
+        from core.agents import agent_router
+        from core.agents.agent_router import iris_agent
+        from core.tools.semantic_cache import SemanticCache
+
+        mock_llm = agent_router._primary_clients["response"] = MagicMock()
+        mock_market.return_value = "SPY: $450.00"
+        mock_rag.return_value = "Outlook positive"
+        mock_price.return_value = 450.0
+        mock_embedding.encode.return_value = [0.6, 0.8]
+        mock_llm.astream = MagicMock(side_effect=fake_astream(["Cached ", "answer"]))
+
+        def ask():
+            return asyncio.run(iris_agent.ainvoke({
+                "user_id": "test_user",
+                "messages": [("human", "What is the market outlook?")],
+                "intent": "",
+                "tool_outputs": {}
+            }))
+
+        with patch('core.agents.agent_router.response_cache', SemanticCache(enabled=True)):
+            first, second = ask(), ask()
+
+        self.assertEqual(first["messages"][-1].content, "Cached answer")
+        self.assertEqual(second["messages"][-1].content, "Cached answer")
+        self.assertEqual(mock_llm.astream.call_count, 1)
+        self.assertEqual(mock_rag.await_count, 1)  # The hit is looked up before the RAG search
+        mock_user_context.assert_not_awaited()
+
+    def test_follow_up_question_is_not_shared(self):
+        """Test that a question referring back to the thread is not answered from the shared cache."""
+        from core.agents.agent_router import _is_shared_turn
+        from core.tools.semantic_cache import SemanticCache
+
+        with patch('core.agents.agent_router.response_cache', SemanticCache(enabled=True)):
+            self.assertTrue(_is_shared_turn({"intent": "ADVICE"}, "What is the market outlook?"))
+            self.assertFalse(_is_shared_turn({"intent": "ADVICE"}, "What is the outlook for it?"))
+            self.assertFalse(_is_shared_turn({"intent": "ADVICE"}, "Explain that again"))
+
+    def test_pending_trade_admitted_when_queue_is_full(self):
+        """Test that a full response queue rejects new turns but not a possible trade confirmation."""
+        from langgraph.checkpoint.memory import InMemorySaver
+        from core.agents import agent_router
+        from core.agents.checkpointer import thread_config
+        from core.tools.llm_scheduler import SchedulerBusy
+
+        agent = agent_router.builder.compile(checkpointer=InMemorySaver())
+        pending = {"symbol": "NVDA", "action": "buy", "quantity": 2.0, "amount": 0.0}
+        asyncio.run(agent.aupdate_state(thread_config("u1"), {"messages": [("human", "Buy 2 NVDA")],
+                                                              "pending_trade": pending}, as_node="respond"))
+        with patch.object(agent_router, "conversation_agent", agent), \
+                patch.object(agent_router.llm_scheduler, "is_full", return_value=True):
+            asyncio.run(agent_router.acheck_admission("u1"))  # May be the "yes": admitted
+            with self.assertRaises(SchedulerBusy):
+                asyncio.run(agent_router.acheck_admission("u2"))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,74 @@
+"""Unit tests for the Redis conversation checkpointer."""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from core.fakes import FakeAsyncRedis, FakeRedis, fake_astream
+
+
+class TestRedisCheckpointSaver(unittest.TestCase):
+
+    def setUp(self):
+        from core.agents.checkpointer import RedisCheckpointSaver
+
+        self.redis = FakeRedis()
+        self.saver = RedisCheckpointSaver(self.redis, FakeAsyncRedis(self.redis), ttl=60)
+
+    def test_latest_checkpoint_is_compacted(self):
+        from langgraph.checkpoint.base import empty_checkpoint
+        from core.agents.checkpointer import checkpoint_key, thread_config
+
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {
+            "messages": ["one", "two", "three"],
+            "pending_trade": {"symbol": "NVDA"},
+            "tool_outputs": {"context_data": "x" * 5000},
+        }
+        config = {"configurable": {"thread_id": "u1", "checkpoint_ns": ""}}
+        self.saver.put(config, checkpoint, {"step": 1}, {})
+
+        restored = self.saver.get_tuple(thread_config("u1"))
+        self.assertEqual(restored.checkpoint["id"], checkpoint["id"])
+        self.assertEqual(restored.checkpoint["channel_values"],
+                         {"messages": ["one", "two", "three"], "pending_trade": {"symbol": "NVDA"}})
+        self.assertEqual(self.redis.ttls[checkpoint_key("u1")], 60)
+        self.assertLess(len(self.redis.store[checkpoint_key("u1")]), 500)
+        self.assertIsNone(self.saver.get_tuple(thread_config("u2")))
+
+    @patch.dict('core.agents.agent_router._primary_clients')
+    @patch('core.agents.agent_router.aexecute_trade_action', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.aget_current_price', new_callable=AsyncMock)
+    def test_confirmation_resumes_pending_trade_across_requests(self, mock_price, mock_execute):
+        """Test that a "yes" in a separate invocation executes the trade proposed in the previous one."""
+        from core.agents import agent_router
+        from core.agents.agent_router import builder
+        from core.agents.checkpointer import thread_config
+        from core.tools.trade_orders import client_order_id
+
+        mock_extraction_llm = agent_router._primary_clients["extraction"] = MagicMock()
+        mock_llm = agent_router._primary_clients["response"] = MagicMock()
+        agent = builder.compile(checkpointer=self.saver)
+        mock_llm.astream = MagicMock(side_effect=fake_astream(["ok"]))
+        mock_extraction_llm.ainvoke = AsyncMock()
+        mock_price.return_value = 500.0
+        mock_execute.return_value = "Order submitted"
+
+        def turn(prompt):
+            state = {"user_id": "u1", "messages": [("human", prompt)], "intent": "", "tool_outputs": {}}
+            return asyncio.run(agent.ainvoke(state, thread_config("u1"), durability="exit"))
+
+        first = turn("Buy 2 shares of NVDA")
+        self.assertEqual(first["pending_trade"]["symbol"], "NVDA")
+
+        second = turn("yes")
+        mock_execute.assert_awaited_once_with("u1", "NVDA", "buy", 2.0, 0.0,
+                                              client_order_id=client_order_id("u1", first["pending_trade"]))
+        self.assertIsNone(second["pending_trade"])
+        self.assertEqual(len(second["messages"]), 4)
+        saved = self.saver.get_tuple(thread_config("u1")).checkpoint["channel_values"]
+        self.assertEqual([m.content for m in saved["messages"]], ["Buy 2 shares of NVDA", "ok", "yes", "ok"])
+        mock_extraction_llm.ainvoke.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Unit tests for token-budgeted context assembly."""
+import unittest
+
+
+def _txn(day: int, symbol: str, side: str = "BUY", shares: float = 1):
+    return {"timestamp": f"2024-01-{day:02d}T00:00:00Z", "type": side, "shares": shares, "symbol": symbol,
+            "price": 100.0}
+
+
+# Newest first, as cached by the user-context segments
+TXNS = [_txn(day, symbol) for day in range(28, 0, -1) for symbol in ("AAPL", "MSFT", "TSLA", "NVDA")]
+
+
+class TestContextAssembler(unittest.TestCase):
+
+    def test_summarize_transactions_keeps_recent_rows_and_aggregates(self):
+        from core.agents.context_assembler import summarize_transactions
+
+        full, compact = summarize_transactions(TXNS, tickers=["NVDA"], recent=4)
+
+        recent_block, per_symbol = full.split("Per symbol:\n")
+        self.assertEqual(recent_block.splitlines()[1], "2024-01-28 BUY 1 NVDA @ $100.00")
+        self.assertTrue(per_symbol.startswith("NVDA: 28 trades (28 buys/0 sells), net 28 shares"))
+        self.assertIn("AAPL: 28 trades", compact)
+        self.assertNotIn("2024-01-28 BUY", compact)
+
+    def test_stays_within_budget_and_trims_low_priority_segments(self):
+        from core.agents.context_assembler import assemble_context, estimate_tokens
+
+        segments = {
+            "portfolio": "Total Value: $10,000.00.\nHoldings:\n- AAPL: 10 shares @ $100.00.",
+            "transactions": TXNS,
+            "history": "USER: hi\n" * 200,
+            "market": "AAPL is tradable. Price: $100.00",
+            "rag": "Diversification reduces risk.",
+        }
+        context, report = assemble_context(segments, intent="ADVICE", tickers=["AAPL"], budget=300)
+
+        self.assertLessEqual(estimate_tokens(context), 300)
+        self.assertLessEqual(report["total"], 300)
+        self.assertIn("[Market Setup]", context)
+        self.assertIn("AAPL: 10 shares", context)
+        # Lowest-priority segment for ADVICE only gets what is left over
+        self.assertLess(report["history"], estimate_tokens(segments["history"]))
+
+    def test_section_order_is_stable_across_intents(self):
+        from core.agents.context_assembler import assemble_context
+
+        segments = {"portfolio": "P", "transactions": [], "history": "H", "market": "M", "rag": "R"}
+        advice, _ = assemble_context(segments, intent="ADVICE")
+        chat, _ = assemble_context(segments, intent="GENERAL_CHAT")
+
+        self.assertEqual(advice, chat)
+        self.assertLess(advice.index("## PORTFOLIO"), advice.index("[Market Setup]"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+"""Unit tests for per-turn context planning."""
+import unittest
+
+
+class TestContextPlanner(unittest.TestCase):
+
+    def test_small_talk_needs_no_context(self):
+        from core.agents.context_planner import plan_context
+
+        self.assertEqual(plan_context("GENERAL_CHAT", "Hello!"), [])
+        self.assertEqual(plan_context("CANCEL_TRADE", "no, cancel"), [])
+
+    def test_price_question_fetches_quote_only(self):
+        from core.agents.context_planner import plan_context
+
+        self.assertEqual(plan_context("ADVICE", "What is the current price of TSLA?", ticker_mentioned=True),
+                         ["market"])
+
+    def test_personal_and_knowledge_questions(self):
+        from core.agents.context_planner import plan_context
+
+        self.assertEqual(plan_context("ADVICE", "How diversified is my portfolio?"), ["portfolio", "history", "rag"])
+        self.assertEqual(plan_context("ADVICE", "Should I sell my NVDA?", ticker_mentioned=True),
+                         ["portfolio", "transactions", "history", "market", "rag"])
+        self.assertEqual(plan_context("GENERAL_CHAT", "Can you explain what an ETF is?"), ["rag"])
+        self.assertEqual(plan_context("GENERAL_CHAT", "Tell me more about that"), ["history"])
+
+
+if __name__ == '__main__':
+    unittest.main()
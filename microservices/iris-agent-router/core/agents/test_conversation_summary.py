@@ -0,0 +1,89 @@
+"""Unit tests for rolling conversation summarization."""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+
+def _conversation(turns, words=50):
+    messages = []
+    for i in range(turns):
+        messages.append(("human", f"question {i} " + "word " * words))
+        messages.append(("ai", f"answer {i} " + "word " * words))
+    return messages
+
+
+class TestConversationSummary(unittest.TestCase):
+
+    def test_split_keeps_last_turns_verbatim(self):
+        from core.agents.conversation_summary import split_for_summary
+
+        older, recent = split_for_summary(_conversation(5), keep_turns=2)
+        self.assertEqual(len(older), 6)
+        self.assertEqual([m[1].split()[1] for m in recent], ["3", "3", "4", "4"])
+        self.assertEqual(split_for_summary(_conversation(2), keep_turns=2), ([], _conversation(2)))
+
+    def test_needs_summary_only_past_threshold(self):
+        from core.agents.conversation_summary import needs_summary
+
+        self.assertFalse(needs_summary(_conversation(2), threshold=300, keep_turns=1))
+        self.assertTrue(needs_summary(_conversation(4), threshold=300, keep_turns=1))
+        self.assertFalse(needs_summary(_conversation(4), threshold=10_000, keep_turns=1))
+
+    def test_background_summary_folds_older_turns(self):
+        """Test that older turns are replaced by a summary that the next prompt includes."""
+        from langgraph.checkpoint.memory import InMemorySaver
+        from core.agents import agent_router
+        from core.agents.agent_router import builder, asummarize_conversation, _build_response_messages
+        from core.agents.checkpointer import thread_config
+
+        agent = builder.compile(checkpointer=InMemorySaver())
+        config = thread_config("u1")
+        asyncio.run(agent.aupdate_state(config, {"messages": _conversation(6, words=200)}, as_node="respond"))
+        summary_llm = MagicMock()
+        summary_llm.ainvoke = AsyncMock(return_value=" User is saving for retirement and asked about ETFs. ")
+
+        with patch.object(agent_router, "conversation_agent", agent), \
+                patch.dict(agent_router._primary_clients, {"summary": summary_llm}):
+            asyncio.run(asummarize_conversation("u1"))
+            state = asyncio.run(agent.aget_state(config)).values
+
+            # Below the threshold now: no further summarization
+            asyncio.run(asummarize_conversation("u1"))
+
+        summary_llm.ainvoke.assert_awaited_once()
+        self.assertEqual(state["summary"], "User is saving for retirement and asked about ETFs.")
+        self.assertEqual(len(state["messages"]), 6)  # SUMMARY_KEEP_TURNS exchanges
+        self.assertIn("question 0", summary_llm.ainvoke.await_args.args[0])
+        prompt = "\n".join(m.content for m in _build_response_messages({**state, "tool_outputs": {}}))
+        self.assertIn("saving for retirement", prompt)
+        self.assertNotIn("question 0", prompt)
+
+    def test_summary_skipped_when_a_turn_checkpoints_meanwhile(self):
+        """Test that a summary generated against an outdated checkpoint is not written."""
+        from langgraph.checkpoint.memory import InMemorySaver
+        from core.agents import agent_router
+        from core.agents.agent_router import builder, asummarize_conversation
+        from core.agents.checkpointer import thread_config
+
+        agent = builder.compile(checkpointer=InMemorySaver())
+        config = thread_config("u1")
+        asyncio.run(agent.aupdate_state(config, {"messages": _conversation(6, words=200)}, as_node="respond"))
+
+        async def summarize_during_turn(prompt, *args, **kwargs):
+            await agent.aupdate_state(config, {"messages": [("human", "new question"), ("ai", "new answer")]},
+                                      as_node="respond")
+            return "stale summary"
+        summary_llm = MagicMock()
+        summary_llm.ainvoke = AsyncMock(side_effect=summarize_during_turn)
+
+        with patch.object(agent_router, "conversation_agent", agent), \
+                patch.dict(agent_router._primary_clients, {"summary": summary_llm}):
+            asyncio.run(asummarize_conversation("u1"))
+
+        state = asyncio.run(agent.aget_state(config)).values
+        self.assertFalse(state.get("summary"))
+        self.assertEqual(len(state["messages"]), 14)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Tests for request deadlines in the agent nodes."""
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from langchain_core.messages import AIMessageChunk
+
+
+def _slow_astream(prompt, *args, **kwargs):
+    async def astream():
+        yield AIMessageChunk(content="Hello")
+        await asyncio.sleep(5)
+        yield AIMessageChunk(content=" never")
+    return astream()
+
+
+def _state(text, seconds_left, **extra):
+    return {"user_id": "u1", "messages": [("human", text)], "intent": "ADVICE", "tool_outputs": {},
+            "deadline": time.time() + seconds_left, **extra}
+
+
+class TestDeadline(unittest.TestCase):
+
+    @patch('core.agents.agent_router.alookup_rag_context', new_callable=AsyncMock)
+    @patch('core.agents.agent_router.aget_market_data_batch', new_callable=AsyncMock)
+    @patch('core.tools.semantic_cache.response_cache.enabled', False)
+    def test_low_budget_skips_context(self, mock_market, mock_rag):
+        from core.agents import deadline
+        from core.agents.agent_router import afetch_financial_data
+
+        state = _state("Explain AAPL dividends", deadline.RESPONSE_RESERVE + 0.1, context_plan=["market", "rag"])
+        self.assertEqual(asyncio.run(afetch_financial_data(state)), {"tool_outputs": {}})
+        mock_market.assert_not_called()
+
+        mock_market.return_value, mock_rag.return_value = "AAPL: $190", ""
+        state["deadline"] = time.time() + deadline.RESPONSE_RESERVE + 5
+        context = asyncio.run(afetch_financial_data(state))["tool_outputs"]["context_data"]
+        self.assertIn("AAPL: $190", context)
+
+    @patch.dict('core.agents.agent_router._primary_clients')
+    def test_generation_cancelled_at_deadline(self):
+        from core.agents import agent_router
+        from core.agents.agent_router import agenerate_response
+        from core.agents.deadline import DeadlineExceeded
+
+        mock_llm = agent_router._primary_clients["response"] = MagicMock()
+        mock_llm.astream = _slow_astream
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(agenerate_response(_state("Hi", 0.2)))
+        self.assertLess(time.monotonic() - start, 2)
+
+        # An executed order is still reported
+        confirmed = _state("yes", 0.2, intent="CONFIRM_TRADE", tool_outputs={"trade_result": "Order placed"})
+        result = asyncio.run(agenerate_response(confirmed))
+        self.assertEqual(result["messages"][0][1], "Hello\n\nOrder placed")
+
+    @patch('core.agents.agent_router.aexecute_trade_action', new_callable=AsyncMock)
+    def test_no_order_after_deadline(self, mock_execute):
+        from core.agents.agent_router import aexecute_trade_node
+        from core.agents.deadline import DeadlineExceeded
+
+        pending = {"symbol": "AAPL", "action": "buy", "quantity": 1, "amount": 0}
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(aexecute_trade_node(_state("yes", -1, intent="CONFIRM_TRADE", pending_trade=pending)))
+        mock_execute.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Unit tests for the nearest-centroid intent classifier."""
+import re
+import unittest
+from unittest.mock import patch
+
+VOCAB = ["buy", "sell", "shares", "invest", "price", "market", "outlook", "portfolio", "risk", "hello", "thanks", "hi"]
+
+
+def _embed(text: str) -> list:
+    """Bag-of-words stand-in for MiniLM."""
+    words = re.findall(r"[a-z]+", text.lower())
+    return [float(words.count(w)) for w in VOCAB] + [0.01]
+
+
+def _embed_many(texts: list) -> list:
+    return [_embed(t) for t in texts]
+
+
+EXAMPLES = {
+    "TRADE": ["buy shares", "sell shares", "invest"],
+    "ADVICE": ["price outlook", "market outlook", "portfolio risk"],
+    "GENERAL_CHAT": ["hello", "thanks", "hi"],
+}
+
+
+class TestIntentClassifier(unittest.TestCase):
+
+    def test_nearest_centroid_and_threshold(self):
+        from core.agents.intent_classifier import IntentClassifier
+
+        classifier = IntentClassifier(_embed, _embed_many, threshold=0.6).fit(EXAMPLES)
+
+        self.assertEqual(classifier.classify("please buy 5 shares"), "TRADE")
+        self.assertEqual(classifier.classify("what is the market outlook"), "ADVICE")
+        self.assertEqual(classifier.classify("hello there"), "GENERAL_CHAT")
+        # Equidistant from every centroid: abstain so keyword rules decide
+        self.assertIsNone(classifier.classify("what a day"))
+
+    def test_evaluate_reports_accuracy_and_fallback_rate(self):
+        from core.agents.intent_classifier import IntentClassifier, evaluate
+
+        classifier = IntentClassifier(_embed, _embed_many).fit(EXAMPLES)
+        report = evaluate(classifier, {"TRADE": ["sell shares now", "what a day"], "ADVICE": ["risk"]})
+
+        self.assertEqual(report["TRADE"], 0.5)
+        self.assertEqual(report["ADVICE"], 1.0)
+        self.assertAlmostEqual(report["fallback_rate"], 1 / 3)
+
+    def test_eval_set_covers_every_intent(self):
+        from core.agents.intent_classifier import load_intent_data
+
+        data = load_intent_data()
+        self.assertEqual(set(data["examples"]), {"TRADE", "ADVICE", "GENERAL_CHAT"})
+        self.assertEqual(set(data["eval"]), set(data["examples"]))
+
+    def test_classify_intent_uses_classifier_then_keyword_fallback(self):
+        from core.agents.agent_router import classify_intent, intent_classifier
+
+        state = {"user_id": "u", "messages": [("human", "Can you book a table?")], "intent": "", "tool_outputs": {}}
+        with patch.object(intent_classifier, "classify", return_value="ADVICE"):
+            self.assertEqual(classify_intent(state)["intent"], "ADVICE")
+        with patch.object(intent_classifier, "classify", return_value=None):
+            self.assertEqual(classify_intent(state)["intent"], "GENERAL_CHAT")
+
+        # "book" must not confirm a pending trade through the "ok" substring
+        pending = dict(state, pending_trade={"symbol": "AAPL"})
+        self.assertEqual(classify_intent(pending)["intent"], "GENERAL_CHAT")
+
+
+if __name__ == '__main__':
+    unittest.main()
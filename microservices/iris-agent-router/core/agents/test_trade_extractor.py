@@ -0,0 +1,60 @@
+"""Unit tests for the deterministic trade extractor."""
+import unittest
+
+
+class TestTradeExtractor(unittest.TestCase):
+
+    def test_common_phrasings_are_extracted_confidently(self):
+        from core.agents.trade_extractor import extract_trade
+
+        cases = {
+            "Buy 15 shares of NVDA": ("NVDA", "buy", 15.0, 0.0),
+            "sell $500 of apple": ("AAPL", "sell", 0.0, 500.0),
+            "invest 2k in the S&P 500": ("SPY", "buy", 0.0, 2000.0),
+            "get me 2 nvidia": ("NVDA", "buy", 2.0, 0.0),
+            "Please purchase 1.5 shares of $brk.b": ("BRK.B", "buy", 1.5, 0.0),
+        }
+        for text, expected in cases.items():
+            result = extract_trade(text)
+            self.assertEqual((result["symbol"], result["action"], result["quantity"], result["amount"]), expected, text)
+            self.assertEqual(result["confidence"], 1.0, text)
+
+    def test_ambiguous_requests_have_low_confidence(self):
+        from core.agents.trade_extractor import extract_trade, MIN_CONFIDENCE
+
+        for text in ["Sell half my AAPL", "Invest $2500 in high growth stocks",
+                     "sell AAPL and buy MSFT", "buy 5 shares of AAPL and MSFT", "buy 5 shares of XYZQ"]:
+            self.assertLess(extract_trade(text)["confidence"], MIN_CONFIDENCE, text)
+
+    def test_tradable_lookup_trusts_unlisted_tickers(self):
+        from core.agents.trade_extractor import extract_trade
+
+        result = extract_trade("buy 5 shares of XYZQ", is_tradable=lambda symbol: symbol == "XYZQ")
+        self.assertEqual(result["confidence"], 1.0)
+
+    def test_all_mentioned_symbols_found_in_order(self):
+        from core.agents.trade_extractor import find_symbols
+
+        symbols = [s for s, _ in find_symbols("Compare AAPL vs microsoft, $NVDA and the S&P 500 YTD")]
+        self.assertEqual(symbols, ["AAPL", "MSFT", "NVDA", "SPY"])
+
+    def test_llm_output_is_validated_against_schema(self):
+        from core import metrics
+        from core.agents.trade_extractor import parse_llm_extraction
+
+        metrics.reset()
+        strict = parse_llm_extraction('{"symbol": "$nvda", "action": "BUY", "quantity": null, "amount": 1000}')
+        self.assertEqual((strict.symbol, strict.action, strict.quantity, strict.amount), ("NVDA", "buy", 0, 1000))
+
+        repaired = parse_llm_extraction('Sure! {"symbol": "null", "action": "sell", "quantity": 2}')
+        self.assertIsNone(repaired.symbol)
+        self.assertIsNone(parse_llm_extraction('{"symbol": "AAPL", "action": "hold"}'))
+
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(counters["trade_extraction.parse_failure"], 2)
+        self.assertEqual(counters["trade_extraction.parse_repaired"], 1)
+        self.assertEqual(counters["trade_extraction.parse_error"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+"""Deterministic trade extraction.
+
+Handles the common, well-structured phrasings ("Buy 15 shares of NVDA",
+"sell $500 of apple", "invest 2k in the S&P 500") with regular expressions and
+a symbol dictionary in microseconds. Anything ambiguous gets a low confidence
+so the caller falls back to the LLM extractor.
+
+The LLM fallback is constrained to the TradeExtraction JSON schema (Ollama
+structured outputs), so its output is parsed and validated directly.
+"""
+import json
+import os
+import re
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from core import metrics
+
+MIN_CONFIDENCE = float(os.getenv("TRADE_EXTRACTION_MIN_CONFIDENCE", "0.8"))
+# Token cap for the LLM extractor: the JSON object is ~40 tokens, so generation
+# stops right after it instead of running on
+EXTRACTION_NUM_PREDICT = int(os.getenv("TRADE_EXTRACTION_NUM_PREDICT", "96"))
+
+# Company names / index nicknames -> ticker. Longest names are matched first.
+SYMBOL_ALIASES = {
+    "apple": "AAPL", "microsoft": "MSFT", "nvidia": "NVDA", "tesla": "TSLA",
+    "amazon": "AMZN", "google": "GOOGL", "alphabet": "GOOGL", "meta": "META",
+    "facebook": "META", "netflix": "NFLX", "amd": "AMD", "intel": "INTC",
+    "broadcom": "AVGO", "salesforce": "CRM", "oracle": "ORCL", "adobe": "ADBE",
+    "palantir": "PLTR", "coinbase": "COIN", "paypal": "PYPL", "disney": "DIS",
+    "walmart": "WMT", "costco": "COST", "berkshire": "BRK.B", "jpmorgan": "JPM",
+    "jp morgan": "JPM", "visa": "V", "mastercard": "MA", "coca cola": "KO",
+    "coca-cola": "KO", "pepsi": "PEP", "exxon": "XOM", "chevron": "CVX",
+    "boeing": "BA", "uber": "UBER", "airbnb": "ABNB", "shopify": "SHOP",
+    "s&p 500": "SPY", "s&p500": "SPY", "s&p": "SPY", "sp500": "SPY",
+    "nasdaq": "QQQ", "nasdaq 100": "QQQ", "dow jones": "DIA", "dow": "DIA",
+    "total market": "VTI", "russell 2000": "IWM", "bitcoin etf": "IBIT",
+}
+
+# Well-known tickers accepted without an asset lookup
+KNOWN_SYMBOLS = set(SYMBOL_ALIASES.values()) | {
+    "SPY", "QQQ", "VOO", "VTI", "IWM", "DIA", "SCHD", "ARKK", "SOXX", "SMH", "XLK", "XLF", "XLE", "GLD", "TLT",
+}
+
+# Upper-case words that are not tickers
+_NOT_SYMBOLS = {"I", "A", "BUY", "SELL", "ME", "MY", "OF", "IN", "AT", "FOR", "AND", "OR", "THE", "USD",
+                "ETF", "ASAP", "OK", "PLEASE", "NOW", "IS", "IT", "TO", "ALL", "WHAT", "HOW", "WHY",
+                "VS", "US", "USA", "CEO", "IPO", "AI", "EPS", "PE", "GDP", "FED", "YTD", "ROI", "IRA", "DO", "ARE"}
+
+_BUY_WORDS = r"buy|purchase|invest|acquire|get|add"
+_SELL_WORDS = r"sell|dump|unload|liquidate|trim"
+_BUY_RE = re.compile(rf"\b(?:{_BUY_WORDS})\b", re.IGNORECASE)
+_SELL_RE = re.compile(rf"\b(?:{_SELL_WORDS})\b", re.IGNORECASE)
+
+_NUMBER = r"(\d[\d,]*(?:\.\d+)?)\s*(k|m|thousand|million)?"
+_AMOUNT_RES = [
+    re.compile(rf"\$\s*{_NUMBER}", re.IGNORECASE),
+    re.compile(rf"\b{_NUMBER}\s*(?:dollars|usd|bucks)\b", re.IGNORECASE),
+    re.compile(r"(?<![$\d])\b(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|million)\b(?!\s*(?:dollars|usd|bucks|shares?))",
+               re.IGNORECASE),
+]
+_QUANTITY_RE = re.compile(r"\b(\d[\d,]*(?:\.\d+)?)\s*(?:shares?|stocks?|units?)\b", re.IGNORECASE)
+# "buy 15 NVDA" / "sell 2.5 TSLA"
+_BARE_QUANTITY_RE = re.compile(r"\b(?:" + _BUY_WORDS + "|" + _SELL_WORDS + r")(?:\s+me)?"
+                               r"\s+(\d[\d,]*(?:\.\d+)?)\s+\$?([A-Za-z][A-Za-z.]{0,5})\b", re.IGNORECASE)
+# Relative quantities need the current position: leave them to the LLM
+_RELATIVE_RE = re.compile(r"\b(half|quarter|third|all|everything|rest|remaining|some|few|percent)\b|%", re.IGNORECASE)
+_CASHTAG_RE = re.compile(r"\$([A-Za-z][A-Za-z.]{0,5})\b")
+_TICKER_RE = re.compile(r"\b([A-Z][A-Z.]{0,5})\b")
+
+_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "million": 1e6}
+
+_ALIAS_RE = re.compile(
+    r"\b(" + "|".join(re.escape(a) for a in sorted(SYMBOL_ALIASES, key=len, reverse=True)) + r")(?![\w&])",
+    re.IGNORECASE,
+)
+
+
+def _to_number(digits: str, suffix) -> float:
+    return float(digits.replace(",", "")) * _MULTIPLIERS.get((suffix or "").lower(), 1)
+
+
+def find_symbols(text: str, is_tradable=None) -> list:
+    """Candidate symbols as (symbol, known) pairs, in order of appearance, deduplicated."""
+    found = []
+    alias_spans = []
+    for match in _ALIAS_RE.finditer(text):
+        found.append((match.start(), SYMBOL_ALIASES[match.group(1).lower()]))
+        alias_spans.append(match.span())
+
+    def inside_alias(pos):
+        return any(start <= pos < end for start, end in alias_spans)  # e.g. the "P" in "S&P"
+
+    for match in _CASHTAG_RE.finditer(text):
+        found.append((match.start(), match.group(1).upper()))
+    for match in _TICKER_RE.finditer(text):
+        if match.group(1) not in _NOT_SYMBOLS and not inside_alias(match.start()):
+            found.append((match.start(), match.group(1)))
+
+    symbols = []
+    for _, symbol in sorted(found):
+        if symbol not in [s for s, _ in symbols]:
+            known = symbol in KNOWN_SYMBOLS or bool(is_tradable and is_tradable(symbol))
+            symbols.append((symbol, known))
+    return symbols
+
+
+def extract_trade(text: str, is_tradable=None) -> dict:
+    """Extracts {symbol, action, quantity, amount, confidence} from a trade request.
+
+    `is_tradable(symbol)` is an optional non-blocking lookup (e.g. the preloaded
+    asset cache) used to trust tickers that are not in the built-in dictionary.
+    Undetermined symbol/action are None and quantity/amount 0; confidence is
+    in [0, 1].
+    """
+    result = {"symbol": None, "action": None, "quantity": 0.0, "amount": 0.0, "confidence": 0.0}
+    confidence = 1.0
+
+    buys, sells = bool(_BUY_RE.search(text)), bool(_SELL_RE.search(text))
+    if buys == sells:
+        return result  # No side, or both ("sell AAPL and buy MSFT")
+    result["action"] = "buy" if buys else "sell"
+
+    amounts = [_to_number(m.group(1), m.group(2)) for r in _AMOUNT_RES for m in r.finditer(text)]
+    quantities = [_to_number(m.group(1), None) for m in _QUANTITY_RE.finditer(text)]
+    bare = _BARE_QUANTITY_RE.search(text)
+    if not quantities and bare and (bare.group(2).isupper() or bare.group(2).lower() in SYMBOL_ALIASES):
+        quantities = [_to_number(bare.group(1), None)]
+
+    if len(amounts) > 1 or len(quantities) > 1 or (amounts and quantities):
+        confidence -= 0.5  # Conflicting sizes
+    elif not amounts and not quantities:
+        confidence -= 0.3  # Size missing: caller defaults to 1 share
+    if _RELATIVE_RE.search(text):
+        confidence -= 0.5
+    result["amount"] = amounts[0] if amounts else 0.0
+    result["quantity"] = quantities[0] if quantities else 0.0
+
+    symbols = find_symbols(text, is_tradable)
+    if not symbols:
+        confidence = 0.0  # Strategy-style request ("high growth"): needs the LLM
+    else:
+        result["symbol"] = symbols[0][0]
+        if len(symbols) > 1:
+            confidence -= 0.5
+        if not symbols[0][1]:
+            confidence -= 0.3  # Unrecognised ticker-like word
+
+    result["confidence"] = round(max(confidence, 0.0), 2)
+    return result
+
+
+class TradeExtraction(BaseModel):
+    """Schema the LLM extractor is constrained to."""
+    symbol: Optional[str] = None
+    action: Literal["buy", "sell"] = "buy"
+    quantity: float = 0
+    amount: float = 0
+    strategy: str = ""
+
+    @field_validator("symbol", mode="before")
+    @classmethod
+    def _normalize_symbol(cls, value):
+        if value is None or str(value).strip().lower() in ("", "null", "none"):
+            return None
+        return str(value).strip().lstrip("$").upper()
+
+    @field_validator("action", mode="before")
+    @classmethod
+    def _normalize_action(cls, value):
+        return str(value or "buy").strip().lower()
+
+    @field_validator("quantity", "amount", mode="before")
+    @classmethod
+    def _default_zero(cls, value):
+        return 0 if value in (None, "", "null") else value
+
+
+TRADE_SCHEMA = TradeExtraction.model_json_schema()
+
+
+def parse_llm_extraction(response: str):
+    """Validates the LLM extractor output against TradeExtraction, or returns None.
+
+    Schema-constrained output parses directly; otherwise the first {...} block
+    is salvaged (e.g. a model without structured-output support).
+    """
+    try:
+        return TradeExtraction.model_validate_json(response)
+    except ValidationError:
+        metrics.incr("trade_extraction.parse_failure")
+
+    match = re.search(r"\{.*\}", response or "", re.DOTALL)
+    if match:
+        try:
+            extraction = TradeExtraction.model_validate(json.loads(match.group(0)))
+            metrics.incr("trade_extraction.parse_repaired")
+            return extraction
+        except (ValueError, ValidationError):
+            pass
+    metrics.incr("trade_extraction.parse_error")
+    return None
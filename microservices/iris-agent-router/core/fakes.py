@@ -0,0 +1,71 @@
+"""In-memory test doubles shared by the test suites.
+
+CI runs the suites with `unittest discover` (no pytest), so the doubles live
+in an importable module rather than in conftest fixtures.
+"""
+from langchain_core.messages import AIMessageChunk
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the redis client. TTLs are recorded, not enforced."""
+
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        self.ttls[key] = ex if px is None else px / 1000
+        return True
+
+    def setex(self, key, ttl, value):
+        self.set(key, value, ex=ttl)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def rpush(self, key, *values):
+        self.store.setdefault(key, []).extend(values)
+
+    def lrange(self, key, start, end):
+        return list(self.store.get(key, []))
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+    def pipeline(self):
+        return self  # Commands apply immediately
+
+    def execute(self):
+        return []
+
+
+class FakeAsyncRedis:
+    """Async facade over a FakeRedis (a new one by default)."""
+
+    def __init__(self, sync=None):
+        self.sync = sync if sync is not None else FakeRedis()
+
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+def fake_astream(tokens):
+    """Stand-in for LLM.astream that yields the given tokens."""
+    async def astream(prompt, *args, **kwargs):
+        for token in tokens:
+            yield AIMessageChunk(content=token)
+    return astream
@@ -0,0 +1,72 @@
+"""Lightweight in-process metrics for the agent router.
+
+Keeps latency summaries and counters in memory so they can be exposed via the
+`/metrics` endpoint without pulling in a metrics backend.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_timings = {}
+_counters = {}
+_gauges = {}
+
+
+def observe(name: str, seconds: float):
+    """Records a latency sample (in seconds) under the given metric name."""
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            stats = {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+            _timings[name] = stats
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["last"] = seconds
+        if seconds > stats["max"]:
+            stats["max"] = seconds
+
+
+def incr(name: str, amount: int = 1):
+    """Increments a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name: str, value: float):
+    """Sets a point-in-time value (e.g. model load time)."""
+    with _lock:
+        _gauges[name] = value
+
+
+@contextmanager
+def timed(name: str):
+    """Context manager that records the wall-clock duration of its block."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot() -> dict:
+    """Returns a JSON-serializable copy of all metrics (latencies in ms)."""
+    with _lock:
+        timings = {}
+        for name, stats in _timings.items():
+            count = stats["count"]
+            timings[name] = {
+                "count": count,
+                "avg_ms": round(stats["total"] / count * 1000, 3) if count else 0.0,
+                "max_ms": round(stats["max"] * 1000, 3),
+                "last_ms": round(stats["last"] * 1000, 3),
+            }
+        return {"timings": timings, "counters": dict(_counters), "gauges": dict(_gauges)}
+
+
+def reset():
+    """Clears all metrics (used by tests)."""
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+        _gauges.clear()
@@ -0,0 +1,239 @@
+"""In-process caching primitives for hot upstream data (quotes, assets, ...).
+
+- TTLCache: thread-safe LRU with per-entry expiry.
+- SingleFlight: coalesces concurrent loads of the same key into one call.
+- TieredCache: TTLCache + optional shared Redis tier + SingleFlight.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from core import metrics
+
+# Returned by TTLCache.get for an absent key (None is a cacheable value)
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Ensures only one load per key is in flight; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._acalls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key, afn):
+        """Async variant of do.
+
+        The load runs as its own task that every caller awaits through a
+        shield, so a caller cancelled by its own timeout or deadline leaves
+        the load running for the others.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        task = self._acalls.get(flight_key)
+        if task is None:
+            task = loop.create_task(afn())
+            self._acalls[flight_key] = task
+            task.add_done_callback(lambda done: self._afinish(flight_key, done))
+        return await asyncio.shield(task)
+
+    def _afinish(self, flight_key, task):
+        if self._acalls.get(flight_key) is task:
+            del self._acalls[flight_key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved when every caller has gone
+
+
+class TieredCache:
+    """Local TTL cache with an optional shared Redis tier and request coalescing.
+
+    `loader` returning None is treated as a negative result and only cached
+    for `negative_ttl` seconds (0 disables negative caching). Loader exceptions
+    are never cached.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024, negative_ttl: float = 0.0,
+                 redis_client=None, async_redis_client=None):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self._local = TTLCache(maxsize)
+        self._flight = SingleFlight()
+
+    def _redis_key(self, key) -> str:
+        return f"iris:{self.name}:{key}"
+
+    def _ttl_for(self, value) -> float:
+        return self.negative_ttl if value is None else self.ttl
+
+    def _local_hit(self, key):
+        value = self._local.get(key)
+        if value is not MISSING:
+            metrics.incr(f"cache.{self.name}.hit")
+        return value
+
+    def _from_redis_raw(self, key, raw):
+        value = json.loads(raw)
+        self._local.set(key, value, self._ttl_for(value))
+        metrics.incr(f"cache.{self.name}.redis_hit")
+        return value
+
+    def peek(self, key, default=None):
+        """Returns the locally cached value without loading."""
+        value = self._local.get(key)
+        return default if value is MISSING else value
+
+    def set(self, key, value):
+        """Stores a value in both tiers (e.g. populated from a bulk fetch)."""
+        ttl = self._ttl_for(value)
+        if ttl <= 0:
+            return
+        self._local.set(key, value, ttl)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(self._redis_key(key), json.dumps(value), px=int(ttl * 1000))
+            except Exception as e:
+                print(f"{self.name} cache: Redis write failed: {e}")
+
+    async def aset(self, key, value):
+        ttl = self._ttl_for(value)
+        if ttl <= 0:
+            return
+        self._local.set(key, value, ttl)
+        if self.async_redis_client is not None:
+            try:
+                await self.async_redis_client.set(self._redis_key(key), json.dumps(value), px=int(ttl * 1000))
+            except Exception as e:
+                print(f"{self.name} cache: Redis write failed: {e}")
+
+    def get_or_load(self, key, loader):
+        value = self._local_hit(key)
+        if value is not MISSING:
+            return value
+        return self._flight.do(key, lambda: self._load(key, loader))
+
+    def _load(self, key, loader):
+        if self.redis_client is not None:
+            try:
+                raw = self.redis_client.get(self._redis_key(key))
+                if raw is not None:
+                    return self._from_redis_raw(key, raw)
+            except Exception as e:
+                print(f"{self.name} cache: Redis read failed: {e}")
+
+        metrics.incr(f"cache.{self.name}.miss")
+        value = loader()
+        self.set(key, value)
+        return value
+
+    async def aget_or_load(self, key, aloader):
+        value = self._local_hit(key)
+        if value is not MISSING:
+            return value
+        return await self._flight.ado(key, lambda: self._aload(key, aloader))
+
+    async def _aload(self, key, aloader):
+        if self.async_redis_client is not None:
+            try:
+                raw = await self.async_redis_client.get(self._redis_key(key))
+                if raw is not None:
+                    return self._from_redis_raw(key, raw)
+            except Exception as e:
+                print(f"{self.name} cache: Redis read failed: {e}")
+
+        metrics.incr(f"cache.{self.name}.miss")
+        value = await aloader()
+        await self.aset(key, value)
+        return value
+
+    def invalidate(self, key):
+        self._local.delete(key)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(self._redis_key(key))
+            except Exception as e:
+                print(f"{self.name} cache: Redis delete failed: {e}")
+
+    async def ainvalidate(self, key):
+        self._local.delete(key)
+        if self.async_redis_client is not None:
+            try:
+                await self.async_redis_client.delete(self._redis_key(key))
+            except Exception as e:
+                print(f"{self.name} cache: Redis delete failed: {e}")
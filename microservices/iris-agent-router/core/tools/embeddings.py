@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+
+import lancedb
+
+from core import metrics
+from core.tools.cache import TTLCache, SingleFlight, MISSING
+
+# --- CONFIGURATION ---
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# LanceDB path must match the PVC mount in the K8s manifest
+LANCE_DB_PATH = os.getenv("LANCE_DB_PATH", "/data/db/lancedb")
+KNOWLEDGE_TABLE = "financial_knowledge"
+# Recent query embeddings are memoised: one chat turn embeds the same text for
+# RAG lookup and the semantic response cache
+EMBEDDING_MEMO_SIZE = int(os.getenv("EMBEDDING_MEMO_SIZE", "512"))
+EMBEDDING_MEMO_TTL = 300
+# How often (seconds) the cached table handle checks for a newer table version
+LANCE_VERSION_CHECK_SECONDS = float(os.getenv("LANCE_VERSION_CHECK_SECONDS", "30"))
+
+
+class EmbeddingService:
+    """Process-wide SentenceTransformer, loaded once and shared by all requests."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+        self.load_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._memo = TTLCache(EMBEDDING_MEMO_SIZE)
+        self._flight = SingleFlight()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """Loads the model (idempotent) and runs a warm-up encode."""
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+
+                start = time.perf_counter()
+                model = SentenceTransformer(self.model_name)
+                # Warm-up: first encode pays tokenizer/graph initialisation
+                model.encode("warm up")
+                self.load_seconds = time.perf_counter() - start
+                metrics.set_gauge("embedding.load_seconds", round(self.load_seconds, 3))
+                print(f"Loaded embedding model {self.model_name} in {self.load_seconds:.2f}s")
+                self._model = model
+        return self._model
+
+    def encode(self, text: str) -> list:
+        """Embeds a single text into a plain list of floats."""
+        embedding = self._memo.get(text)
+        if embedding is not MISSING:
+            return embedding
+        return self._flight.do(text, lambda: self._encode(text))
+
+    def encode_many(self, texts: list) -> list:
+        """Embeds a batch of texts in one model call (not memoised)."""
+        model = self.load()
+        with metrics.timed("embedding.encode_many"):
+            return model.encode(texts).tolist()
+
+    def _encode(self, text: str) -> list:
+        model = self.load()
+        with metrics.timed("embedding.encode"):
+            embedding = model.encode(text).tolist()
+        self._memo.set(text, embedding, EMBEDDING_MEMO_TTL)
+        return embedding
+
+
+class KnowledgeBase:
+    """Cached LanceDB connection and table handle for the RAG knowledge base.
+
+    The table handle is reused across requests and only reopened when the
+    on-disk table version changes (e.g. after re-running ingest_knowledge.py).
+    """
+
+    def __init__(self, db_path: str = LANCE_DB_PATH, table_name: str = KNOWLEDGE_TABLE,
+                 check_interval: float = LANCE_VERSION_CHECK_SECONDS):
+        self.db_path = db_path
+        self.table_name = table_name
+        self.check_interval = check_interval
+        self._db = None
+        self._table = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            self._db = lancedb.connect(self.db_path)
+        return self._db
+
+    def _latest_version(self):
+        return max(v["version"] for v in self._table.list_versions())
+
+    def invalidate(self):
+        """Drops the cached table handle so the next lookup reopens it."""
+        with self._lock:
+            self._table = None
+
+    def table(self):
+        """Returns the open table, or None if the knowledge base is not initialized."""
+        with self._lock:
+            now = time.monotonic()
+            if self._table is not None and now - self._last_check >= self.check_interval:
+                self._last_check = now
+                try:
+                    if self._latest_version() != self._table.version:
+                        self._table = None
+                except Exception:
+                    # Table was dropped/recreated underneath us
+                    self._table = None
+
+            if self._table is None:
+                try:
+                    self._table = self._connect().open_table(self.table_name)
+                except ValueError:
+                    return None  # Table not created yet
+                self._last_check = now
+                metrics.incr("rag.table_opens")
+            return self._table
+
+    def search(self, embedding: list, limit: int = 2):
+        """Vector search returning a pandas DataFrame, or None if the table is missing."""
+        tbl = self.table()
+        if tbl is None:
+            return None
+        with metrics.timed("rag.search"):
+            try:
+                return tbl.search(embedding).limit(limit).to_pandas()
+            except Exception:
+                # Stale handle (table replaced): reopen once and retry
+                self.invalidate()
+                tbl = self.table()
+                if tbl is None:
+                    return None
+                return tbl.search(embedding).limit(limit).to_pandas()
+
+
+embedding_service = EmbeddingService()
+knowledge_base = KnowledgeBase()
+
+
+def warm_up():
+    """Loads the embedding model and opens the knowledge base at startup."""
+    try:
+        embedding_service.load()
+    except Exception as e:
+        print(f"Embedding model warm-up failed (will retry lazily): {e}")
+    try:
+        knowledge_base.table()
+    except Exception as e:
+        print(f"LanceDB warm-up failed (will retry lazily): {e}")
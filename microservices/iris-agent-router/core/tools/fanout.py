@@ -0,0 +1,73 @@
+"""Concurrent fan-out of independent I/O calls with per-call timeout budgets.
+
+Each task is `name -> (fn, args, timeout_seconds, fallback)`. All tasks start at
+once; a task that raises or exceeds its budget yields its fallback instead of
+failing the whole batch, so total latency is bounded by the slowest budget
+rather than the sum of all calls.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from core import metrics
+
+
+def fan_out(tasks: dict):
+    """Runs sync callables concurrently in threads.
+
+    Returns `(results, degraded)` where `degraded` is the set of task names that
+    fell back (timeout or error).
+    """
+    results, degraded = {}, set()
+    # A per-call pool keeps nested fan-outs (e.g. build_user_context inside
+    # fetch_financial_data) from starving each other of workers.
+    executor = ThreadPoolExecutor(max_workers=max(len(tasks), 1), thread_name_prefix="iris-fanout")
+    try:
+        start = time.monotonic()
+        futures = {name: executor.submit(fn, *args) for name, (fn, args, _, _) in tasks.items()}
+        for name, future in futures.items():
+            _, _, timeout, fallback = tasks[name]
+            remaining = max(timeout - (time.monotonic() - start), 0)
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                print(f"Fan-out task '{name}' exceeded {timeout}s budget, using fallback")
+                metrics.incr(f"fanout.timeout.{name}")
+                results[name] = fallback
+                degraded.add(name)
+            except Exception as e:
+                print(f"Fan-out task '{name}' failed: {e}")
+                metrics.incr(f"fanout.error.{name}")
+                results[name] = fallback
+                degraded.add(name)
+    finally:
+        # Don't block on stragglers that already blew their budget
+        executor.shutdown(wait=False)
+    return results, degraded
+
+
+async def afan_out(tasks: dict):
+    """Async counterpart of fan_out: `fn` is a coroutine function, run via gather."""
+    degraded = set()
+
+    async def run(name, fn, args, timeout, fallback):
+        try:
+            return await asyncio.wait_for(fn(*args), timeout)
+        except asyncio.TimeoutError:
+            print(f"Fan-out task '{name}' exceeded {timeout}s budget, using fallback")
+            metrics.incr(f"fanout.timeout.{name}")
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise  # The turn itself was cancelled
+            # Cancellation passed on by the sub-call only (e.g. a shared load): degrade this source
+            print(f"Fan-out task '{name}' was cancelled, using fallback")
+            metrics.incr(f"fanout.error.{name}")
+        except Exception as e:
+            print(f"Fan-out task '{name}' failed: {e}")
+            metrics.incr(f"fanout.error.{name}")
+        degraded.add(name)
+        return fallback
+
+    names = list(tasks)
+    values = await asyncio.gather(*(run(name, *tasks[name]) for name in names))
+    return dict(zip(names, values)), degraded
@@ -1,12 +1,17 @@
 import yfinance as yf
-import lancedb
+import asyncio
 import os
-import requests
+
+from core.tools.embeddings import embedding_service, knowledge_base
+from core.tools.fanout import fan_out, afan_out
+from core import metrics
+from core.tools import http_client, user_context, transaction_aggregates, trade_orders
+from core.tools.cache import TieredCache
 
 # --- CONFIGURATION ---
-# LanceDB path must match the PVC mount in the K8s manifest
-LANCE_DB_PATH = os.getenv("LANCE_DB_PATH", "/data/db/lancedb")
 GATEWAY_URL = os.getenv("GATEWAY_URL", "http://iris-api-gateway:8080")
+# Budget (seconds) for each concurrently fetched context segment / broker call
+SEGMENT_TIMEOUT = float(os.getenv("CONTEXT_SEGMENT_TIMEOUT", "5"))
 
 def safe_float(value):
     if isinstance(value, (int, float)):
@@ -18,45 +23,152 @@ def safe_float(value):
     except (ValueError, TypeError):
         return 0.0
 
+# --- RESPONSE FORMATTERS (shared by the sync and async tools) ---
+def _summarize_portfolio(data: dict) -> str:
+    # Summarize for the LLM
+    total_val = safe_float(data.get('totalValue'))
+    # Use numeric raw values instead of formatted strings
+    day_pl = safe_float(data.get('todayPLValue'))
+    day_pl_pct = safe_float(data.get('todayPLPercent'))
+    total_gl = safe_float(data.get('totalGainLoss'))
+    total_gl_pct = safe_float(data.get('totalGainLossPercent'))
+
+    summary = (f"Total Value: ${total_val:,.2f}. "
+               f"Today's Change: ${day_pl:,.2f} ({day_pl_pct:.2f}%). "
+               f"Total Gain/Loss: ${total_gl:,.2f} ({total_gl_pct:.2f}%).\n")
+
+    # Handle refactored data: check top-level holdings OR brokerGroups
+    holdings = data.get('holdings') or []
+    if not holdings:
+        for group in data.get('brokerGroups', []):
+            group_holdings = group.get('holdings', [])
+            if group_holdings:
+                holdings.extend(group_holdings)
+
+    if holdings:
+        summary += "Holdings:\n"
+        for h in holdings:
+            # Provide rich context for each holding
+            summary += (f"- {h['symbol']}: {h['shares']} shares @ ${safe_float(h['price']):.2f}. "
+                        f"Value: ${safe_float(h['value']):,.2f}. "
+                        f"Day Change: {safe_float(h['changePercent']):.2f}%. "
+                        f"Total Gain: {safe_float(h['gainLossPercent']):.2f}% (${safe_float(h['gainLoss']):,.2f}).\n")
+    else:
+        summary += "No current holdings."
+    return summary
+
+def _format_chat_history(history: list) -> str:
+    if not history:
+        return "" # Empty history is fine
+
+    # Limit to last 5 exchanges to save tokens
+    relevant_history = history[-10:]
+    formatted = "\n".join([f"{msg['role'].upper()}: {msg['content']}" for msg in relevant_history])
+    return f"--- CHAT HISTORY ---\n{formatted}\n--- END HISTORY ---"
+
+def _format_transactions(txns: list) -> str:
+    if not txns:
+        return "No recorded transactions."
+
+    # Summarize or Format
+    # For 10 years/1000 items, we might want to return a CSV-like block or a summary.
+    # Let's return a compact list.
+    lines = []
+    for t in txns:
+         lines.append(f"{t['timestamp'][:10]} {t['type']} {t['shares']} {t['symbol']} @ ${t['price']:.2f}")
+    return "\n".join(lines)
+
+def _compose_user_context(portfolio: str, transactions: str, history: str) -> str:
+    return (f"--- USER CONTEXT (High-Speed Memory) ---\n"
+            f"## PORTFOLIO\n{portfolio}\n\n"
+            f"## TRANSACTION HISTORY (Last 1000)\n{transactions}\n\n"
+            f"## CHAT HISTORY\n{history}\n"
+            f"--- END CONTEXT ---")
+
+def _find_alpaca_account(data: dict):
+    # Look for the Alpaca/Core account
+    # Based on API Gateway logic, we might need to identify it by BrokerName 'alpaca'
+    # or we rely on the migration 'is_core' -> 'alpaca'
+
+    # The Gateway returns 'brokerGroups'.
+    groups = data.get('brokerGroups', [])
+    for group in groups:
+         # Check for "Alpaca" or "Core"
+         # In migration we added name='alpaca'.
+         # Gateway logic maps broker_id to name.
+         if group.get('brokerName') == 'alpaca' or group.get('displayName') == 'Alpaca Markets' or group.get('portfolioType') == 'IRIS Core':
+             return group.get('irisAccountId') or group.get('accountNumber')
+
+    # Fallback: if only one account or just return the first one?
+    # Or maybe the user hasn't synced yet.
+    if groups:
+        return groups[0].get('accountNumber')
+    return None
+
+def _trade_payload(account_id: str, ticker: str, action: str, quantity: float, client_order_id: str) -> dict:
+    # Determine side
+    side = "buy" if action.lower() == "buy" else "sell"
+
+    return {
+        "account_id": account_id,
+        "symbol": ticker,
+        "side": side,
+        "qty": quantity,
+        "type": "market", # Default to market for now
+        "time_in_force": "day",
+        "client_order_id": client_order_id # Alpaca rejects a second order with the same ID
+    }
+
+def _format_trade_response(response) -> str:
+    if response.status_code == 200:
+        return f"Trade Order Submitted: {response.json()}"
+    elif response.status_code == 202:
+         return f"Trade Order Accepted for Processing: {response.json()}"
+    else:
+        return f"Trade failed with status {response.status_code}: {response.text}"
+
+def _quote_mid_price(data: dict) -> float:
+    # IEX quote has 'ap' (Ask Price) or 'bp'. Let's average or use one.
+    # Struct: AskPrice, BidPrice.
+    ask = data.get('ap', 0)
+    bid = data.get('bp', 0)
+    if ask > 0 and bid > 0:
+        return (ask + bid) / 2
+    return ask or bid or 0.0
+
+def _format_market_quote(ticker_symbol: str, data: dict) -> str:
+    ask = data.get('ap', 0)
+    bid = data.get('bp', 0)
+    price = ask or bid
+    timestamp = data.get('t', 'N/A')
+
+    return (f"Market Quote for {ticker_symbol} (Source: Alpaca IEX):\n"
+            f"Price: ${price:.2f} (Ask: ${ask:.2f}, Bid: ${bid:.2f})\n"
+            f"Disclaimer: Price quoted here is a snapshot for trade estimations. Actual trade prices can vary as the market prices change dynamically.")
+
 # --- CONTEXT RETRIEVAL TOOLS ---
 def get_portfolio_details(user_id: str) -> str:
     """Fetches the user's current portfolio holdings and value."""
     try:
         url = f"{GATEWAY_URL}/v1/portfolio/{user_id}"
-        response = requests.get(url, timeout=5)
+        response = http_client.get("gateway", url)
         if response.status_code == 200:
             data = response.json()
-            # Summarize for the LLM
-            total_val = safe_float(data.get('totalValue'))
-            # Use numeric raw values instead of formatted strings
-            day_pl = safe_float(data.get('todayPLValue'))
-            day_pl_pct = safe_float(data.get('todayPLPercent'))
-            total_gl = safe_float(data.get('totalGainLoss'))
-            total_gl_pct = safe_float(data.get('totalGainLossPercent'))
-            
-            summary = (f"Total Value: ${total_val:,.2f}. "
-                       f"Today's Change: ${day_pl:,.2f} ({day_pl_pct:.2f}%). "
-                       f"Total Gain/Loss: ${total_gl:,.2f} ({total_gl_pct:.2f}%).\n")
-                       
-            # Handle refactored data: check top-level holdings OR brokerGroups
-            holdings = data.get('holdings') or []
-            if not holdings:
-                for group in data.get('brokerGroups', []):
-                    group_holdings = group.get('holdings', [])
-                    if group_holdings:
-                        holdings.extend(group_holdings)
-
-            if holdings:
-                summary += "Holdings:\n"
-                for h in holdings:
-                    # Provide rich context for each holding
-                    summary += (f"- {h['symbol']}: {h['shares']} shares @ ${safe_float(h['price']):.2f}. "
-                                f"Value: ${safe_float(h['value']):,.2f}. "
-                                f"Day Change: {safe_float(h['changePercent']):.2f}%. "
-                                f"Total Gain: {safe_float(h['gainLossPercent']):.2f}% (${safe_float(h['gainLoss']):,.2f}).\n")
-            else:
-                summary += "No current holdings."
-            return summary
+            remember_account(user_id, data)
+            return _summarize_portfolio(data)
+        return "Could not fetch portfolio details."
+    except Exception as e:
+        return f"Error fetching portfolio: {e}"
+
+async def aget_portfolio_details(user_id: str) -> str:
+    """Async variant of get_portfolio_details."""
+    try:
+        url = f"{GATEWAY_URL}/v1/portfolio/{user_id}"
+        response = await http_client.aget("gateway", url)
+        if response.status_code == 200:
+            data = response.json()
+            await aremember_account(user_id, data)
+            return _summarize_portfolio(data)
         return "Could not fetch portfolio details."
     except Exception as e:
         return f"Error fetching portfolio: {e}"
@@ -65,12 +177,12 @@ def get_activity_log(user_id: str) -> str:
     """Fetches the user's recent transaction history."""
     try:
         url = f"{GATEWAY_URL}/v1/transactions/{user_id}"
-        response = requests.get(url, timeout=5)
+        response = http_client.get("gateway", url)
         if response.status_code == 200:
             txns = response.json()
             if not txns:
                 return "No recent transactions."
-            
+
             # Format as a list
             log_entries = []
             for t in txns:
@@ -84,16 +196,9 @@ def get_past_conversations(user_id: str) -> str:
     """Fetches recent chat history for memory."""
     try:
         url = f"{GATEWAY_URL}/v1/chat/history/{user_id}"
-        response = requests.get(url, timeout=5)
+        response = http_client.get("gateway", url)
         if response.status_code == 200:
-            history = response.json()
-            if not history:
-                return "" # Empty history is fine
-            
-            # Limit to last 5 exchanges to save tokens
-            relevant_history = history[-10:] 
-            formatted = "\n".join([f"{msg['role'].upper()}: {msg['content']}" for msg in relevant_history])
-            return f"--- CHAT HISTORY ---\n{formatted}\n--- END HISTORY ---"
+            return _format_chat_history(response.json())
         return ""
     except Exception as e:
         print(f"Error fetching chat history: {e}")
@@ -104,37 +209,340 @@ BROKER_SERVICE_URL = os.getenv("BROKER_SERVICE_URL", "http://iris-broker-service
 
 # --- REDIS MEMORY STORE ---
 import redis
+import redis.asyncio as aioredis
 import json
 
 REDIS_ADDR = os.getenv("REDIS_ADDR", "redis:6379")
 try:
     host, port = REDIS_ADDR.split(":")
     redis_client = redis.Redis(host=host, port=int(port), db=0, decode_responses=True)
+    async_redis_client = aioredis.Redis(host=host, port=int(port), db=0, decode_responses=True)
 except Exception as e:
     print(f"Redis connection failed: {e}")
     redis_client = None
+    async_redis_client = None
+
+# --- QUOTE CACHE ---
+# One confirmed trade prices the same symbol several times; a short TTL plus
+# single-flight coalescing collapses those (and concurrent users) into one call.
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", "1.5"))
+# Optional shared tier so all router replicas reuse hot quotes
+QUOTE_CACHE_REDIS = os.getenv("QUOTE_CACHE_REDIS", "false").lower() == "true"
+quote_cache = TieredCache(
+    "quote", ttl=QUOTE_CACHE_TTL,
+    redis_client=redis_client if QUOTE_CACHE_REDIS else None,
+    async_redis_client=async_redis_client if QUOTE_CACHE_REDIS else None,
+)
+
+# --- ASSET METADATA CACHE ---
+# Tradability almost never changes intraday: cache it for hours, and remember
+# unknown symbols (negative caching) so typos/non-tickers don't re-hit the broker.
+ASSET_CACHE_TTL = float(os.getenv("ASSET_CACHE_TTL", "21600"))
+ASSET_NEGATIVE_TTL = float(os.getenv("ASSET_NEGATIVE_TTL", "3600"))
+ASSET_CACHE_REDIS = os.getenv("ASSET_CACHE_REDIS", "false").lower() == "true"
+# Bulk-load the full asset list at startup (see preload_assets)
+ASSET_PRELOAD = os.getenv("ASSET_PRELOAD", "false").lower() == "true"
+asset_cache = TieredCache(
+    "asset", ttl=ASSET_CACHE_TTL, maxsize=20000, negative_ttl=ASSET_NEGATIVE_TTL,
+    redis_client=redis_client if ASSET_CACHE_REDIS else None,
+    async_redis_client=async_redis_client if ASSET_CACHE_REDIS else None,
+)
+# Every listed symbol (tradable or not) from preload_assets; empty without a preload
+asset_symbols = set()
 
 def get_comprehensive_transactions(user_id: str, limit: int = 1000) -> str:
     """Fetches a comprehensive transaction history (up to limit) for RAG context."""
     try:
         url = f"{GATEWAY_URL}/v1/transactions/{user_id}?limit={limit}"
-        response = requests.get(url, timeout=5)
+        response = http_client.get("gateway", url)
         if response.status_code == 200:
-            txns = response.json()
-            if not txns:
-                return "No recorded transactions."
-            
-            # Summarize or Format
-            # For 10 years/1000 items, we might want to return a CSV-like block or a summary.
-            # Let's return a compact list.
-            lines = []
-            for t in txns:
-                 lines.append(f"{t['timestamp'][:10]} {t['type']} {t['shares']} {t['symbol']} @ ${t['price']:.2f}")
-            return "\n".join(lines)
+            return _format_transactions(response.json())
         return "Could not fetch transaction history."
     except Exception as e:
         return f"Error fetching transactions: {e}"
 
+def get_transaction_summary(user_id: str, focus=()) -> str:
+    """Per-symbol position, realized P/L and activity from the precomputed transaction aggregates."""
+    try:
+        if redis_client:
+            aggregates = build_user_context_segments(user_id, include=("aggregates",))["aggregates"]
+        else:
+            txns = _fetch_all_transactions(user_id)
+            aggregates = transaction_aggregates.build(txns) if txns is not None else None
+        if aggregates is None:
+            return "Could not fetch transaction history."
+        return transaction_aggregates.format_summary(aggregates, focus)
+    except Exception as e:
+        return f"Error fetching transactions: {e}"
+
+# --- BROKER ACCOUNT CACHE ---
+# user -> Alpaca account id. Resolved through the gateway's account lookup
+# (falling back to the full portfolio if the gateway predates it) and seeded
+# by every portfolio fetch the context builder makes anyway. Users without an
+# account are not cached, so a newly opened account is found on the next
+# trade; a changed account is overwritten by the next portfolio fetch, and a
+# failed order drops the entry so the retry re-resolves it.
+ACCOUNT_CACHE_TTL = float(os.getenv("ACCOUNT_CACHE_TTL", "3600"))
+account_cache = TieredCache(
+    "account", ttl=ACCOUNT_CACHE_TTL, maxsize=10000,
+    redis_client=redis_client, async_redis_client=async_redis_client,
+)
+
+def remember_account(user_id: str, portfolio: dict):
+    """Caches the account id found in a fetched portfolio."""
+    if portfolio is not None:
+        account_cache.set(user_id, _find_alpaca_account(portfolio))
+
+async def aremember_account(user_id: str, portfolio: dict):
+    if portfolio is not None:
+        await account_cache.aset(user_id, _find_alpaca_account(portfolio))
+
+# --- SEGMENTED USER CONTEXT (key layout and merge logic in user_context.py) ---
+def _fetch_portfolio(user_id: str):
+    """Raw portfolio JSON from the gateway, or None."""
+    response = http_client.get("gateway", f"{GATEWAY_URL}/v1/portfolio/{user_id}")
+    return response.json() if response.status_code == 200 else None
+
+async def _afetch_portfolio(user_id: str):
+    response = await http_client.aget("gateway", f"{GATEWAY_URL}/v1/portfolio/{user_id}")
+    return response.json() if response.status_code == 200 else None
+
+def _fetch_chat_history(user_id: str):
+    response = http_client.get("gateway", f"{GATEWAY_URL}/v1/chat/history/{user_id}")
+    return (response.json() or []) if response.status_code == 200 else None
+
+async def _afetch_chat_history(user_id: str):
+    response = await http_client.aget("gateway", f"{GATEWAY_URL}/v1/chat/history/{user_id}")
+    return (response.json() or []) if response.status_code == 200 else None
+
+def _transactions_params(limit: int, since, before=None):
+    params = {"limit": limit}
+    if since:
+        params["since"] = since
+    if before:
+        params["before"] = before
+    return params
+
+def _fetch_transactions(user_id: str, limit: int = user_context.TRANSACTION_LIMIT, since=None, before=None):
+    """Raw transactions (newest first), optionally only those after `since` / up to `before`, or None."""
+    response = http_client.get("gateway", f"{GATEWAY_URL}/v1/transactions/{user_id}",
+                               params=_transactions_params(limit, since, before))
+    return (response.json() or []) if response.status_code == 200 else None
+
+async def _afetch_transactions(user_id: str, limit: int = user_context.TRANSACTION_LIMIT, since=None, before=None):
+    response = await http_client.aget("gateway", f"{GATEWAY_URL}/v1/transactions/{user_id}",
+                                      params=_transactions_params(limit, since, before))
+    return (response.json() or []) if response.status_code == 200 else None
+
+def _add_transactions_page(txns: list, page: list):
+    """Adds a gateway page to `txns`; returns the `before` cursor of the next page, or None when done.
+
+    `before` is inclusive, so rows sharing the page's oldest timestamp come back and are deduplicated.
+    """
+    new = transaction_aggregates.new_transactions(txns, page)
+    txns.extend(new)
+    if len(page) < user_context.TRANSACTION_LIMIT or not new:
+        return None
+    return user_context.transactions_cursor(page, oldest=True)
+
+def _fetch_all_transactions(user_id: str, since=None):
+    """Every transaction (after `since`), newest first, paged past the gateway's per-request limit, or None."""
+    txns, before = [], None
+    while True:
+        page = _fetch_transactions(user_id, user_context.TRANSACTION_LIMIT, since, before)
+        if page is None:
+            return None
+        before = _add_transactions_page(txns, page)
+        if before is None:
+            return txns
+
+async def _afetch_all_transactions(user_id: str, since=None):
+    txns, before = [], None
+    while True:
+        page = await _afetch_transactions(user_id, user_context.TRANSACTION_LIMIT, since, before)
+        if page is None:
+            return None
+        before = _add_transactions_page(txns, page)
+        if before is None:
+            return txns
+
+def _aggregates_missing(aggregates) -> bool:
+    # Aggregates cached before they carried a cursor cannot be folded forward
+    return aggregates is None or "cursor" not in aggregates
+
+def _segment_tasks(user_id: str, cached: dict, fetch_portfolio, fetch_history, fetch_transactions,
+                   include=user_context.CONTEXT_PARTS) -> dict:
+    """Fan-out tasks for the included segments that are missing (or, for transactions, not fresh).
+
+    `fetch_transactions(user_id, since)` pages through the full history:
+    the aggregates are built from all of it.
+    """
+    tasks = {}
+    if "portfolio" in include and cached["portfolio"] is None:
+        tasks["portfolio"] = (fetch_portfolio, (user_id,), SEGMENT_TIMEOUT, None)
+    if "history" in include and cached["history"] is None:
+        tasks["history"] = (fetch_history, (user_id,), SEGMENT_TIMEOUT, None)
+    if "transactions" in include:
+        if cached["transactions"] is None or _aggregates_missing(cached["aggregates"]):
+            tasks["transactions"] = (fetch_transactions, (user_id,), SEGMENT_TIMEOUT, None)
+        elif cached["transactions_fresh"] is None:
+            # Incremental refresh: only transactions newer than the cursor
+            cursor = user_context.transactions_cursor(cached["transactions"])
+            tasks["transactions"] = (fetch_transactions, (user_id, cursor), SEGMENT_TIMEOUT, None)
+    elif "aggregates" in include:
+        # Aggregates alone: the raw transactions are neither read nor fetched
+        if _aggregates_missing(cached["aggregates"]):
+            tasks["aggregates"] = (fetch_transactions, (user_id,), SEGMENT_TIMEOUT, None)
+        elif cached["aggregates_fresh"] is None:
+            tasks["aggregates"] = (fetch_transactions, (user_id, cached["aggregates"]["cursor"]), SEGMENT_TIMEOUT, None)
+    return tasks
+
+def _apply_segment_results(user_id: str, cached: dict, results: dict):
+    """Merges fetched segments into the cached ones.
+
+    Returns (segments, writes) where writes are (key, value, ttl) tuples for
+    the segments that were successfully refreshed. Failed fetches are not cached.
+    """
+    segments = dict(cached)
+    writes = []
+    key = lambda seg: user_context.segment_key(user_id, seg)
+
+    if results.get("portfolio") is not None:
+        segments["portfolio"] = results["portfolio"]
+        writes.append((key("portfolio"), results["portfolio"], user_context.PORTFOLIO_TTL))
+    if results.get("history") is not None:
+        segments["history"] = results["history"]
+        writes.append((key("history"), results["history"], user_context.HISTORY_TTL))
+    if results.get("transactions") is not None:
+        if cached["transactions"] is None or _aggregates_missing(cached["aggregates"]):
+            # Full history fetched: the segment keeps the newest rows, the aggregates cover all of them
+            segments["transactions"] = results["transactions"][:user_context.TRANSACTION_LIMIT]
+        else:
+            segments["transactions"] = user_context.merge_transactions(cached["transactions"], results["transactions"])
+        writes.append((key("transactions"), segments["transactions"], user_context.TRANSACTIONS_TTL))
+        writes.append((key("transactions_fresh"), 1, user_context.TRANSACTIONS_FRESH_TTL))
+    fetched = results.get("transactions", results.get("aggregates"))
+    if fetched is not None:
+        if _aggregates_missing(cached["aggregates"]):
+            segments["aggregates"] = transaction_aggregates.build(fetched)
+            writes.append((key("aggregates"), segments["aggregates"], user_context.TRANSACTIONS_TTL))
+        elif transaction_aggregates.apply_new(segments["aggregates"], fetched):
+            # Only the delta after the aggregates' cursor is folded in
+            writes.append((key("aggregates"), segments["aggregates"], user_context.TRANSACTIONS_TTL))
+        writes.append((key("aggregates_fresh"), 1, user_context.TRANSACTIONS_FRESH_TTL))
+    return segments, writes
+
+def _prompt_segments(segments: dict, include=user_context.CONTEXT_PARTS) -> dict:
+    """Prompt-ready included segments: rendered portfolio/history text, raw transactions and their aggregates."""
+    prompt = {}
+    if "portfolio" in include:
+        portfolio = segments["portfolio"]
+        prompt["portfolio"] = (_summarize_portfolio(portfolio) if portfolio is not None
+                               else "Could not fetch portfolio details.")
+    if "transactions" in include:
+        prompt["transactions"] = segments["transactions"]
+    if "transactions" in include or "aggregates" in include:
+        prompt["aggregates"] = segments["aggregates"]
+    if "history" in include:
+        prompt["history"] = _format_chat_history(segments["history"] or [])
+    return prompt
+
+def _render_user_context(segments: dict) -> str:
+    transactions = segments["transactions"]
+    return _compose_user_context(
+        segments["portfolio"],
+        _format_transactions(transactions) if transactions is not None else "Could not fetch transaction history.",
+        segments["history"],
+    )
+
+def _read_segments(user_id: str, include=user_context.CONTEXT_PARTS) -> dict:
+    """Cached segments backing the included parts (the others, and failed reads, are None)."""
+    segments = user_context.segments_for(include)
+    cached = dict.fromkeys(user_context.SEGMENTS)
+    try:
+        raw = redis_client.mget(user_context.segment_keys(user_id, segments))
+        cached.update({seg: user_context.decode(value) for seg, value in zip(segments, raw)})
+    except Exception as e:
+        print(f"User context cache read failed: {e}")
+    return cached
+
+async def _aread_segments(user_id: str, include=user_context.CONTEXT_PARTS) -> dict:
+    segments = user_context.segments_for(include)
+    cached = dict.fromkeys(user_context.SEGMENTS)
+    try:
+        raw = await async_redis_client.mget(user_context.segment_keys(user_id, segments))
+        cached.update({seg: user_context.decode(value) for seg, value in zip(segments, raw)})
+    except Exception as e:
+        print(f"User context cache read failed: {e}")
+    return cached
+
+def _write_segments(writes: list):
+    if not writes:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        for key, value, ttl in writes:
+            pipe.setex(key, ttl, json.dumps(value))
+        pipe.execute()
+    except Exception as e:
+        print(f"User context cache write failed: {e}")
+
+async def _awrite_segments(writes: list):
+    if not writes:
+        return
+    try:
+        pipe = async_redis_client.pipeline()
+        for key, value, ttl in writes:
+            pipe.setex(key, ttl, json.dumps(value))
+        await pipe.execute()
+    except Exception as e:
+        print(f"User context cache write failed: {e}")
+
+def build_user_context_segments(user_id: str, include=user_context.CONTEXT_PARTS) -> dict:
+    """
+    Loads the user context as separate segments for the context assembler:
+    {"portfolio": str, "transactions": list | None, "aggregates": dict | None, "history": str}.
+
+    Each part is a separately cached Redis segment; only missing or stale
+    segments are fetched (transactions incrementally, since a cursor).
+    `include` limits the parts returned and fetched (see context_planner).
+    """
+    if not redis_client:
+        fallback = {"portfolio": get_portfolio_details(user_id)} if "portfolio" in include else {}
+        return dict(fallback, transactions=None, aggregates=None, history="") # Fallback
+
+    cached = _read_segments(user_id, include)
+    tasks = _segment_tasks(user_id, cached, _fetch_portfolio, _fetch_chat_history, _fetch_all_transactions, include)
+    results = {}
+    if tasks:
+        results, _ = fan_out(tasks)
+    else:
+        metrics.incr("user_context.full_hit")
+    remember_account(user_id, results.get("portfolio"))
+    segments, writes = _apply_segment_results(user_id, cached, results)
+    _write_segments(writes)
+
+    return _prompt_segments(segments, include)
+
+async def abuild_user_context_segments(user_id: str, include=user_context.CONTEXT_PARTS) -> dict:
+    """Async variant of build_user_context_segments (same segments and TTLs)."""
+    if not async_redis_client:
+        fallback = {"portfolio": await aget_portfolio_details(user_id)} if "portfolio" in include else {}
+        return dict(fallback, transactions=None, aggregates=None, history="") # Fallback
+
+    cached = await _aread_segments(user_id, include)
+    tasks = _segment_tasks(user_id, cached, _afetch_portfolio, _afetch_chat_history, _afetch_all_transactions, include)
+    results = {}
+    if tasks:
+        results, _ = await afan_out(tasks)
+    else:
+        metrics.incr("user_context.full_hit")
+    await aremember_account(user_id, results.get("portfolio"))
+    segments, writes = _apply_segment_results(user_id, cached, results)
+    await _awrite_segments(writes)
+
+    return _prompt_segments(segments, include)
+
 def build_user_context(user_id: str) -> str:
     """
     Builds a high-speed, cached User Context object containing:
@@ -144,189 +552,419 @@ def build_user_context(user_id: str) -> str:
     """
     if not redis_client:
         return get_portfolio_details(user_id) # Fallback
+    return _render_user_context(build_user_context_segments(user_id))
 
-    cache_key = f"user_context:{user_id}"
-    cached = redis_client.get(cache_key)
-    if cached:
-        return cached
+async def abuild_user_context(user_id: str) -> str:
+    """Async variant of build_user_context."""
+    if not async_redis_client:
+        return await aget_portfolio_details(user_id) # Fallback
+    return _render_user_context(await abuild_user_context_segments(user_id))
 
-    # Context Miss - Build it
-    portfolio = get_portfolio_details(user_id)
-    history = get_past_conversations(user_id)
-    transactions = get_comprehensive_transactions(user_id, limit=1000)
+def _portfolio_patch_write(raw_portfolio, ticker: str, action: str, quantity: float, price: float):
+    if raw_portfolio is None:
+        return None
+    side = "buy" if action.lower() == "buy" else "sell"
+    patched = user_context.patch_portfolio(json.loads(raw_portfolio), ticker, side, quantity, price)
+    return json.dumps(patched)
 
-    context = (f"--- USER CONTEXT (High-Speed Memory) ---\n"
-               f"## PORTFOLIO\n{portfolio}\n\n"
-               f"## TRANSACTION HISTORY (Last 1000)\n{transactions}\n\n"
-               f"## CHAT HISTORY\n{history}\n"
-               f"--- END CONTEXT ---")
+def invalidate_after_trade(user_id: str, ticker: str, action: str, quantity: float, price: float):
+    """Patches the cached portfolio and forces a transactions delta refresh after a trade."""
+    if not redis_client:
+        return
+    try:
+        portfolio_key = user_context.segment_key(user_id, "portfolio")
+        patched = _portfolio_patch_write(redis_client.get(portfolio_key), ticker, action, quantity, price)
+        pipe = redis_client.pipeline()
+        if patched is not None:
+            pipe.setex(portfolio_key, user_context.PORTFOLIO_TTL, patched)
+        pipe.delete(*(user_context.segment_key(user_id, seg) for seg in ("transactions_fresh", "aggregates_fresh")))
+        pipe.execute()
+    except Exception as e:
+        print(f"User context invalidation failed: {e}")
 
-    # Cache for 5 minutes (user active session)
-    # We use setex for TTL
-    redis_client.setex(cache_key, 300, context)
-    
-    return context
+async def ainvalidate_after_trade(user_id: str, ticker: str, action: str, quantity: float, price: float):
+    """Async variant of invalidate_after_trade."""
+    if not async_redis_client:
+        return
+    try:
+        portfolio_key = user_context.segment_key(user_id, "portfolio")
+        patched = _portfolio_patch_write(await async_redis_client.get(portfolio_key), ticker, action, quantity, price)
+        pipe = async_redis_client.pipeline()
+        if patched is not None:
+            pipe.setex(portfolio_key, user_context.PORTFOLIO_TTL, patched)
+        pipe.delete(*(user_context.segment_key(user_id, seg) for seg in ("transactions_fresh", "aggregates_fresh")))
+        await pipe.execute()
+    except Exception as e:
+        print(f"User context invalidation failed: {e}")
+
+async def arecord_chat_turn(user_id: str, prompt: str, response: str):
+    """Appends the latest exchange to the cached history segment (if cached)."""
+    if not async_redis_client:
+        return
+    try:
+        history_key = user_context.segment_key(user_id, "history")
+        raw = await async_redis_client.get(history_key)
+        if raw is None:
+            return # Not cached: next build fetches it from the gateway
+        history = user_context.append_history(json.loads(raw), [
+            {"role": "user", "content": prompt},
+            {"role": "ai", "content": response},
+        ])
+        await async_redis_client.setex(history_key, user_context.HISTORY_TTL, json.dumps(history))
+    except Exception as e:
+        print(f"Chat history cache update failed: {e}")
+
+def _fetch_account_id(user_id: str):
+    """Account id from the gateway's lookup endpoint (None: no account)."""
+    response = http_client.get("gateway", f"{GATEWAY_URL}/v1/accounts/{user_id}/broker")
+    if response.status_code == 200:
+        return response.json().get("accountId")
+    if response.status_code == 404:
+        # Gateway without the lookup endpoint: resolve from the full portfolio
+        portfolio = _fetch_portfolio(user_id)
+        return _find_alpaca_account(portfolio) if portfolio is not None else None
+    return None
+
+async def _afetch_account_id(user_id: str):
+    response = await http_client.aget("gateway", f"{GATEWAY_URL}/v1/accounts/{user_id}/broker")
+    if response.status_code == 200:
+        return response.json().get("accountId")
+    if response.status_code == 404:
+        portfolio = await _afetch_portfolio(user_id)
+        return _find_alpaca_account(portfolio) if portfolio is not None else None
+    return None
 
 def get_alpaca_account_id(user_id: str) -> str:
-    """Helper to find the Alpaca Account ID for the user."""
-    # ... (existing logic, maybe we can cache this too?)
-    # For now keep it simple.
+    """Helper to find the Alpaca Account ID for the user (cached, see account_cache)."""
     try:
-        url = f"{GATEWAY_URL}/v1/portfolio/{user_id}"
-        response = requests.get(url, timeout=5)
-# ... rest of file
-        if response.status_code == 200:
-            data = response.json()
-            # Look for the Alpaca/Core account
-            # Based on API Gateway logic, we might need to identify it by BrokerName 'alpaca'
-            # or we rely on the migration 'is_core' -> 'alpaca'
-            
-            # The Gateway returns 'brokerGroups'.
-            groups = data.get('brokerGroups', [])
-            for group in groups:
-                 # Check for "Alpaca" or "Core"
-                 # In migration we added name='alpaca'.
-                 # Gateway logic maps broker_id to name.
-                 if group.get('brokerName') == 'alpaca' or group.get('displayName') == 'Alpaca Markets' or group.get('portfolioType') == 'IRIS Core':
-                     return group.get('irisAccountId') or group.get('accountNumber')
-            
-            # Fallback: if only one account or just return the first one?
-            # Or maybe the user hasn't synced yet.
-            if groups:
-                return groups[0].get('accountNumber')
-                
+        return account_cache.get_or_load(user_id, lambda: _fetch_account_id(user_id))
     except Exception as e:
         print(f"Error resolving account ID: {e}")
     return None
 
-def execute_trade_action(user_id: str, ticker: str, action: str, quantity: float, price: float = 0.0) -> str:
-    """Executes a trade via the Broker Service (Alpaca)."""
-    
+async def aget_alpaca_account_id(user_id: str) -> str:
+    """Async variant of get_alpaca_account_id."""
+    try:
+        return await account_cache.aget_or_load(user_id, lambda: _afetch_account_id(user_id))
+    except Exception as e:
+        print(f"Error resolving account ID: {e}")
+    return None
+
+def execute_trade_action(user_id: str, ticker: str, action: str, quantity: float, price: float = 0.0,
+                         client_order_id: str = None) -> str:
+    """Executes a trade via the Broker Service (Alpaca).
+
+    `client_order_id` (see trade_orders) makes the submission idempotent:
+    a repeat with the same ID is not placed again.
+    """
+
     # 1. Resolve Account ID
     account_id = get_alpaca_account_id(user_id)
     if not account_id:
         return "Error: No active brokerage account found for this user."
 
-    # 2. Call Broker Service
+    # 2. Claim the order (a duplicate gets the first submission's outcome)
+    order_id = client_order_id or trade_orders.new_trade_id()
+    existing = trade_orders.claim(redis_client, order_id)
+    if existing is not None:
+        return trade_orders.duplicate_result(existing)
+
+    # 3. Call Broker Service (retries reuse the order ID, so they cannot double-fill)
     url = f"{BROKER_SERVICE_URL}/v1/trade"
-    
-    # Determine side
-    side = "buy" if action.lower() == "buy" else "sell"
-    
-    payload = {
-        "account_id": account_id,
-        "symbol": ticker,
-        "side": side,
-        "qty": quantity,
-        "type": "market", # Default to market for now
-        "time_in_force": "day"
-    }
-    
+    payload = _trade_payload(account_id, ticker, action, quantity, order_id)
+
+    placed = False
     try:
-        response = requests.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=10)
-        if response.status_code == 200:
-            return f"Trade Order Submitted: {response.json()}"
-        elif response.status_code == 202:
-             return f"Trade Order Accepted for Processing: {response.json()}"
-        else:
-            return f"Trade failed with status {response.status_code}: {response.text}"
+        response = http_client.post("broker", url, json=payload, headers={"Content-Type": "application/json"},
+                                    timeout=http_client.TRADE_TIMEOUT, retries=trade_orders.TRADE_RETRIES)
+        placed = response.status_code in (200, 202)
+        if placed:
+            # Keep the cached user context consistent with the new position
+            invalidate_after_trade(user_id, ticker, action, quantity, get_current_price(ticker))
+        result = _format_trade_response(response)
     except Exception as e:
-        return f"Error executing trade on Broker Service: {e}"
+        result = f"Error executing trade on Broker Service: {e}"
+    if not placed:
+        account_cache.invalidate(user_id) # The account may have changed: re-resolve on retry
+    trade_orders.finish(redis_client, order_id, result, placed)
+    return result
+
+async def aexecute_trade_action(user_id: str, ticker: str, action: str, quantity: float, price: float = 0.0,
+                                client_order_id: str = None) -> str:
+    """Async variant of execute_trade_action."""
+    account_id = await aget_alpaca_account_id(user_id)
+    if not account_id:
+        return "Error: No active brokerage account found for this user."
+
+    order_id = client_order_id or trade_orders.new_trade_id()
+    existing = await trade_orders.aclaim(async_redis_client, order_id)
+    if existing is not None:
+        return trade_orders.duplicate_result(existing)
+
+    url = f"{BROKER_SERVICE_URL}/v1/trade"
+    payload = _trade_payload(account_id, ticker, action, quantity, order_id)
+
+    placed = False
+    try:
+        response = await http_client.apost("broker", url, json=payload, headers={"Content-Type": "application/json"},
+                                           timeout=http_client.TRADE_TIMEOUT, retries=trade_orders.TRADE_RETRIES)
+        placed = response.status_code in (200, 202)
+        if placed:
+            await ainvalidate_after_trade(user_id, ticker, action, quantity, await aget_current_price(ticker))
+        result = _format_trade_response(response)
+    except Exception as e:
+        result = f"Error executing trade on Broker Service: {e}"
+    if not placed:
+        await account_cache.ainvalidate(user_id)
+    await trade_orders.afinish(async_redis_client, order_id, result, placed)
+    return result
 
 # --- MARKET DATA TOOLS (Using Broker Service) ---
+def _fetch_quote(ticker_symbol: str):
+    """Raw quote JSON from the Broker Service, or None."""
+    url = f"{BROKER_SERVICE_URL}/v1/quotes/{ticker_symbol}"
+    response = http_client.get("broker", url)
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+async def _afetch_quote(ticker_symbol: str):
+    url = f"{BROKER_SERVICE_URL}/v1/quotes/{ticker_symbol}"
+    response = await http_client.aget("broker", url)
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+def get_quote(ticker_symbol: str):
+    """Latest quote JSON for a symbol via the short-TTL quote cache, or None."""
+    return quote_cache.get_or_load(ticker_symbol, lambda: _fetch_quote(ticker_symbol))
+
+async def aget_quote(ticker_symbol: str):
+    """Async variant of get_quote."""
+    return await quote_cache.aget_or_load(ticker_symbol, lambda: _afetch_quote(ticker_symbol))
+
+def _fetch_quotes(symbols: list) -> dict:
+    """Raw quotes for several symbols in one Broker Service call, as {symbol: quote}."""
+    response = http_client.get("broker", f"{BROKER_SERVICE_URL}/v1/quotes", params={"symbols": ",".join(symbols)})
+    if response.status_code == 200:
+        return response.json() or {}
+    if response.status_code == 404:
+        # Broker without the multi-quote endpoint: per-symbol fetches, concurrently
+        results, _ = fan_out({s: (_fetch_quote, (s,), SEGMENT_TIMEOUT, None) for s in symbols})
+        return {s: q for s, q in results.items() if q is not None}
+    return {}
+
+async def _afetch_quotes(symbols: list) -> dict:
+    response = await http_client.aget("broker", f"{BROKER_SERVICE_URL}/v1/quotes",
+                                      params={"symbols": ",".join(symbols)})
+    if response.status_code == 200:
+        return response.json() or {}
+    if response.status_code == 404:
+        results, _ = await afan_out({s: (_afetch_quote, (s,), SEGMENT_TIMEOUT, None) for s in symbols})
+        return {s: q for s, q in results.items() if q is not None}
+    return {}
+
+def _split_cached_quotes(symbols: list):
+    quotes = {s: quote_cache.peek(s) for s in symbols}
+    missing = [s for s, q in quotes.items() if q is None]
+    if missing:
+        metrics.incr("cache.quote.batch_miss", len(missing))
+    return {s: q for s, q in quotes.items() if q is not None}, missing
+
+def get_quotes(symbols: list) -> dict:
+    """Latest quotes for several symbols: quote-cache hits plus one batched fetch for the rest."""
+    quotes, missing = _split_cached_quotes(symbols)
+    if missing:
+        for symbol, quote in _fetch_quotes(missing).items():
+            quote_cache.set(symbol, quote)
+            quotes[symbol] = quote
+    return quotes
+
+async def aget_quotes(symbols: list) -> dict:
+    """Async variant of get_quotes."""
+    quotes, missing = _split_cached_quotes(symbols)
+    if missing:
+        for symbol, quote in (await _afetch_quotes(missing)).items():
+            await quote_cache.aset(symbol, quote)
+            quotes[symbol] = quote
+    return quotes
+
 def get_current_price(ticker_symbol: str) -> float:
     """Returns the current price as a float for calculation purposes via Broker Service."""
     try:
-        url = f"{BROKER_SERVICE_URL}/v1/quotes/{ticker_symbol}"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            # IEX quote has 'ap' (Ask Price) or 'bp'. Let's average or use one.
-            # Struct: AskPrice, BidPrice.
-            ask = data.get('ap', 0)
-            bid = data.get('bp', 0)
-            if ask > 0 and bid > 0:
-                return (ask + bid) / 2
-            return ask or bid or 0.0
+        data = get_quote(ticker_symbol)
+        if data:
+            return _quote_mid_price(data)
         return 0.0
     except Exception as e:
         print(f"Error fetching price for {ticker_symbol}: {e}")
         return 0.0
 
-def check_asset_availability(ticker_symbol: str) -> bool:
-    """Checks if the asset is tradable via Broker Service."""
+async def aget_current_price(ticker_symbol: str) -> float:
+    """Async variant of get_current_price."""
     try:
-        url = f"{BROKER_SERVICE_URL}/v1/assets/{ticker_symbol}"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("tradable", False)
+        data = await aget_quote(ticker_symbol)
+        if data:
+            return _quote_mid_price(data)
+        return 0.0
+    except Exception as e:
+        print(f"Error fetching price for {ticker_symbol}: {e}")
+        return 0.0
+
+def _asset_tradable_from_response(response):
+    """Maps a /v1/assets/{symbol} response to True/False, None (unknown symbol) or raises."""
+    if response.status_code == 200:
+        return bool(response.json().get("tradable", False))
+    if response.status_code == 403:
+        return False # Known but not tradable
+    if response.status_code == 404:
+        return None
+    # Upstream trouble: raise so the result is not cached
+    raise RuntimeError(f"asset lookup failed with status {response.status_code}")
+
+def _fetch_asset_tradable(ticker_symbol: str):
+    url = f"{BROKER_SERVICE_URL}/v1/assets/{ticker_symbol}"
+    return _asset_tradable_from_response(http_client.get("broker", url))
+
+async def _afetch_asset_tradable(ticker_symbol: str):
+    url = f"{BROKER_SERVICE_URL}/v1/assets/{ticker_symbol}"
+    return _asset_tradable_from_response(await http_client.aget("broker", url))
+
+def asset_status(ticker_symbol: str):
+    """Tradability via Broker Service (served from the asset cache): True/False, None for unknown symbols."""
+    try:
+        return asset_cache.get_or_load(ticker_symbol, lambda: _fetch_asset_tradable(ticker_symbol))
+    except Exception:
         return False
+
+async def aasset_status(ticker_symbol: str):
+    """Async variant of asset_status."""
+    try:
+        return await asset_cache.aget_or_load(ticker_symbol, lambda: _afetch_asset_tradable(ticker_symbol))
     except Exception:
         return False
 
+def check_asset_availability(ticker_symbol: str) -> bool:
+    """Checks if the asset is tradable via Broker Service (served from the asset cache)."""
+    return bool(asset_status(ticker_symbol))
+
+async def acheck_asset_availability(ticker_symbol: str) -> bool:
+    """Async variant of check_asset_availability."""
+    return bool(await aasset_status(ticker_symbol))
+
+def preload_assets() -> int:
+    """Bulk-loads tradability for all active assets into the asset cache.
+
+    Called at startup (ASSET_PRELOAD=true) so per-request validation is a cache hit.
+    Returns the number of assets loaded.
+    """
+    try:
+        url = f"{BROKER_SERVICE_URL}/v1/assets"
+        response = http_client.get("broker", url, timeout=30)
+        if response.status_code != 200:
+            print(f"Asset preload failed with status {response.status_code}")
+            return 0
+        assets = response.json() or []
+        for asset in assets:
+            asset_cache.set(asset["symbol"], bool(asset.get("tradable", False)))
+        asset_symbols.update(asset["symbol"] for asset in assets)
+        print(f"Preloaded {len(assets)} assets into the asset cache")
+        return len(assets)
+    except Exception as e:
+        print(f"Asset preload failed: {e}")
+        return 0
+
+def _format_market_data(ticker_symbol: str, tradable: bool, quote) -> str:
+    if not tradable:
+         return f"Asset {ticker_symbol} is not available for trading or not found."
+    if quote is None:
+        return f"Could not fetch market data for {ticker_symbol}."
+    return _format_market_quote(ticker_symbol, quote)
+
 def get_market_data(ticker_symbol: str) -> str:
     """Retrieves current quote from Alpaca (Cached) via Broker Service."""
     try:
         if not ticker_symbol or ticker_symbol == "SPY":
             ticker_symbol = "SPY"
-            
-        # 1. Validation check (as requested)
-        if not check_asset_availability(ticker_symbol):
-             return f"Asset {ticker_symbol} is not available for trading or not found."
-
-        # 2. Get Quote
-        url = f"{BROKER_SERVICE_URL}/v1/quotes/{ticker_symbol}"
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-             data = response.json()
-             ask = data.get('ap', 0)
-             bid = data.get('bp', 0)
-             price = ask or bid
-             timestamp = data.get('t', 'N/A')
-             
-             return (f"Market Quote for {ticker_symbol} (Source: Alpaca IEX):\n"
-                     f"Price: ${price:.2f} (Ask: ${ask:.2f}, Bid: ${bid:.2f})\n"
-                     f"Disclaimer: Price quoted here is a snapshot for trade estimations. Actual trade prices can vary as the market prices change dynamically.")
-        
-        return f"Could not fetch market data for {ticker_symbol}."
+
+        # Validation check and quote are independent: fetch both concurrently
+        results, _ = fan_out({
+            "asset": (check_asset_availability, (ticker_symbol,), SEGMENT_TIMEOUT, False),
+            "quote": (get_quote, (ticker_symbol,), SEGMENT_TIMEOUT, None),
+        })
+        return _format_market_data(ticker_symbol, results["asset"], results["quote"])
     except Exception as e:
         return f"Error retrieving market data for {ticker_symbol}: {e}"
 
+async def aget_market_data(ticker_symbol: str) -> str:
+    """Async variant of get_market_data."""
+    try:
+        if not ticker_symbol:
+            ticker_symbol = "SPY"
+
+        results, _ = await afan_out({
+            "asset": (acheck_asset_availability, (ticker_symbol,), SEGMENT_TIMEOUT, False),
+            "quote": (aget_quote, (ticker_symbol,), SEGMENT_TIMEOUT, None),
+        })
+        return _format_market_data(ticker_symbol, results["asset"], results["quote"])
+    except Exception as e:
+        return f"Error retrieving market data for {ticker_symbol}: {e}"
+
+def _market_batch_tasks(tickers: list, status_fn, quotes_fn) -> dict:
+    tasks = {f"asset:{t}": (status_fn, (t,), SEGMENT_TIMEOUT, False) for t in tickers}
+    tasks["quotes"] = (quotes_fn, (tickers,), SEGMENT_TIMEOUT, {})
+    return tasks
+
+def _format_market_batch(tickers: list, results: dict) -> str:
+    # Symbols the broker does not know are words mistaken for tickers ("LOL"): left out
+    return "\n\n".join(_format_market_data(t, results[f"asset:{t}"], results["quotes"].get(t))
+                       for t in tickers if results[f"asset:{t}"] is not None)
+
+def get_market_data_batch(tickers: list) -> str:
+    """Market data for several tickers: tradability checks and one batched quote fetch, concurrently."""
+    if len(tickers) == 1:
+        return get_market_data(tickers[0])
+    try:
+        results, _ = fan_out(_market_batch_tasks(tickers, asset_status, get_quotes))
+        return _format_market_batch(tickers, results)
+    except Exception as e:
+        return f"Error retrieving market data for {', '.join(tickers)}: {e}"
+
+async def aget_market_data_batch(tickers: list) -> str:
+    """Async variant of get_market_data_batch."""
+    if len(tickers) == 1:
+        return await aget_market_data(tickers[0])
+    try:
+        results, _ = await afan_out(_market_batch_tasks(tickers, aasset_status, aget_quotes))
+        return _format_market_batch(tickers, results)
+    except Exception as e:
+        return f"Error retrieving market data for {', '.join(tickers)}: {e}"
+
 # --- LANCEDb RAG TOOL ---
 def lookup_rag_context(query: str) -> str:
     """Looks up the most relevant industry knowledge from the LanceDB vector store."""
     try:
-        # Connect to DB
-        db = lancedb.connect(LANCE_DB_PATH)
-        table_name = "financial_knowledge"
-        
-        if table_name not in db.table_names():
-             return "Knowledge base not initialized."
-
-        tbl = db.open_table(table_name)
+        # Model and table handle are process-wide (loaded at startup, see embeddings.py)
+        query_embedding = embedding_service.encode(query)
+        results = knowledge_base.search(query_embedding, limit=2)
 
-        # Embed query (using same model as ingestion)
-        # Note: In production, load model globally to avoid reload overhead
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer("all-MiniLM-L6-v2")
-        query_embedding = model.encode(query).tolist()
+        if results is None:
+             return "Knowledge base not initialized."
 
-        # Search
-        results = tbl.search(query_embedding).limit(2).to_pandas()
-        
         if results.empty:
             return "No relevant context found."
-            
+
         context = "Relevant Financial Context:\n"
         for _, row in results.iterrows():
             context += f"- [{row['title']}]: {row['text']}\n"
-            
+
         return context
 
     except Exception as e:
         # Fail silently/gracefully for RAG to not block main chat
         print(f"LanceDB RAG retrieval error: {e}")
         return ""
-        
\ No newline at end of file
+
+async def alookup_rag_context(query: str) -> str:
+    """Async variant of lookup_rag_context (embedding + search run in a worker thread)."""
+    return await asyncio.to_thread(lookup_rag_context, query)
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core import metrics
+
+# --- CONFIGURATION ---
+# Keep-alive connections per upstream (shared by all request threads)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+# Retries apply to idempotent GETs only; POSTs are retried only when the caller
+# opts in for a request the upstream deduplicates (orders with a client order ID)
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.2"))
+RETRY_STATUSES = (502, 503, 504)
+
+# Per-upstream request timeouts (seconds)
+UPSTREAM_TIMEOUTS = {
+    "gateway": float(os.getenv("GATEWAY_TIMEOUT", "5")),
+    "broker": float(os.getenv("BROKER_TIMEOUT", "5")),
+    # Ollama health probes (generation calls go through the LLM clients)
+    "ollama": float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2")),
+}
+# Order submission is slower than reads
+TRADE_TIMEOUT = float(os.getenv("BROKER_TRADE_TIMEOUT", "10"))
+
+
+# --- SYNC SESSIONS (one pooled keep-alive Session per upstream) ---
+_sessions = {}
+
+
+def _new_session() -> requests.Session:
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(upstream: str) -> requests.Session:
+    """Returns the shared Session for an upstream ("gateway" or "broker")."""
+    session = _sessions.get(upstream)
+    if session is None:
+        session = _sessions.setdefault(upstream, _new_session())
+    return session
+
+
+def get(upstream: str, url: str, **kwargs) -> requests.Response:
+    """GET through the upstream's pooled session (retried with backoff)."""
+    kwargs.setdefault("timeout", UPSTREAM_TIMEOUTS[upstream])
+    with metrics.timed(f"http.{upstream}.get"):
+        return get_session(upstream).get(url, **kwargs)
+
+
+def post(upstream: str, url: str, retries: int = 0, **kwargs) -> requests.Response:
+    """POST through the upstream's pooled session.
+
+    Not retried unless `retries` is given, which is only safe when the
+    upstream deduplicates the request (e.g. by client order ID).
+    """
+    kwargs.setdefault("timeout", UPSTREAM_TIMEOUTS[upstream])
+    with metrics.timed(f"http.{upstream}.post"):
+        for attempt in range(retries + 1):
+            try:
+                response = get_session(upstream).post(url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+            metrics.incr(f"http.{upstream}.post_retry")
+            time.sleep(HTTP_BACKOFF * (2 ** attempt))
+
+
+# --- ASYNC CLIENTS (one keep-alive client per upstream) ---
+# Keyed by upstream name ("gateway", "broker"). httpx connections are bound to
+# the event loop that opened them, so a client is recreated if the loop changes.
+_async_clients = {}
+
+
+def get_async_client(upstream: str) -> httpx.AsyncClient:
+    """Returns the shared async HTTP client for an upstream ("gateway" or "broker")."""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(upstream)
+    if entry is None or entry[1] is not loop or entry[0].is_closed:
+        limits = httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+        entry = (httpx.AsyncClient(limits=limits, timeout=UPSTREAM_TIMEOUTS[upstream]), loop)
+        _async_clients[upstream] = entry
+    return entry[0]
+
+
+async def aget(upstream: str, url: str, **kwargs) -> httpx.Response:
+    """Async GET with the same retry/backoff policy as the sync sessions."""
+    client = get_async_client(upstream)
+    with metrics.timed(f"http.{upstream}.get"):
+        for attempt in range(HTTP_RETRIES + 1):
+            try:
+                response = await client.get(url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt == HTTP_RETRIES:
+                    return response
+            except httpx.TransportError:
+                if attempt == HTTP_RETRIES:
+                    raise
+            await asyncio.sleep(HTTP_BACKOFF * (2 ** attempt))
+
+
+async def apost(upstream: str, url: str, retries: int = 0, **kwargs) -> httpx.Response:
+    """Async POST, retried like `post` only when `retries` is given."""
+    client = get_async_client(upstream)
+    with metrics.timed(f"http.{upstream}.post"):
+        for attempt in range(retries + 1):
+            try:
+                response = await client.post(url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+            except httpx.TransportError:
+                if attempt == retries:
+                    raise
+            metrics.incr(f"http.{upstream}.post_retry")
+            await asyncio.sleep(HTTP_BACKOFF * (2 ** attempt))
+
+
+async def close_async_clients():
+    """Closes all async clients (called on application shutdown)."""
+    for client, _ in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
@@ -0,0 +1,158 @@
+"""Admission control for Ollama generations.
+
+Without it every request is forwarded to Ollama at once; under a burst the
+generations queue inside Ollama and all of them time out together. The
+scheduler allows a fixed number of in-flight generations per model and keeps
+a bounded, priority-ordered wait queue in front of them (confirmations first,
+small talk and background work last). When the queue is full, callers are
+rejected immediately with a Retry-After estimate (HTTP 503) instead of
+joining a queue they would time out in.
+
+Applies to the async request path (the server); the sync graph path used by
+tests and scripts is not throttled.
+
+Metrics per model: llm_queue.<model>.depth / .in_flight (gauges), .wait
+(queue wait time) and .rejected (counter).
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from core import metrics
+
+# Generations per model per Ollama backend
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "2"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+# Per-model in-flight overrides, e.g. "qwen2.5:14b=1,qwen2.5:1.5b=4"
+LLM_MODEL_CONCURRENCY = os.getenv("LLM_MODEL_CONCURRENCY", "")
+# Retry-After (seconds) before any generation time has been observed
+LLM_RETRY_AFTER = int(os.getenv("LLM_RETRY_AFTER", "5"))
+MAX_RETRY_AFTER = 60
+
+# Lower runs first
+PRIORITIES = {"CONFIRM_TRADE": 0, "CANCEL_TRADE": 1, "TRADE": 1, "ADVICE": 2, "GENERAL_CHAT": 3}
+DEFAULT_PRIORITY = 3
+BACKGROUND_PRIORITY = 9
+
+
+class SchedulerBusy(Exception):
+    """The model's wait queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"LLM queue for {model} is full")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def priority_for(intent: str) -> int:
+    return PRIORITIES.get(intent, DEFAULT_PRIORITY)
+
+
+def parse_model_limits(spec: str) -> dict:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, limit = item.rpartition("=")
+        limits[model] = int(limit)
+    return limits
+
+
+class _ModelQueue:
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiters = []  # heap of (priority, seq, future)
+        self.avg_hold = None  # EWMA of generation time (seconds)
+
+
+class LLMScheduler:
+    """Per-model in-flight limit with a bounded priority wait queue."""
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, max_queue: int = LLM_MAX_QUEUE,
+                 model_limits: dict = None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.model_limits = model_limits if model_limits is not None else parse_model_limits(LLM_MODEL_CONCURRENCY)
+        self.backends = 1  # Ollama backends serving each model (limits scale with it)
+        self._queues = {}
+        self._seq = itertools.count()
+
+    def _queue(self, model: str) -> _ModelQueue:
+        if model not in self._queues:
+            limit = self.model_limits.get(model, self.max_in_flight) * self.backends
+            self._queues[model] = _ModelQueue(limit, self.max_queue)
+        return self._queues[model]
+
+    def _publish(self, model: str, queue: _ModelQueue):
+        metrics.set_gauge(f"llm_queue.{model}.depth", len(queue.waiters))
+        metrics.set_gauge(f"llm_queue.{model}.in_flight", queue.in_flight)
+
+    def retry_after(self, model: str) -> int:
+        """Seconds until a slot is likely to free up for a new caller."""
+        queue = self._queue(model)
+        if queue.avg_hold is None:
+            return LLM_RETRY_AFTER
+        estimate = queue.avg_hold * (len(queue.waiters) + 1) / queue.limit
+        return min(max(math.ceil(estimate), 1), MAX_RETRY_AFTER)
+
+    def is_full(self, model: str) -> bool:
+        queue = self._queue(model)
+        return queue.in_flight >= queue.limit and len(queue.waiters) >= queue.max_queue
+
+    def check(self, model: str):
+        """Fast admission check at request entry: raises SchedulerBusy when the queue is already full."""
+        if self.is_full(model):
+            metrics.incr(f"llm_queue.{model}.rejected")
+            raise SchedulerBusy(model, self.retry_after(model))
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: int = DEFAULT_PRIORITY):
+        """Holds one of the model's generation slots for the duration of the block."""
+        queue = self._queue(model)
+        start = time.monotonic()
+        if queue.in_flight < queue.limit and not queue.waiters:
+            queue.in_flight += 1
+        else:
+            if priority > PRIORITIES["CONFIRM_TRADE"]:
+                self.check(model)  # Confirmations are always queued
+            entry = (priority, next(self._seq), asyncio.get_running_loop().create_future())
+            heapq.heappush(queue.waiters, entry)
+            self._publish(model, queue)
+            try:
+                await entry[2]
+            except asyncio.CancelledError:
+                if entry in queue.waiters:
+                    queue.waiters.remove(entry)
+                    heapq.heapify(queue.waiters)
+                elif entry[2].done() and not entry[2].cancelled():
+                    self._release(model)  # Slot was handed over as we were cancelled: pass it on
+                self._publish(model, queue)
+                raise
+        metrics.observe(f"llm_queue.{model}.wait", time.monotonic() - start)
+        self._publish(model, queue)
+
+        held = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - held
+            queue.avg_hold = duration if queue.avg_hold is None else 0.8 * queue.avg_hold + 0.2 * duration
+            self._release(model)
+
+    def _release(self, model: str):
+        queue = self._queue(model)
+        while queue.waiters:
+            _, _, future = heapq.heappop(queue.waiters)
+            if not future.done():
+                future.set_result(None)  # Hand the slot to the next waiter (in_flight unchanged)
+                self._publish(model, queue)
+                return
+        queue.in_flight -= 1
+        self._publish(model, queue)
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,181 @@
+"""Pool of Ollama backends with load-aware routing and failover.
+
+OLLAMA_BASE_URLS lists the backends (defaults to the single OLLAMA_BASE_URL,
+also used when the list is empty).
+Each call is routed to:
+
+1. a healthy backend that already has the model loaded (no load time),
+2. preferring the user's affinity backend (rendezvous hash of the user id),
+   so consecutive turns reuse that backend's prompt KV cache, unless it has
+   more than OLLAMA_AFFINITY_SLACK requests outstanding beyond the least
+   loaded one,
+3. otherwise the backend with the fewest outstanding requests.
+
+A connection failure marks the backend down and the call fails over to the
+next candidate (streams only before their first chunk). Errors after the
+request was sent (read timeouts, dropped connections) are raised: the
+backend may still be generating, and a retry would double its load. A background health
+check (GET /api/ps) brings backends back and refreshes their loaded models.
+
+Like the scheduler, the pool serves the async request path.
+"""
+import asyncio
+import hashlib
+import os
+
+import httpx
+
+from core import metrics
+from core.tools import http_client
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
+
+
+def _backend_urls(value: str) -> list:
+    # An empty pool would leave the scheduler with no capacity (every call queued forever)
+    urls = [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+    return urls or [OLLAMA_BASE_URL.rstrip("/")]
+
+
+OLLAMA_BASE_URLS = _backend_urls(os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE_URL))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+# Outstanding requests the affinity backend may have beyond the least loaded one
+OLLAMA_AFFINITY_SLACK = int(os.getenv("OLLAMA_AFFINITY_SLACK", "2"))
+
+# Errors meaning the backend is unreachable (the request never ran); the
+# ollama client reports httpx.ConnectError as ConnectionError
+FAILOVER_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, ConnectionError)
+
+
+class NoBackendAvailable(RuntimeError):
+    """Raised when the pool has no backend to route a call to."""
+
+    def __init__(self, model: str):
+        super().__init__(f"No Ollama backend available for {model}")
+        self.model = model
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self.models = set()  # Models currently loaded (from /api/ps and successful calls)
+
+
+class OllamaPool:
+    """Routes LLM calls across Ollama backends."""
+
+    def __init__(self, urls: list, affinity_slack: int = OLLAMA_AFFINITY_SLACK,
+                 health_interval: float = OLLAMA_HEALTH_INTERVAL):
+        self.backends = [Backend(url) for url in urls]
+        self.affinity_slack = affinity_slack
+        self.health_interval = health_interval
+        self._health_task = None
+
+    @staticmethod
+    def _affinity_score(backend: Backend, key: str) -> bytes:
+        return hashlib.sha1(f"{key}|{backend.url}".encode()).digest()
+
+    def candidates(self, model: str, affinity: str = None) -> list:
+        """All backends in routing order (failover order after the first)."""
+        healthy = [b for b in self.backends if b.healthy] or list(self.backends)
+        preferred = [b for b in healthy if model in b.models] or healthy
+        ordered = sorted(preferred, key=lambda b: b.outstanding)
+        if affinity:
+            sticky = max(preferred, key=lambda b: self._affinity_score(b, affinity))
+            if sticky.outstanding - ordered[0].outstanding <= self.affinity_slack:
+                ordered.remove(sticky)
+                ordered.insert(0, sticky)
+        rest = sorted((b for b in self.backends if b not in ordered), key=lambda b: (not b.healthy, b.outstanding))
+        return ordered + rest
+
+    def _publish(self):
+        metrics.set_gauge("ollama_pool.healthy", sum(b.healthy for b in self.backends))
+        for backend in self.backends:
+            metrics.set_gauge(f"ollama_pool.{backend.url}.outstanding", backend.outstanding)
+
+    def _mark_down(self, backend: Backend, error: Exception):
+        print(f"Ollama backend {backend.url} unavailable, failing over: {error}")
+        backend.healthy = False
+        backend.models.clear()
+        metrics.incr("ollama_pool.failover")
+
+    async def run(self, model: str, call, affinity: str = None):
+        """Awaits `call(base_url)` on the best backend, failing over on connection errors."""
+        error = None
+        for backend in self.candidates(model, affinity):
+            backend.outstanding += 1
+            self._publish()
+            try:
+                result = await call(backend.url)
+                backend.models.add(model)
+                return result
+            except FAILOVER_ERRORS as e:
+                self._mark_down(backend, e)
+                error = e
+            finally:
+                backend.outstanding -= 1
+                self._publish()
+        raise error or NoBackendAvailable(model)
+
+    async def stream(self, model: str, call, affinity: str = None):
+        """Iterates `call(base_url)` (an async iterator) on the best backend.
+
+        Fails over only before the first chunk: a partially streamed response
+        cannot be resumed elsewhere.
+        """
+        error = None
+        for backend in self.candidates(model, affinity):
+            backend.outstanding += 1
+            self._publish()
+            started = False
+            try:
+                async for item in call(backend.url):
+                    started = True
+                    yield item
+                backend.models.add(model)
+                return
+            except FAILOVER_ERRORS as e:
+                if started:
+                    raise
+                self._mark_down(backend, e)
+                error = e
+            finally:
+                backend.outstanding -= 1
+                self._publish()
+        raise error or NoBackendAvailable(model)
+
+    async def _probe(self, backend: Backend):
+        try:
+            response = await http_client.get_async_client("ollama").get(f"{backend.url}/api/ps")
+            response.raise_for_status()
+            backend.models = {m.get("model") or m.get("name") for m in response.json().get("models", [])}
+            backend.healthy = True
+        except Exception as e:
+            if backend.healthy:
+                print(f"Ollama backend {backend.url} failed health check: {e}")
+            backend.healthy = False
+            backend.models.clear()
+
+    async def check_health(self):
+        await asyncio.gather(*(self._probe(b) for b in self.backends))
+        self._publish()
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    def start_health_checks(self):
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop_health_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+
+ollama_pool = OllamaPool(OLLAMA_BASE_URLS)
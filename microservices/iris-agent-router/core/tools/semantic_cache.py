@@ -0,0 +1,119 @@
+"""Semantic response cache for generic advisory questions.
+
+Near-identical ADVICE questions ("market outlook for tech?") are answered from
+a cache keyed on the question embedding (the all-MiniLM-L6-v2 model used for
+RAG lookups), partitioned by intent and a coarse market snapshot so a cached
+answer is never reused after the price has moved.
+
+Only questions that do not depend on the user's own account are cacheable;
+their answers are generated without the private user context so they can be
+shared across users.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from core import metrics
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+# Cosine similarity required to reuse a cached answer
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "900"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+# Width of the price buckets in the market snapshot (0.01 = 1%)
+SNAPSHOT_PRICE_BUCKET = float(os.getenv("RESPONSE_CACHE_PRICE_BUCKET", "0.01"))
+
+CACHEABLE_INTENTS = {"ADVICE"}
+# Questions mentioning the user or their account need the private context
+_PERSONAL_WORDS = {"i", "i'm", "i've", "i'd", "me", "my", "mine", "we", "our", "us"}
+_PERSONAL_TERMS = ("portfolio", "holding", "position", "balance", "account", "transaction", "bought", "sold")
+
+
+def is_cacheable(intent: str, text: str, pending_trade=None) -> bool:
+    """True for generic questions whose answer can be shared between users."""
+    if intent not in CACHEABLE_INTENTS or pending_trade:
+        return False
+    lowered = text.lower()
+    words = set(re.findall(r"[a-z']+", lowered))
+    return not (words & _PERSONAL_WORDS) and not any(term in lowered for term in _PERSONAL_TERMS)
+
+
+def market_snapshot(ticker: str, price: float):
+    """Coarse market state (ticker + price bucket), or None when the price is unknown."""
+    if not price or price <= 0:
+        return None
+    bucket = math.floor(math.log(price) / math.log1p(SNAPSHOT_PRICE_BUCKET))
+    return f"{ticker}@{bucket}"
+
+
+def _normalize(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """Thread-safe LRU of (partition, embedding) -> response with a TTL."""
+
+    def __init__(self, threshold: float = RESPONSE_CACHE_THRESHOLD, ttl: float = RESPONSE_CACHE_TTL,
+                 maxsize: int = RESPONSE_CACHE_SIZE, enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self._entries = OrderedDict()  # id -> (partition, vector, response, expires_at)
+        self._partitions = {}  # partition -> set of ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, entry_id):
+        partition = self._entries.pop(entry_id)[0]
+        ids = self._partitions[partition]
+        ids.discard(entry_id)
+        if not ids:
+            del self._partitions[partition]
+
+    def lookup(self, partition: str, embedding):
+        """Returns the cached response most similar to `embedding`, or None."""
+        vector = _normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            ids = list(self._partitions.get(partition, ()))
+            for entry_id in ids:
+                if self._entries[entry_id][3] <= now:
+                    self._remove(entry_id)
+            ids = [i for i in ids if i in self._entries]
+            if ids:
+                similarities = np.stack([self._entries[i][1] for i in ids]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(ids[best])
+                    metrics.incr("response_cache.hit")
+                    return self._entries[ids[best]][2]
+        metrics.incr("response_cache.miss")
+        return None
+
+    def store(self, partition: str, embedding, response: str):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (partition, _normalize(embedding), response, time.monotonic() + self.ttl)
+            self._partitions.setdefault(partition, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._partitions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = SemanticCache()
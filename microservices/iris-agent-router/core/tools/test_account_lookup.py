@@ -0,0 +1,94 @@
+"""Tests for cached broker-account resolution against a local gateway stub."""
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from core.fakes import FakeRedis
+
+
+class _GatewayStub(BaseHTTPRequestHandler):
+    """Account lookup and portfolio endpoints; `lookup=False` mimics a gateway without the lookup."""
+    accounts = {"u1": "acct-1", "u2": "acct-2"}
+    lookup = True
+    calls = []
+
+    def do_GET(self):
+        type(self).calls.append(self.path)
+        parts = self.path.strip("/").split("/")
+        if parts[:2] == ["v1", "accounts"] and type(self).lookup:
+            status, body = 200, {"accountId": self.accounts.get(parts[2])}
+        elif parts[:2] == ["v1", "portfolio"]:
+            groups = []
+            if parts[2] in self.accounts:
+                groups = [{"brokerName": "alpaca", "irisAccountId": self.accounts[parts[2]]}]
+            status, body = 200, {"brokerGroups": groups, "holdings": []}
+        else:
+            status, body = 404, {"error": "not found"}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAccountLookup(unittest.TestCase):
+
+    def setUp(self):
+        from core.tools import finance_tools
+        from core.tools.cache import TieredCache
+
+        _GatewayStub.calls = []
+        _GatewayStub.lookup = True
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _GatewayStub)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.ft = finance_tools
+        self.redis = FakeRedis()
+        self.patches = [
+            patch.object(finance_tools, "GATEWAY_URL", f"http://127.0.0.1:{self.server.server_address[1]}"),
+            patch.object(finance_tools, "account_cache", TieredCache("account", ttl=60, redis_client=self.redis)),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_lookup_is_cached_in_both_tiers(self):
+        from core.tools.cache import TieredCache
+
+        self.assertEqual(self.ft.get_alpaca_account_id("u1"), "acct-1")
+        self.assertEqual(self.ft.get_alpaca_account_id("u1"), "acct-1")
+        self.assertEqual(_GatewayStub.calls, ["/v1/accounts/u1/broker"])  # No portfolio download
+
+        other_replica = TieredCache("account", ttl=60, redis_client=self.redis)
+        self.assertEqual(other_replica.get_or_load("u1", lambda: self.fail("should hit Redis")), "acct-1")
+
+        # Users without an account are looked up again (they may open one)
+        self.assertIsNone(self.ft.get_alpaca_account_id("u9"))
+        self.assertIsNone(self.ft.get_alpaca_account_id("u9"))
+        self.assertEqual(_GatewayStub.calls.count("/v1/accounts/u9/broker"), 2)
+
+    def test_falls_back_to_portfolio_and_is_seeded_by_it(self):
+        _GatewayStub.lookup = False
+        self.assertEqual(self.ft.get_alpaca_account_id("u2"), "acct-2")
+        self.assertEqual(_GatewayStub.calls, ["/v1/accounts/u2/broker", "/v1/portfolio/u2"])
+
+        # A portfolio fetched for context fills the cache, so the trade needs no lookup
+        _GatewayStub.calls = []
+        self.ft.get_portfolio_details("u1")
+        self.assertEqual(self.ft.get_alpaca_account_id("u1"), "acct-1")
+        self.assertEqual(_GatewayStub.calls, ["/v1/portfolio/u1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
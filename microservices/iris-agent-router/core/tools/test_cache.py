@@ -0,0 +1,249 @@
+"""Unit tests for the caching primitives and the quote/asset caches."""
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from core.fakes import FakeRedis
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_expiry_and_lru_eviction(self):
+        from core.tools.cache import TTLCache
+
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1, ttl=60)
+        cache.set("b", 2, ttl=0.05)
+        cache.get("a")  # a is now most recently used
+        cache.set("c", 3, ttl=60)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b", None))
+        time.sleep(0.06)
+        self.assertEqual(cache.get("c"), 3)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_threads_share_one_call(self):
+        from core.tools.cache import SingleFlight
+
+        flight = SingleFlight()
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", load))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 5)
+
+    def test_concurrent_coroutines_share_one_call(self):
+        from core.tools.cache import SingleFlight
+
+        flight = SingleFlight()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+
+        async def run():
+            return await asyncio.gather(*(flight.ado("k", load) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ["value"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        from core.tools.cache import SingleFlight
+
+        flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.1)
+            return "value"
+
+        async def run():
+            leader = asyncio.create_task(asyncio.wait_for(flight.ado("k", load), timeout=0.01))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.ado("k", load))
+            with self.assertRaises(asyncio.TimeoutError):
+                await leader
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), "value")
+
+
+class TestTieredCache(unittest.TestCase):
+
+    def test_redis_tier_shared_between_instances(self):
+        from core.tools.cache import TieredCache
+
+        redis = FakeRedis()
+        replica_a = TieredCache("quote", ttl=60, redis_client=redis)
+        replica_b = TieredCache("quote", ttl=60, redis_client=redis)
+
+        self.assertEqual(replica_a.get_or_load("AAPL", lambda: {"ap": 1.0}), {"ap": 1.0})
+        self.assertEqual(replica_b.get_or_load("AAPL", lambda: self.fail("should hit Redis")), {"ap": 1.0})
+
+    def test_negative_results_cached_only_with_negative_ttl(self):
+        from core.tools.cache import TieredCache
+
+        calls = []
+
+        def load():
+            calls.append(1)
+            return None
+
+        no_negative = TieredCache("quote", ttl=60)
+        no_negative.get_or_load("X", load)
+        no_negative.get_or_load("X", load)
+        self.assertEqual(len(calls), 2)
+
+        negative = TieredCache("asset", ttl=60, negative_ttl=60)
+        negative.get_or_load("X", load)
+        negative.get_or_load("X", load)
+        self.assertEqual(len(calls), 3)
+
+
+class TestQuoteCache(unittest.TestCase):
+
+    def test_get_current_price_coalesces_upstream_calls(self):
+        from core.tools import finance_tools
+        from core.tools.cache import TieredCache
+
+        calls = []
+
+        def fake_fetch(symbol):
+            calls.append(symbol)
+            time.sleep(0.05)
+            return {"ap": 101.0, "bp": 99.0}
+
+        with patch.object(finance_tools, "quote_cache", TieredCache("quote", ttl=5)), \
+             patch.object(finance_tools, "_fetch_quote", side_effect=fake_fetch):
+            prices = []
+
+            def fetch_price():
+                prices.append(finance_tools.get_current_price("NVDA"))
+            threads = [threading.Thread(target=fetch_price) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            prices.append(finance_tools.get_current_price("NVDA"))
+
+        self.assertEqual(prices, [100.0] * 5)
+        self.assertEqual(calls, ["NVDA"])
+
+
+class _Response:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class TestAssetCache(unittest.TestCase):
+
+    def setUp(self):
+        from core.tools import finance_tools
+        from core.tools.cache import TieredCache
+
+        self.finance_tools = finance_tools
+        self.patches = [
+            patch.object(finance_tools, "asset_cache", TieredCache("asset", ttl=60, negative_ttl=60)),
+            patch.object(finance_tools, "asset_symbols", set()),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_unknown_symbol_is_negatively_cached(self):
+        with patch.object(self.finance_tools.http_client, "get", return_value=_Response(404)) as mock_get:
+            self.assertFalse(self.finance_tools.check_asset_availability("ZZZZ"))
+            self.assertFalse(self.finance_tools.check_asset_availability("ZZZZ"))
+        self.assertEqual(mock_get.call_count, 1)
+
+    def test_upstream_errors_are_not_cached(self):
+        with patch.object(self.finance_tools.http_client, "get", return_value=_Response(500)) as mock_get:
+            self.assertFalse(self.finance_tools.check_asset_availability("AAPL"))
+            self.assertFalse(self.finance_tools.check_asset_availability("AAPL"))
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_preload_removes_per_request_lookup(self):
+        assets = [{"symbol": "AAPL", "tradable": True}, {"symbol": "OTC", "tradable": False}]
+        with patch.object(self.finance_tools.http_client, "get", return_value=_Response(200, assets)) as mock_get:
+            self.assertEqual(self.finance_tools.preload_assets(), 2)
+            self.assertTrue(self.finance_tools.check_asset_availability("AAPL"))
+            self.assertFalse(self.finance_tools.check_asset_availability("OTC"))
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(self.finance_tools.asset_symbols, {"AAPL", "OTC"})
+
+    def test_batch_leaves_out_unknown_symbols(self):
+        from core.tools.cache import TieredCache
+
+        def fake_get(service, url, **kwargs):
+            if url.endswith("/v1/quotes"):
+                return _Response(200, {"AAPL": {"ap": 201.0, "bp": 199.0}})
+            return _Response(200, {"tradable": True}) if url.endswith("/AAPL") else _Response(404)
+
+        with patch.object(self.finance_tools.http_client, "get", side_effect=fake_get), \
+                patch.object(self.finance_tools, "quote_cache", TieredCache("quote", ttl=60)):
+            result = self.finance_tools.get_market_data_batch(["LOL", "AAPL"])
+        self.assertIn("AAPL", result)
+        self.assertNotIn("LOL", result)
+
+
+class TestQuoteBatch(unittest.TestCase):
+
+    def setUp(self):
+        from core.tools import finance_tools
+        from core.tools.cache import TieredCache
+
+        self.finance_tools = finance_tools
+        self.cache_patch = patch.object(finance_tools, "quote_cache", TieredCache("quote", ttl=60))
+        self.cache_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+
+    def test_uncached_symbols_fetched_in_one_call(self):
+        self.finance_tools.quote_cache.set("AAPL", {"ap": 201.0, "bp": 199.0})
+        quotes = {"MSFT": {"ap": 401.0, "bp": 399.0}, "NVDA": {"ap": 101.0, "bp": 99.0}}
+        with patch.object(self.finance_tools.http_client, "get", return_value=_Response(200, quotes)) as mock_get:
+            result = self.finance_tools.get_quotes(["AAPL", "MSFT", "NVDA"])
+            self.assertEqual(self.finance_tools.get_current_price("NVDA"), 100.0)
+        self.assertEqual(set(result), {"AAPL", "MSFT", "NVDA"})
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_get.call_args.kwargs["params"], {"symbols": "MSFT,NVDA"})
+
+    def test_falls_back_to_per_symbol_quotes_without_batch_endpoint(self):
+        def fake_get(service, url, **kwargs):
+            if url.endswith("/v1/quotes"):
+                return _Response(404)
+            return _Response(200, {"ap": 11.0, "bp": 9.0})
+
+        with patch.object(self.finance_tools.http_client, "get", side_effect=fake_get) as mock_get:
+            result = self.finance_tools.get_quotes(["AMD", "INTC"])
+        self.assertEqual(set(result), {"AMD", "INTC"})
+        self.assertEqual(mock_get.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Unit tests for the process-wide embedding service and knowledge base cache."""
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+from unittest.mock import MagicMock, patch
+
+import lancedb
+
+
+class TestEmbeddingService(unittest.TestCase):
+    """The SentenceTransformer must be constructed once per process."""
+
+    def test_model_loaded_once(self):
+        from core.tools.embeddings import EmbeddingService
+
+        fake_model = MagicMock()
+        fake_model.encode.return_value.tolist.return_value = [0.1, 0.2]
+        fake_module = types.SimpleNamespace(SentenceTransformer=MagicMock(return_value=fake_model))
+
+        with patch.dict(sys.modules, {"sentence_transformers": fake_module}):
+            service = EmbeddingService("test-model")
+            service.load()
+            self.assertEqual(service.encode("a"), [0.1, 0.2])
+            self.assertEqual(service.encode("b"), [0.1, 0.2])
+
+        fake_module.SentenceTransformer.assert_called_once_with("test-model")
+        # Warm-up encode + two queries
+        self.assertEqual(fake_model.encode.call_count, 3)
+        self.assertIsNotNone(service.load_seconds)
+
+
+class TestKnowledgeBase(unittest.TestCase):
+    """The table handle is reused and reopened only on a version change."""
+
+    def setUp(self):
+        self.db_path = tempfile.mkdtemp()
+        self.db = lancedb.connect(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def test_missing_table_returns_none(self):
+        from core.tools.embeddings import KnowledgeBase
+
+        kb = KnowledgeBase(self.db_path, "financial_knowledge")
+        self.assertIsNone(kb.search([1.0, 0.0]))
+
+    def test_handle_reused_until_version_changes(self):
+        from core.tools.embeddings import KnowledgeBase
+
+        writer = self.db.create_table("financial_knowledge", [{"vector": [1.0, 0.0], "title": "A", "text": "a"}])
+        kb = KnowledgeBase(self.db_path, "financial_knowledge", check_interval=0)
+
+        first = kb.table()
+        self.assertIs(kb.table(), first)
+
+        writer.add([{"vector": [0.0, 1.0], "title": "B", "text": "b"}])
+        results = kb.search([0.0, 1.0], limit=2)
+        self.assertIsNot(kb.table(), first)
+        self.assertEqual(len(results), 2)
+
+    def test_recreated_table_is_reopened(self):
+        from core.tools.embeddings import KnowledgeBase
+
+        self.db.create_table("financial_knowledge", [{"vector": [1.0, 0.0], "title": "A", "text": "a"}])
+        kb = KnowledgeBase(self.db_path, "financial_knowledge", check_interval=3600)
+        kb.table()
+
+        self.db.drop_table("financial_knowledge")
+        self.db.create_table("financial_knowledge", [{"vector": [0.0, 1.0], "title": "C", "text": "c"}])
+
+        results = kb.search([0.0, 1.0])
+        self.assertEqual(list(results["title"]), ["C"])
+
+
+if __name__ == '__main__':
+    unittest.main()
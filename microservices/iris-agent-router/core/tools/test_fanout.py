@@ -0,0 +1,97 @@
+"""Unit tests for concurrent context fan-out."""
+import asyncio
+import time
+import unittest
+
+
+def _slow(value, delay):
+    time.sleep(delay)
+    return value
+
+
+def _boom():
+    raise ValueError("upstream down")
+
+
+async def _aslow(value, delay):
+    await asyncio.sleep(delay)
+    return value
+
+
+class TestFanOut(unittest.TestCase):
+    """Latency should track the slowest call, with per-call fallbacks."""
+
+    def test_calls_run_concurrently(self):
+        from core.tools.fanout import fan_out
+
+        start = time.monotonic()
+        results, degraded = fan_out({
+            "a": (_slow, ("A", 0.2), 2, None),
+            "b": (_slow, ("B", 0.2), 2, None),
+            "c": (_slow, ("C", 0.2), 2, None),
+        })
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(results, {"a": "A", "b": "B", "c": "C"})
+        self.assertEqual(degraded, set())
+        self.assertLess(elapsed, 0.5)
+
+    def test_timeout_and_error_use_fallback(self):
+        from core.tools.fanout import fan_out
+
+        start = time.monotonic()
+        results, degraded = fan_out({
+            "fast": (_slow, ("ok", 0), 1, None),
+            "slow": (_slow, ("late", 1), 0.1, "fallback"),
+            "broken": (_boom, (), 1, ""),
+        })
+
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(results, {"fast": "ok", "slow": "fallback", "broken": ""})
+        self.assertEqual(degraded, {"slow", "broken"})
+
+    def test_async_cancelled_sub_call_uses_fallback(self):
+        from core.tools.fanout import afan_out
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        async def run():
+            return await afan_out({
+                "a": (_aslow, ("A", 0), 1, None),
+                "cancelled": (cancelled, (), 1, "fallback"),
+            })
+
+        results, degraded = asyncio.run(run())
+        self.assertEqual(results, {"a": "A", "cancelled": "fallback"})
+        self.assertEqual(degraded, {"cancelled"})
+
+        async def cancel_turn():
+            turn = asyncio.create_task(afan_out({"slow": (_aslow, ("S", 1), 2, "fallback")}))
+            await asyncio.sleep(0.05)
+            turn.cancel()
+            await turn
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(cancel_turn())
+
+    def test_async_fan_out(self):
+        from core.tools.fanout import afan_out
+
+        async def run():
+            return await afan_out({
+                "a": (_aslow, ("A", 0.2), 1, None),
+                "b": (_aslow, ("B", 0.2), 1, None),
+                "late": (_aslow, ("L", 1), 0.1, "fallback"),
+            })
+
+        start = time.monotonic()
+        results, degraded = asyncio.run(run())
+
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(results, {"a": "A", "b": "B", "late": "fallback"})
+        self.assertEqual(degraded, {"late"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Unit tests for the pooled upstream HTTP client layer."""
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    """Fails the first request for each path with 503, then succeeds."""
+    protocol_version = "HTTP/1.1"
+    seen_paths = set()
+    client_ports = set()
+    calls = []
+
+    def _reply(self):
+        type(self).client_ports.add(self.client_address[1])
+        type(self).calls.append((self.command, self.path))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.path not in type(self).seen_paths:
+            type(self).seen_paths.add(self.path)
+            status, body = 503, b"{}"
+        else:
+            status, body = 200, json.dumps({"ok": True}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    """Sessions are pooled per upstream; only GETs (and opted-in POSTs) are retried."""
+
+    def setUp(self):
+        _FlakyHandler.seen_paths = set()
+        _FlakyHandler.client_ports = set()
+        _FlakyHandler.calls = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        from core.tools import http_client
+        self.http_client = http_client
+        self.patches = [
+            patch.object(http_client, "_sessions", {}),
+            patch.object(http_client, "_async_clients", {}),
+            patch.object(http_client, "HTTP_BACKOFF", 0),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_is_retried_and_connection_reused(self):
+        response = self.http_client.get("gateway", f"{self.base}/v1/portfolio/u1")
+        self.assertEqual(response.status_code, 200)
+        self.http_client.get("gateway", f"{self.base}/v1/portfolio/u1")
+
+        self.assertEqual(len(_FlakyHandler.calls), 3)
+        # All requests went over one keep-alive connection
+        self.assertEqual(len(_FlakyHandler.client_ports), 1)
+        self.assertIs(self.http_client.get_session("gateway"), self.http_client.get_session("gateway"))
+
+    def test_post_is_not_retried(self):
+        response = self.http_client.post("broker", f"{self.base}/v1/trade", json={"symbol": "AAPL"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(_FlakyHandler.calls, [("POST", "/v1/trade")])
+
+    def test_post_retried_only_on_request(self):
+        response = self.http_client.post("broker", f"{self.base}/v1/trade", json={"client_order_id": "o1"}, retries=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_FlakyHandler.calls, [("POST", "/v1/trade")] * 2)
+
+    def test_async_get_retry_and_post_no_retry(self):
+        async def run():
+            get_resp = await self.http_client.aget("broker", f"{self.base}/v1/quotes/AAPL")
+            post_resp = await self.http_client.apost("broker", f"{self.base}/v1/trade", json={})
+            await self.http_client.close_async_clients()
+            return get_resp.status_code, post_resp.status_code
+
+        self.assertEqual(asyncio.run(run()), (200, 503))
+        self.assertEqual([c[0] for c in _FlakyHandler.calls], ["GET", "GET", "POST"])
+
+
+if __name__ == '__main__':
+    unittest.main()
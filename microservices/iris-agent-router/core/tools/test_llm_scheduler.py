@@ -0,0 +1,92 @@
+"""Unit tests for the LLM admission scheduler."""
+import asyncio
+import unittest
+
+
+class TestLLMScheduler(unittest.TestCase):
+
+    def test_waiters_run_in_priority_order(self):
+        from core.tools.llm_scheduler import LLMScheduler, priority_for
+
+        scheduler = LLMScheduler(max_in_flight=1, max_queue=8, model_limits={})
+        order = []
+
+        async def generate(name, intent, release=None):
+            async with scheduler.slot("m", priority_for(intent)):
+                order.append(name)
+                if release:
+                    await release.wait()
+
+        async def main():
+            release = asyncio.Event()
+            first = asyncio.create_task(generate("first", "ADVICE", release))
+            await asyncio.sleep(0)
+            waiting = [asyncio.create_task(generate(name, intent)) for name, intent in
+                       [("chat", "GENERAL_CHAT"), ("advice", "ADVICE"), ("confirm", "CONFIRM_TRADE")]]
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(first, *waiting)
+
+        asyncio.run(main())
+        self.assertEqual(order, ["first", "confirm", "advice", "chat"])
+
+    def test_full_queue_rejects_with_retry_after(self):
+        from core import metrics
+        from core.tools.llm_scheduler import LLMScheduler, SchedulerBusy
+
+        metrics.reset()
+        scheduler = LLMScheduler(max_in_flight=1, max_queue=1, model_limits={})
+
+        async def main():
+            release = asyncio.Event()
+
+            async def hold(priority=3):
+                async with scheduler.slot("m", priority):
+                    await release.wait()
+
+            tasks = [asyncio.create_task(hold()) for _ in range(2)]  # One running, one queued
+            await asyncio.sleep(0)
+            self.assertEqual(metrics.snapshot()["gauges"]["llm_queue.m.depth"], 1)
+            with self.assertRaises(SchedulerBusy) as busy:
+                async with scheduler.slot("m"):
+                    pass
+            self.assertGreaterEqual(busy.exception.retry_after, 1)
+
+            confirm = asyncio.create_task(hold(priority=0))  # Confirmations are queued even when full
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.wait_for(asyncio.gather(*tasks, confirm), 1)
+
+        asyncio.run(main())
+        self.assertEqual(metrics.snapshot()["counters"]["llm_queue.m.rejected"], 1)
+        self.assertEqual(metrics.snapshot()["gauges"]["llm_queue.m.in_flight"], 0)
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        from core.tools.llm_scheduler import LLMScheduler
+
+        scheduler = LLMScheduler(max_in_flight=1, max_queue=4, model_limits={"m": 1})
+
+        async def main():
+            release = asyncio.Event()
+
+            async def hold():
+                async with scheduler.slot("m"):
+                    await release.wait()
+
+            running = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            self.assertFalse(scheduler.is_full("m"))
+            self.assertEqual(len(scheduler._queue("m").waiters), 0)
+            release.set()
+            await running
+            self.assertEqual(scheduler._queue("m").in_flight, 0)
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Tests for the Ollama backend pool against local fake Ollama servers."""
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllama:
+    """Minimal Ollama HTTP API: /api/ps, streaming /api/chat and /api/generate."""
+
+    def __init__(self, name, loaded=()):
+        self.name = name
+        self.loaded = list(loaded)
+        self.requests = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, lines):
+                body = "".join(json.dumps(line) + "\n" for line in lines).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._reply([{"models": [{"name": m, "model": m} for m in fake.loaded]}])
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.requests.append((self.path, request))
+                fake.loaded = sorted(set(fake.loaded) | {request["model"]})
+                final = {"model": request["model"], "done": True, "done_reason": "stop",
+                         "prompt_eval_count": 10, "prompt_eval_duration": 1000, "eval_count": 2, "eval_duration": 1000}
+                if self.path == "/api/chat":
+                    message = {"role": "assistant", "content": fake.name}
+                    chunk = {"model": request["model"], "done": False, "message": message}
+                    self._reply([chunk, {**final, "message": {"role": "assistant", "content": ""}}])
+                else:
+                    chunk = {"model": request["model"], "done": False, "response": fake.name}
+                    self._reply([chunk, {**final, "response": ""}])
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestOllamaPool(unittest.TestCase):
+
+    def setUp(self):
+        self.cold = FakeOllama("cold")
+        self.warm = FakeOllama("warm", loaded=["small"])
+
+    def tearDown(self):
+        for fake in (self.cold, self.warm):
+            try:
+                fake.stop()
+            except Exception:
+                pass
+
+    def _stream(self, pool, model):
+        from langchain_ollama import ChatOllama
+
+        async def main():
+            await pool.check_health()
+            chunks = pool.stream(model, lambda url: ChatOllama(model=model, base_url=url).astream("hi"), affinity="u1")
+            return "".join([chunk.content async for chunk in chunks])
+        return asyncio.run(main())
+
+    def test_routes_to_backend_with_model_loaded(self):
+        from langchain_ollama import OllamaLLM
+        from core.tools.ollama_pool import OllamaPool
+
+        pool = OllamaPool([self.cold.url, self.warm.url])
+        self.assertEqual(self._stream(pool, "small"), "warm")
+
+        async def generate():
+            return await pool.run("small", lambda url: OllamaLLM(model="small", base_url=url).ainvoke("hi"))
+        self.assertEqual(asyncio.run(generate()), "warm")
+        self.assertEqual(self.cold.requests, [])
+        self.assertEqual(sum(b.outstanding for b in pool.backends), 0)
+
+    def test_fails_over_when_backend_is_down(self):
+        from langchain_ollama import ChatOllama
+        from core import metrics
+        from core.tools.ollama_pool import OllamaPool
+
+        metrics.reset()
+        pool = OllamaPool([self.cold.url, self.warm.url])
+        asyncio.run(pool.check_health())
+        self.warm.stop()  # Still believed healthy until the next health check
+
+        async def main():
+            chunks = pool.stream("small", lambda url: ChatOllama(model="small", base_url=url).astream("hi"))
+            return "".join([chunk.content async for chunk in chunks])
+        self.assertEqual(asyncio.run(main()), "cold")
+        self.assertEqual(metrics.snapshot()["counters"]["ollama_pool.failover"], 1)
+        self.assertEqual([b.healthy for b in pool.backends], [True, False])
+
+        asyncio.run(pool.check_health())
+        self.assertEqual([b.models for b in pool.backends], [{"small"}, set()])
+
+    def test_read_timeout_is_not_failed_over(self):
+        import httpx
+        from core.tools.ollama_pool import OllamaPool
+
+        pool = OllamaPool(["http://a", "http://b"])
+        calls = []
+
+        async def generate(url):
+            calls.append(url)
+            raise httpx.ReadTimeout("generation too slow")
+        with self.assertRaises(httpx.ReadTimeout):
+            asyncio.run(pool.run("small", generate))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(b.healthy for b in pool.backends))
+        self.assertEqual(sum(b.outstanding for b in pool.backends), 0)
+
+    def test_affinity_yields_to_least_outstanding(self):
+        from core.tools.ollama_pool import OllamaPool
+
+        pool = OllamaPool(["http://a", "http://b", "http://c"], affinity_slack=1)
+        sticky = pool.candidates("m", affinity="u1")[0]
+        self.assertEqual(pool.candidates("m", affinity="u1")[0], sticky)  # Stable per user
+
+        sticky.outstanding = 3
+        self.assertNotEqual(pool.candidates("m", affinity="u1")[0], sticky)
+        self.assertEqual(len(pool.candidates("m", affinity="u1")), 3)  # Failover order covers every backend
+
+    def test_empty_pool_raises_no_backend_available(self):
+        from core.tools.ollama_pool import OllamaPool, NoBackendAvailable, _backend_urls, OLLAMA_BASE_URL
+
+        pool = OllamaPool([])
+
+        async def stream():
+            return [chunk async for chunk in pool.stream("small", lambda url: None)]
+        with self.assertRaises(NoBackendAvailable):
+            asyncio.run(pool.run("small", lambda url: None))
+        with self.assertRaises(NoBackendAvailable):
+            asyncio.run(stream())
+
+        self.assertEqual(_backend_urls(" , "), [OLLAMA_BASE_URL])  # Empty OLLAMA_BASE_URLS
+        self.assertEqual(_backend_urls("http://a/, http://b"), ["http://a", "http://b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Unit tests for the semantic response cache."""
+import time
+import unittest
+
+
+class TestSemanticCache(unittest.TestCase):
+
+    def test_similar_question_hits_within_partition_only(self):
+        from core.tools.semantic_cache import SemanticCache
+
+        cache = SemanticCache(threshold=0.9, ttl=60, maxsize=10)
+        cache.store("ADVICE|SPY@100", [1.0, 0.0], "answer")
+
+        self.assertEqual(cache.lookup("ADVICE|SPY@100", [0.99, 0.05]), "answer")
+        self.assertIsNone(cache.lookup("ADVICE|SPY@100", [0.0, 1.0]))
+        self.assertIsNone(cache.lookup("ADVICE|SPY@101", [1.0, 0.0]))
+
+    def test_ttl_and_lru_eviction(self):
+        from core.tools.semantic_cache import SemanticCache
+
+        cache = SemanticCache(threshold=0.9, ttl=60, maxsize=2)
+        cache.store("p", [1.0, 0.0], "a")
+        cache.store("p", [0.0, 1.0], "b")
+        cache.lookup("p", [1.0, 0.0])  # a is now most recently used
+        cache.store("q", [1.0, 0.0], "c")
+
+        self.assertEqual(cache.lookup("p", [1.0, 0.0]), "a")
+        self.assertIsNone(cache.lookup("p", [0.0, 1.0]))
+
+        cache.ttl = 0.01
+        cache.store("r", [1.0, 0.0], "d")
+        time.sleep(0.02)
+        self.assertIsNone(cache.lookup("r", [1.0, 0.0]))
+
+    def test_personal_and_trade_questions_bypass(self):
+        from core.tools.semantic_cache import is_cacheable, market_snapshot
+
+        self.assertTrue(is_cacheable("ADVICE", "What is the market outlook for tech?"))
+        self.assertFalse(is_cacheable("ADVICE", "How is my portfolio doing?"))
+        self.assertFalse(is_cacheable("ADVICE", "Should I buy more?"))
+        self.assertFalse(is_cacheable("TRADE", "Buy 5 NVDA"))
+        self.assertEqual(market_snapshot("SPY", 452.0), market_snapshot("SPY", 453.0))
+        self.assertNotEqual(market_snapshot("SPY", 450.0), market_snapshot("SPY", 470.0))
+        self.assertIsNone(market_snapshot("SPY", 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
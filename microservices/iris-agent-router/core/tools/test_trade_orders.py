@@ -0,0 +1,76 @@
+"""Tests for idempotent, deduplicated order submission."""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from core.fakes import FakeAsyncRedis
+
+
+PENDING = {"id": "p1", "symbol": "AAPL", "action": "buy", "quantity": 2, "amount": 0}
+
+
+class TestTradeOrders(unittest.TestCase):
+
+    def test_client_order_id_is_stable_per_proposal(self):
+        from core.tools.trade_orders import client_order_id
+
+        order_id = client_order_id("u1", PENDING)
+        self.assertEqual(order_id, client_order_id("u1", dict(PENDING)))
+        self.assertNotEqual(order_id, client_order_id("u1", dict(PENDING, id="p2")))
+        self.assertNotEqual(order_id, client_order_id("u2", PENDING))
+        self.assertLessEqual(len(order_id), 128)
+
+    @patch('core.tools.finance_tools.aget_current_price', new_callable=AsyncMock, return_value=190.0)
+    @patch('core.tools.finance_tools.ainvalidate_after_trade', new_callable=AsyncMock)
+    @patch('core.tools.finance_tools.aget_alpaca_account_id', new_callable=AsyncMock, return_value="acct-1")
+    @patch('core.tools.finance_tools.http_client.apost', new_callable=AsyncMock)
+    def test_double_confirmation_places_one_order(self, mock_post, mock_account, mock_invalidate, mock_price):
+        from core.tools import finance_tools
+        from core.tools.trade_orders import INFLIGHT_MESSAGE, client_order_id
+
+        order_id = client_order_id("u1", PENDING)
+        release = asyncio.Event()
+
+        async def post(upstream, url, json, **kwargs):
+            await release.wait()
+
+            def body():
+                return {"status": "submitted", "client_order_id": json["client_order_id"]}
+            return MagicMock(status_code=200, json=body)
+        mock_post.side_effect = post
+
+        async def main():
+            def submit():
+                return finance_tools.aexecute_trade_action("u1", "AAPL", "buy", 2, client_order_id=order_id)
+            first = asyncio.create_task(submit())
+            await asyncio.sleep(0)
+            concurrent = await submit()  # While the first is in flight
+            release.set()
+            return await first, concurrent, await submit()
+
+        with patch.object(finance_tools, "async_redis_client", FakeAsyncRedis()):
+            first, concurrent, repeat = asyncio.run(main())
+
+        self.assertEqual(mock_post.await_count, 1)
+        self.assertEqual(mock_post.await_args.kwargs["json"]["client_order_id"], order_id)
+        self.assertGreater(mock_post.await_args.kwargs["retries"], 0)
+        self.assertEqual(concurrent, INFLIGHT_MESSAGE)
+        self.assertEqual(repeat, first)
+
+    @patch('core.tools.finance_tools.aget_alpaca_account_id', new_callable=AsyncMock, return_value="acct-1")
+    @patch('core.tools.finance_tools.http_client.apost', new_callable=AsyncMock)
+    def test_failed_order_can_be_retried(self, mock_post, mock_account):
+        from core.tools import finance_tools
+        from core.tools.cache import TieredCache
+
+        mock_post.return_value = MagicMock(status_code=500, text="rejected")
+        with patch.object(finance_tools, "async_redis_client", FakeAsyncRedis()), \
+                patch.object(finance_tools, "account_cache", TieredCache("account", ttl=60)):
+            for _ in range(2):
+                result = asyncio.run(finance_tools.aexecute_trade_action("u1", "AAPL", "buy", 2, client_order_id="o1"))
+                self.assertIn("status 500", result)
+        self.assertEqual(mock_post.await_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
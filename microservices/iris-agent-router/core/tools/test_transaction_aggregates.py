@@ -0,0 +1,63 @@
+"""Unit tests for the per-user transaction aggregates."""
+import unittest
+
+
+def _txn(ts: str, side: str, shares: float, symbol: str, price: float):
+    return {"timestamp": ts, "type": side, "shares": shares, "symbol": symbol, "price": price}
+
+
+TXNS = [  # Newest first, as returned by the gateway
+    _txn("2024-02-10T00:00:00Z", "SELL", 15, "AAPL", 120.0),
+    _txn("2024-02-01T00:00:00Z", "BUY", 10, "AAPL", 110.0),
+    _txn("2024-01-15T00:00:00Z", "BUY", 2, "MSFT", 300.0),
+    _txn("2024-01-05T00:00:00Z", "BUY", 10, "AAPL", 100.0),
+]
+
+
+class TestTransactionAggregates(unittest.TestCase):
+
+    def test_average_cost_realized_pl_and_monthly_buckets(self):
+        from core.tools import transaction_aggregates
+
+        aapl = transaction_aggregates.build(TXNS)["symbols"]["AAPL"]
+
+        self.assertEqual(aapl["net_shares"], 5)
+        self.assertEqual(aapl["cost_basis"], 525.0)  # 5 shares @ avg $105
+        self.assertEqual(aapl["realized_pl"], 225.0)  # 15 * (120 - 105)
+        self.assertEqual((aapl["trades"], aapl["buys"], aapl["sells"]), (3, 2, 1))
+        self.assertEqual(aapl["last_date"], "2024-02-10")
+        self.assertEqual(aapl["months"], {"2024-01": [1, 10, 1000.0], "2024-02": [2, -5, 2900.0]})
+
+    def test_incremental_apply_matches_full_build(self):
+        from core.tools import transaction_aggregates
+
+        incremental = transaction_aggregates.build(TXNS[2:])
+        new = transaction_aggregates.new_transactions(TXNS[2:], TXNS[:3])  # Overlapping delta fetch
+        transaction_aggregates.apply(incremental, new)
+
+        self.assertEqual(len(new), 2)
+        self.assertEqual(incremental, transaction_aggregates.build(TXNS))
+
+    def test_apply_new_skips_transactions_before_cursor(self):
+        from core.tools import transaction_aggregates
+
+        incremental = transaction_aggregates.build(TXNS[2:])
+        self.assertEqual(incremental["cursor"], "2024-01-15T00:00:00Z")
+        new = transaction_aggregates.apply_new(incremental, TXNS[:3])  # Overlapping delta fetch
+
+        self.assertEqual(len(new), 2)
+        self.assertEqual(incremental, transaction_aggregates.build(TXNS))
+        self.assertEqual(incremental["cursor"], "2024-02-10T00:00:00Z")
+
+    def test_format_summary_lists_focus_and_open_positions_first(self):
+        from core.tools import transaction_aggregates
+
+        summary = transaction_aggregates.format_summary(transaction_aggregates.build(TXNS), focus=["MSFT"])
+        lines = summary.splitlines()
+
+        self.assertTrue(lines[0].startswith("MSFT: 1 trades"))
+        self.assertIn("AAPL: 3 trades (2 buys/1 sells), net 5 shares @ avg $105.00, realized P/L $225.00", lines[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+"""Unit tests for the segmented, incrementally refreshed user-context cache."""
+import json
+import unittest
+from unittest.mock import patch
+
+from core.fakes import FakeRedis
+
+
+PORTFOLIO = {"totalValue": 1000, "holdings": [
+    {"symbol": "AAPL", "shares": 5, "price": 100, "value": 500,
+     "changePercent": 0, "gainLossPercent": 0, "gainLoss": 0},
+]}
+TXNS = [
+    {"timestamp": "2025-01-02T00:00:00Z", "type": "BUY", "shares": 5, "symbol": "AAPL", "price": 100.0},
+    {"timestamp": "2025-01-01T00:00:00Z", "type": "BUY", "shares": 1, "symbol": "MSFT", "price": 300.0},
+]
+NVDA_BUY = {"timestamp": "2025-01-05T00:00:00Z", "type": "BUY", "shares": 2, "symbol": "NVDA", "price": 500.0}
+
+
+class TestSegmentHelpers(unittest.TestCase):
+
+    def test_merge_transactions_dedups_and_orders(self):
+        from core.tools.user_context import merge_transactions
+
+        sale = {"timestamp": "2025-01-03T00:00:00Z", "type": "SELL", "shares": 1, "symbol": "AAPL", "price": 110.0}
+        new = [sale, TXNS[0]]
+        merged = merge_transactions(TXNS, new, limit=10)
+        self.assertEqual([t["timestamp"][:10] for t in merged], ["2025-01-03", "2025-01-02", "2025-01-01"])
+
+    def test_cursor_compares_timestamps_as_times(self):
+        from core.tools.user_context import transactions_cursor
+
+        items = [
+            {"timestamp": "2025-01-02T09:00:00.5+00:00"},
+            {"timestamp": "2025-01-02T10:30:00+02:00"},  # 08:30 UTC
+            {"timestamp": "2025-01-02T09:00:00Z"},
+            {"timestamp": None},
+        ]
+        self.assertEqual(transactions_cursor(items), "2025-01-02T09:00:00.500000Z")
+        self.assertEqual(transactions_cursor(TXNS), "2025-01-02T00:00:00Z")
+        self.assertIsNone(transactions_cursor([{"timestamp": "yesterday"}]))
+
+    def test_patch_portfolio_updates_and_adds_holdings(self):
+        from core.tools.user_context import patch_portfolio
+
+        portfolio = json.loads(json.dumps(PORTFOLIO))
+        patch_portfolio(portfolio, "AAPL", "sell", 2, 110.0)
+        patch_portfolio(portfolio, "NVDA", "buy", 1, 500.0)
+
+        holdings = {h["symbol"]: h for h in portfolio["holdings"]}
+        self.assertEqual(holdings["AAPL"]["shares"], 3)
+        self.assertEqual(holdings["AAPL"]["value"], 330.0)
+        self.assertEqual(holdings["NVDA"]["shares"], 1)
+
+        patch_portfolio(portfolio, "NVDA", "sell", 1, 500.0)
+        self.assertNotIn("NVDA", [h["symbol"] for h in portfolio["holdings"]])
+
+
+class TestBuildUserContext(unittest.TestCase):
+
+    def setUp(self):
+        from core.tools import finance_tools
+
+        self.ft = finance_tools
+        self.redis = FakeRedis()
+        self.calls = []
+        self.history = list(TXNS)
+
+        def fetch_transactions(user_id, limit=1000, since=None, before=None):
+            # The gateway: newest first, `since` exclusive, `before` inclusive
+            self.calls.append(("transactions", since))
+            rows = [t for t in self.history if (not since or t["timestamp"] > since)
+                    and (not before or t["timestamp"] <= before)]
+            return sorted(rows, key=lambda t: t["timestamp"], reverse=True)[:limit]
+
+        def fetch_portfolio(user_id):
+            self.calls.append(("portfolio", None))
+            return json.loads(json.dumps(PORTFOLIO))
+
+        def fetch_history(user_id):
+            self.calls.append(("history", None))
+            return [{"role": "user", "content": "hi"}]
+
+        self.patches = [
+            patch.object(finance_tools, "redis_client", self.redis),
+            patch.object(finance_tools, "_fetch_transactions", side_effect=fetch_transactions),
+            patch.object(finance_tools, "_fetch_portfolio", side_effect=fetch_portfolio),
+            patch.object(finance_tools, "_fetch_chat_history", side_effect=fetch_history),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_cold_then_warm_build(self):
+        context = self.ft.build_user_context("u1")
+        self.assertIn("AAPL", context)
+        self.assertIn("MSFT", context)
+        self.assertEqual(len(self.calls), 3)
+
+        self.calls.clear()
+        self.assertEqual(self.ft.build_user_context("u1"), context)
+        self.assertEqual(self.calls, [])
+
+    def test_stale_transactions_refreshed_incrementally(self):
+        self.ft.build_user_context("u1")
+        self.calls.clear()
+
+        # Freshness marker expired (or a trade invalidated it)
+        self.redis.delete("user_context:u1:transactions_fresh")
+        self.history.append(NVDA_BUY)
+        context = self.ft.build_user_context("u1")
+
+        self.assertEqual(self.calls, [("transactions", "2025-01-02T00:00:00Z")])
+        self.assertIn("NVDA", context)
+        self.assertEqual(len(json.loads(self.redis.get("user_context:u1:transactions"))), 3)
+        aggregates = json.loads(self.redis.get("user_context:u1:aggregates"))
+        self.assertEqual(aggregates["transactions"], 3)
+        self.assertEqual(aggregates["symbols"]["NVDA"]["net_shares"], 2)
+
+    def test_trade_patches_portfolio_and_invalidates_transactions(self):
+        self.ft.build_user_context("u1")
+        self.ft.invalidate_after_trade("u1", "AAPL", "buy", 5, 100.0)
+
+        portfolio = json.loads(self.redis.get("user_context:u1:portfolio"))
+        self.assertEqual(portfolio["holdings"][0]["shares"], 10)
+        self.assertIsNone(self.redis.get("user_context:u1:transactions_fresh"))
+        self.assertIsNone(self.redis.get("user_context:u1:aggregates_fresh"))
+
+    def test_aggregates_cover_history_beyond_one_page(self):
+        self.history.append(NVDA_BUY)
+        with patch("core.tools.user_context.TRANSACTION_LIMIT", 2):
+            segments = self.ft.build_user_context_segments("u1", include=("transactions",))
+
+        self.assertEqual(len(self.calls), 3)  # Pages overlap on their boundary row (`before` is inclusive)
+        self.assertEqual(len(segments["transactions"]), 2)
+        self.assertEqual(segments["aggregates"]["transactions"], 3)
+        self.assertEqual(set(segments["aggregates"]["symbols"]), {"AAPL", "MSFT", "NVDA"})
+
+    def test_transaction_summary_reads_only_aggregates(self):
+        read_keys = []
+        mget = self.redis.mget
+        self.redis.mget = lambda keys: read_keys.extend(keys) or mget(keys)
+
+        summary = self.ft.get_transaction_summary("u1")
+        self.assertIn("AAPL: 1 trades", summary)
+        self.assertNotIn("user_context:u1:transactions", read_keys)
+        self.assertIsNone(self.redis.get("user_context:u1:transactions"))
+
+        # Refreshed from the aggregates' own cursor once stale
+        self.calls.clear()
+        self.redis.delete("user_context:u1:aggregates_fresh")
+        self.history.append(NVDA_BUY)
+        self.assertIn("NVDA: 1 trades", self.ft.get_transaction_summary("u1"))
+        self.assertEqual(self.calls, [("transactions", "2025-01-02T00:00:00Z")])
+
+
+if __name__ == '__main__':
+    unittest.main()
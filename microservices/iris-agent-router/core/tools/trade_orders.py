@@ -0,0 +1,102 @@
+"""Idempotent order submission.
+
+Every order carries a client order ID derived from the identity of the
+pending trade it confirms (user, proposal id, symbol, side, quantity), so the
+same proposal always maps to the same ID:
+
+- the broker forwards it to Alpaca, which refuses a second order with the same
+  ID (reported back as already submitted); network errors and 5xx responses
+  are therefore retried with the same ID (TRADE_RETRIES),
+- an in-flight marker in Redis (SET NX) stops a concurrent duplicate, e.g. a
+  double "yes", before it reaches the broker; once the order is placed the
+  marker holds its result for TRADE_DEDUP_TTL and repeats get that result.
+
+Without Redis only the broker-side check applies.
+"""
+import hashlib
+import os
+import uuid
+
+from core import metrics
+
+TRADE_RETRIES = int(os.getenv("TRADE_RETRIES", "3"))
+# Outcome of a placed order is remembered for a trading day
+TRADE_DEDUP_TTL = int(os.getenv("TRADE_DEDUP_TTL", "86400"))
+# Must outlast a submission with all its retries
+TRADE_INFLIGHT_TTL = int(os.getenv("TRADE_INFLIGHT_TTL", "120"))
+
+INFLIGHT = "inflight"
+INFLIGHT_MESSAGE = "Trade is already being submitted; it was not placed a second time."
+
+
+def new_trade_id() -> str:
+    """Identity of a new trade proposal (stored in the pending trade)."""
+    return uuid.uuid4().hex
+
+
+def client_order_id(user_id: str, pending: dict) -> str:
+    """Client order ID for confirming `pending` (at most 128 chars for Alpaca)."""
+    parts = (user_id, pending.get("id", ""), pending["symbol"], pending["action"], pending["quantity"])
+    identity = "|".join(str(part) for part in parts)
+    return "iris-" + hashlib.sha256(identity.encode()).hexdigest()[:32]
+
+
+def order_key(order_id: str) -> str:
+    return f"trade_order:{order_id}"
+
+
+def duplicate_result(existing: str) -> str:
+    metrics.incr("trade.duplicate")
+    return INFLIGHT_MESSAGE if existing == INFLIGHT else existing
+
+
+def claim(redis_client, order_id: str):
+    """Marks the order in flight; returns None if claimed, else INFLIGHT or the placed order's result."""
+    if redis_client is None:
+        return None
+    try:
+        if redis_client.set(order_key(order_id), INFLIGHT, nx=True, ex=TRADE_INFLIGHT_TTL):
+            return None
+        return redis_client.get(order_key(order_id)) or INFLIGHT
+    except Exception as e:
+        print(f"Trade dedup claim failed: {e}")
+        return None
+
+
+def finish(redis_client, order_id: str, result: str, placed: bool):
+    """Keeps the result of a placed order; releases the claim otherwise so the trade can be retried."""
+    if redis_client is None:
+        return
+    try:
+        if placed:
+            redis_client.setex(order_key(order_id), TRADE_DEDUP_TTL, result)
+        else:
+            redis_client.delete(order_key(order_id))
+    except Exception as e:
+        print(f"Trade dedup update failed: {e}")
+
+
+async def aclaim(redis_client, order_id: str):
+    """Async variant of claim."""
+    if redis_client is None:
+        return None
+    try:
+        if await redis_client.set(order_key(order_id), INFLIGHT, nx=True, ex=TRADE_INFLIGHT_TTL):
+            return None
+        return await redis_client.get(order_key(order_id)) or INFLIGHT
+    except Exception as e:
+        print(f"Trade dedup claim failed: {e}")
+        return None
+
+
+async def afinish(redis_client, order_id: str, result: str, placed: bool):
+    """Async variant of finish."""
+    if redis_client is None:
+        return
+    try:
+        if placed:
+            await redis_client.setex(order_key(order_id), TRADE_DEDUP_TTL, result)
+        else:
+            await redis_client.delete(order_key(order_id))
+    except Exception as e:
+        print(f"Trade dedup update failed: {e}")
@@ -0,0 +1,109 @@
+"""Per-user transaction aggregates.
+
+A compact per-symbol summary of a user's trade history, so the context builder
+and analytics tools read O(symbols) data instead of O(transactions):
+
+    {"symbols": {"AAPL": {"net_shares", "cost_basis", "realized_pl", "trades",
+                          "buys", "sells", "last_date",
+                          "months": {"2024-01": [trades, net_shares, notional]}}},
+     "transactions": <number of transactions applied>,
+     "cursor": <latest applied timestamp>}
+
+Aggregates are built once from the full history and then refreshed
+incrementally: `apply_new` folds only the transactions after the cursor into
+the stored state. Realized P/L uses average cost on long
+positions (sells beyond the held quantity do not realize P/L).
+"""
+from core.tools.user_context import transaction_identity, transactions_cursor, parse_timestamp
+
+
+def empty() -> dict:
+    return {"symbols": {}, "transactions": 0, "cursor": None}
+
+
+def _new_symbol() -> dict:
+    return {"net_shares": 0.0, "cost_basis": 0.0, "realized_pl": 0.0,
+            "trades": 0, "buys": 0, "sells": 0, "last_date": "", "months": {}}
+
+
+def _apply_one(agg: dict, t: dict):
+    s = agg["symbols"].setdefault(t["symbol"], _new_symbol())
+    shares = float(t.get("shares") or 0)
+    price = float(t.get("price") or 0)
+    timestamp = t.get("timestamp") or ""
+    is_sell = str(t.get("type", "")).upper() == "SELL"
+
+    if is_sell:
+        held = max(s["net_shares"], 0.0)
+        closed = min(shares, held)
+        if closed > 0:
+            avg_cost = s["cost_basis"] / held
+            s["realized_pl"] += closed * (price - avg_cost)
+            s["cost_basis"] -= closed * avg_cost
+        s["net_shares"] -= shares
+        s["sells"] += 1
+    else:
+        if s["net_shares"] >= 0:
+            s["cost_basis"] += shares * price
+        s["net_shares"] += shares
+        s["buys"] += 1
+    if s["net_shares"] <= 0:
+        s["cost_basis"] = 0.0
+
+    s["trades"] += 1
+    s["last_date"] = max(s["last_date"], timestamp[:10])
+    bucket = s["months"].setdefault(timestamp[:7] or "unknown", [0, 0.0, 0.0])
+    bucket[0] += 1
+    bucket[1] += -shares if is_sell else shares
+    bucket[2] += shares * price
+
+    for field in ("net_shares", "cost_basis", "realized_pl"):
+        s[field] = round(s[field], 6)
+    bucket[1], bucket[2] = round(bucket[1], 6), round(bucket[2], 2)
+    agg["transactions"] += 1
+
+
+def apply(agg: dict, txns: list) -> dict:
+    """Folds transactions (any order) into `agg` chronologically; returns `agg`."""
+    for t in sorted(txns, key=lambda t: t.get("timestamp") or ""):
+        _apply_one(agg, t)
+    latest = [{"timestamp": agg["cursor"]}] if agg.get("cursor") else []
+    agg["cursor"] = transactions_cursor(txns + latest)
+    return agg
+
+
+def apply_new(agg: dict, txns: list) -> list:
+    """Folds the transactions after the aggregates' cursor into `agg`; returns those applied."""
+    cursor = parse_timestamp(agg.get("cursor"))
+    new = [t for t in txns if cursor is None or (parse_timestamp(t.get("timestamp")) or cursor) > cursor]
+    if new:
+        apply(agg, new)
+    return new
+
+
+def build(txns: list) -> dict:
+    return apply(empty(), txns)
+
+
+def new_transactions(cached: list, fetched: list) -> list:
+    """Fetched transactions not already present in the cached list."""
+    seen = {transaction_identity(t) for t in cached}
+    return [t for t in fetched if transaction_identity(t) not in seen]
+
+
+def format_summary(agg: dict, focus=()) -> str:
+    """One line per symbol: focus tickers first, then open positions, then by activity."""
+    if not agg or not agg["symbols"]:
+        return "No recorded transactions."
+    focus = set(focus)
+    ordered = sorted(agg["symbols"].items(),
+                     key=lambda kv: (kv[0] not in focus, kv[1]["net_shares"] <= 0, -kv[1]["trades"]))
+    lines = []
+    for symbol, s in ordered:
+        line = (f"{symbol}: {s['trades']} trades ({s['buys']} buys/{s['sells']} sells), "
+                f"net {s['net_shares']:g} shares")
+        if s["net_shares"] > 0:
+            line += f" @ avg ${s['cost_basis'] / s['net_shares']:.2f}"
+        line += f", realized P/L ${s['realized_pl']:,.2f}, last {s['last_date']}"
+        lines.append(line)
+    return "\n".join(lines)
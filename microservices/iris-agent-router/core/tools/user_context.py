@@ -0,0 +1,142 @@
+"""Segmented user-context cache.
+
+The user context is cached as independent Redis segments so each one can be
+refreshed or invalidated on its own:
+
+- portfolio:    raw gateway portfolio JSON, patched in place after a trade.
+- transactions: raw transactions (newest first) plus a cursor; when the short
+                freshness marker expires only transactions newer than the
+                cursor are fetched and merged in.
+- aggregates:   per-symbol transaction aggregates (transaction_aggregates.py)
+                over the full history, paged in from the gateway when missing
+                and then folded forward from their own cursor. They have their
+                own freshness marker so they can be read and refreshed without
+                the raw transactions.
+- history:      recent chat messages, appended to after each turn.
+
+This module holds the key layout and the pure merge/patch logic; the I/O
+lives in finance_tools (build_user_context / abuild_user_context).
+"""
+import json
+import os
+from datetime import datetime, timezone
+
+PORTFOLIO_TTL = int(os.getenv("CONTEXT_PORTFOLIO_TTL", "300"))
+HISTORY_TTL = int(os.getenv("CONTEXT_HISTORY_TTL", "300"))
+# Transactions are kept for a day and re-validated incrementally
+TRANSACTIONS_TTL = int(os.getenv("CONTEXT_TRANSACTIONS_TTL", "86400"))
+TRANSACTIONS_FRESH_TTL = int(os.getenv("CONTEXT_TRANSACTIONS_FRESH_TTL", "300"))
+TRANSACTION_LIMIT = 1000
+HISTORY_LIMIT = 10
+
+SEGMENTS = ("portfolio", "transactions", "transactions_fresh", "aggregates", "aggregates_fresh", "history")
+# Parts a caller can ask for (transactions come with their aggregates; "aggregates" alone
+# skips the raw transactions)
+CONTEXT_PARTS = ("portfolio", "transactions", "history")
+PART_SEGMENTS = {
+    "portfolio": ("portfolio",),
+    "transactions": ("transactions", "transactions_fresh", "aggregates", "aggregates_fresh"),
+    "aggregates": ("aggregates", "aggregates_fresh"),
+    "history": ("history",),
+}
+
+
+def segment_key(user_id: str, segment: str) -> str:
+    return f"user_context:{user_id}:{segment}"
+
+
+def segment_keys(user_id: str, segments=SEGMENTS) -> list:
+    return [segment_key(user_id, s) for s in segments]
+
+
+def segments_for(include) -> tuple:
+    """Segments (in SEGMENTS order) backing the requested context parts."""
+    needed = {seg for part in include for seg in PART_SEGMENTS[part]}
+    return tuple(s for s in SEGMENTS if s in needed)
+
+
+def decode(raw):
+    return json.loads(raw) if raw is not None else None
+
+
+def parse_timestamp(value):
+    """Aware datetime of an ISO 8601 timestamp (naive ones are UTC), or None if unparseable."""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def transactions_cursor(items: list, oldest: bool = False):
+    """Latest (or oldest) transaction timestamp as RFC 3339 in UTC, or None.
+
+    The latest is the incremental fetch cursor (`since`), the oldest the
+    paging cursor (`before`).
+    """
+    timestamps = [ts for ts in (parse_timestamp(t.get("timestamp")) for t in items) if ts]
+    if not timestamps:
+        return None
+    cursor = min(timestamps) if oldest else max(timestamps)
+    return cursor.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def transaction_identity(t: dict) -> tuple:
+    return (t.get("timestamp"), t.get("symbol"), t.get("type"), t.get("shares"), t.get("price"))
+
+
+def merge_transactions(cached: list, new: list, limit: int = TRANSACTION_LIMIT) -> list:
+    """Merges newly fetched transactions into the cached list (newest first, deduplicated)."""
+    seen = set()
+    merged = []
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    for t in sorted(new + cached, key=lambda t: parse_timestamp(t.get("timestamp")) or oldest, reverse=True):
+        ident = transaction_identity(t)
+        if ident in seen:
+            continue
+        seen.add(ident)
+        merged.append(t)
+    return merged[:limit]
+
+
+def _iter_holdings(portfolio: dict):
+    if portfolio.get("holdings"):
+        yield portfolio["holdings"]
+    for group in portfolio.get("brokerGroups", []):
+        if group.get("holdings"):
+            yield group["holdings"]
+
+
+def patch_portfolio(portfolio: dict, symbol: str, side: str, quantity: float, price: float) -> dict:
+    """Applies an executed trade to a cached portfolio so holdings are not stale.
+
+    Share counts and position value are adjusted; P/L figures are left as-is
+    until the next full refresh.
+    """
+    delta = quantity if side == "buy" else -quantity
+    for holdings in _iter_holdings(portfolio):
+        for h in holdings:
+            if h.get("symbol") == symbol:
+                shares = float(h.get("shares") or 0) + delta
+                h["shares"] = round(shares, 6)
+                if price > 0:
+                    h["price"] = price
+                    h["value"] = round(shares * price, 2)
+                if shares <= 0:
+                    holdings.remove(h)
+                return portfolio
+
+    if delta > 0:
+        new_holding = {"symbol": symbol, "shares": delta, "price": price, "value": round(delta * price, 2),
+                       "changePercent": 0, "gainLossPercent": 0, "gainLoss": 0}
+        groups = portfolio.get("brokerGroups") or []
+        if not portfolio.get("holdings") and groups:
+            groups[0].setdefault("holdings", []).append(new_holding)
+        else:
+            portfolio.setdefault("holdings", []).append(new_holding)
+    return portfolio
+
+
+def append_history(history: list, messages: list, limit: int = HISTORY_LIMIT) -> list:
+    """Appends new chat messages ({role, content}) and keeps the most recent `limit`."""
+    return (history + messages)[-limit:]
@@ -0,0 +1,60 @@
+
+"""Latency and quality of the LLM trade extractor per model tier.
+
+Runs the production extraction prompt (schema-constrained, same options as
+agent_router.EXTRACTION_LLM) over labelled trade requests and prints accuracy
+and latency for each model, e.g. the small tier (OLLAMA_SMALL_MODEL) against
+the response model (OLLAMA_MODEL).
+
+Usage: python scripts/model_tier_eval.py [model ...]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain_ollama import OllamaLLM  # noqa: E402
+
+from core.agents import trade_extractor  # noqa: E402
+from core.agents.agent_router import OLLAMA_MODEL, OLLAMA_SERVICE_URL, OLLAMA_SMALL_MODEL, PROMPTS  # noqa: E402
+
+# (request, expected symbol or None, action, quantity, amount)
+CASES = [
+    ("Invest $2500 in high growth tech", None, "buy", 0, 2500),
+    ("Sell 10 shares of my Apple stock", "AAPL", "sell", 10, 0),
+    ("put five grand into the nasdaq", "QQQ", "buy", 0, 5000),
+    ("get rid of 3 tesla shares", "TSLA", "sell", 3, 0),
+    ("I'd like to buy some microsoft, about 1000 dollars worth", "MSFT", "buy", 0, 1000),
+    ("buy 2 shares of AAPL and hold", "AAPL", "buy", 2, 0),
+    ("dump 4 shares of nvidia", "NVDA", "sell", 4, 0),
+    ("Put $750 into an S&P 500 index fund", "SPY", "buy", 0, 750),
+]
+
+
+def correct(extraction, expected) -> bool:
+    symbol, action, quantity, amount = expected
+    if extraction is None:
+        return False
+    symbol_ok = symbol is None or extraction.symbol == symbol
+    return (symbol_ok and extraction.action == action
+            and float(extraction.quantity) == quantity and float(extraction.amount) == amount)
+
+
+def evaluate(model: str):
+    llm = OllamaLLM(model=model, base_url=OLLAMA_SERVICE_URL, format="json", temperature=0,
+                    num_predict=trade_extractor.EXTRACTION_NUM_PREDICT)
+    template = PROMPTS.get("extraction_template", "{user_input}")
+    latencies, hits = [], 0
+    for text, *expected in CASES:
+        start = time.perf_counter()
+        response = llm.invoke(template.format(user_input=text), format=trade_extractor.TRADE_SCHEMA)
+        latencies.append(time.perf_counter() - start)
+        hits += correct(trade_extractor.parse_llm_extraction(response), expected)
+    print(f"{model:24s} accuracy {hits / len(CASES):6.1%}   "
+          f"median {statistics.median(latencies) * 1000:8.1f} ms   max {max(latencies) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    for model in sys.argv[1:] or [OLLAMA_SMALL_MODEL, OLLAMA_MODEL]:
+        evaluate(model)
@@ -0,0 +1,76 @@
+
+"""Compares Ollama prefill work per turn for the two prompt layouts.
+
+- flat: one completion prompt with the per-turn context in the system section
+  at the top (the previous generate_response layout)
+- chat: chat messages with a stable system prefix and the per-turn context on
+  the latest user message (the current layout)
+
+Prints prompt_eval_count (tokens actually prefilled, i.e. not reused from the
+KV cache) and prompt_eval_duration for each turn of a scripted conversation.
+
+Usage: OLLAMA_BASE_URL=http://localhost:11434 python scripts/prefill_benchmark.py
+"""
+import os
+
+import requests
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:14b")
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+NUM_PREDICT = 64
+
+SYSTEM = "You are IRIS, an advanced AI investment advisor. " * 20
+TURNS = [
+    ("How is the market doing today?", "[Market Setup]\nSPY: $512.30, 5-day: +1.2%"),
+    ("Should I add more NVDA?", "[Market Setup]\nNVDA: $905.10, 5-day: +4.8%\n## PORTFOLIO\nNVDA 12 shares"),
+    ("What about bonds instead?", "[Knowledge Base]\nBonds are becoming attractive again as yields stabilize."),
+    ("Summarize what we discussed.", ""),
+]
+
+
+def flat_turn(history: list, question: str, context: str) -> dict:
+    lines = [f"system: {SYSTEM}\n\nUse the following context to answer the user request:\n{context}"]
+    lines += [f"{role}: {content}" for role, content in history + [("human", question)]]
+    response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json={
+        "model": OLLAMA_MODEL, "prompt": "\n".join(lines), "stream": False, "keep_alive": KEEP_ALIVE,
+        "options": {"num_predict": NUM_PREDICT},
+    }, timeout=300)
+    response.raise_for_status()
+    data = response.json()
+    return {**data, "text": data["response"]}
+
+
+def chat_turn(history: list, question: str, context: str) -> dict:
+    roles = {"human": "user", "ai": "assistant"}
+    messages = [{"role": "system", "content": SYSTEM}]
+    messages += [{"role": roles[role], "content": content} for role, content in history]
+    latest = question
+    if context:
+        latest = f"Use the following context to answer the user request:\n{context}\n\nUser request: {question}"
+    messages.append({"role": "user", "content": latest})
+    response = requests.post(f"{OLLAMA_BASE_URL}/api/chat", json={
+        "model": OLLAMA_MODEL, "messages": messages, "stream": False, "keep_alive": KEEP_ALIVE,
+        "options": {"num_predict": NUM_PREDICT},
+    }, timeout=300)
+    response.raise_for_status()
+    data = response.json()
+    return {**data, "text": data["message"]["content"]}
+
+
+def run(layout: str, turn_fn):
+    history = []
+    total = 0.0
+    print(f"--- {layout} ---")
+    for i, (question, context) in enumerate(TURNS, 1):
+        data = turn_fn(history, question, context)
+        seconds = data.get("prompt_eval_duration", 0) / 1e9
+        total += seconds
+        print(f"turn {i}: prefilled {data.get('prompt_eval_count', 0):5d} tokens in {seconds * 1000:8.1f} ms")
+        history += [("human", question), ("ai", data["text"])]
+    print(f"total prefill: {total * 1000:.1f} ms\n")
+
+
+if __name__ == "__main__":
+    run("flat completion prompt (before)", flat_turn)
+    run("chat messages, stable prefix (after)", chat_turn)
@@ -339,3 +339,57 @@ func GetPortfolioHandler(c *gin.Context) {
 
 	c.JSON(http.StatusOK, response)
 }
+
+// GetBrokerAccountHandler returns the user's brokerage (Alpaca) account id without
+// building the portfolio: no holdings, quotes or broker sync. Used by the agent
+// router to resolve the account for trades. Responds with a null accountId when
+// the user has no account yet.
+func GetBrokerAccountHandler(c *gin.Context) {
+	userID := c.Param("userId")
+
+	rows, err := db.Query(`
+		SELECT p.type, b.name, b.display_name, a.alpaca_account_number, a.alpaca_account_id, p.iris_account_id
+		FROM portfolios p
+		JOIN accounts a ON p.account_id = a.id
+		LEFT JOIN brokers b ON p.broker_id = b.id
+		WHERE a.user_id = $1
+		ORDER BY b.display_name NULLS LAST, p.name
+	`, userID)
+	if err != nil {
+		log.Printf("Error looking up broker account: %v", err)
+		c.JSON(http.StatusInternalServerError, gin.H{"error": "Failed to look up account"})
+		return
+	}
+	defer rows.Close()
+
+	// Same selection as the portfolio's broker groups: the Alpaca / IRIS Core
+	// portfolio's account, else the first portfolio's account number
+	var accountID *string
+	first := true
+	for rows.Next() {
+		var portfolioType string
+		var brokerName, displayName, accountNumber, alpacaAccountID, irisAccountID sql.NullString
+		if err := rows.Scan(&portfolioType, &brokerName, &displayName, &accountNumber, &alpacaAccountID, &irisAccountID); err != nil {
+			log.Printf("Error scanning account row: %v", err)
+			continue
+		}
+		if brokerName.String == "alpaca" || displayName.String == "Alpaca Markets" || portfolioType == "IRIS Core" {
+			id := irisAccountID.String
+			if id == "" {
+				id = alpacaAccountID.String
+			}
+			if id == "" {
+				id = accountNumber.String
+			}
+			accountID = &id
+			break
+		}
+		if first && accountNumber.String != "" {
+			id := accountNumber.String
+			accountID = &id
+		}
+		first = false
+	}
+
+	c.JSON(http.StatusOK, gin.H{"userId": userID, "accountId": accountID})
+}
@@ -8,6 +8,7 @@ import (
 	"log"
 	"net/http"
 	"os"
+	"strconv"
 	"time"
 
 	"github.com/gin-gonic/gin" // For pq.Array()
@@ -243,7 +244,35 @@ func GetTransactionsHandler(c *gin.Context) {
 		return
 	}
 
-	rows, err := db.Query("SELECT symbol, type, shares, price, timestamp FROM transactions WHERE portfolio_id = $1 ORDER BY timestamp DESC LIMIT 10", portfolioID)
+	// Optional ?limit=N (default 10, max 1000), ?since=<RFC3339> for incremental fetches and
+	// ?before=<RFC3339> (inclusive, callers dedupe) to page back through the full history
+	limit := 10
+	if l, err := strconv.Atoi(c.Query("limit")); err == nil && l > 0 {
+		limit = l
+	}
+	if limit > 1000 {
+		limit = 1000
+	}
+
+	query := "SELECT symbol, type, shares, price, timestamp FROM transactions WHERE portfolio_id = $1"
+	args := []interface{}{portfolioID}
+	for _, bound := range []struct{ param, op string }{{"since", ">"}, {"before", "<="}} {
+		value := c.Query(bound.param)
+		if value == "" {
+			continue
+		}
+		boundTime, parseErr := time.Parse(time.RFC3339Nano, value)
+		if parseErr != nil {
+			c.JSON(http.StatusBadRequest, gin.H{"error": "Invalid " + bound.param + " timestamp, expected RFC3339"})
+			return
+		}
+		args = append(args, boundTime)
+		query += fmt.Sprintf(" AND timestamp %s $%d", bound.op, len(args))
+	}
+	args = append(args, limit)
+	query += fmt.Sprintf(" ORDER BY timestamp DESC LIMIT $%d", len(args))
+
+	rows, err := db.Query(query, args...)
 	if err != nil {
 		log.Printf("Error fetching transactions: %v", err)
 		c.JSON(http.StatusInternalServerError, gin.H{"error": "Failed to fetch transactions"})
@@ -425,6 +454,7 @@ func main() {
 
 		// Portfolio endpoints
 		v1.GET("/portfolio/:userId", GetPortfolioHandler)
+		v1.GET("/accounts/:userId/broker", GetBrokerAccountHandler) // Lightweight account lookup for trades
 		v1.GET("/transactions/:userId", GetTransactionsHandler)
 		v1.POST("/trade", ExecuteTradeHandler)
 
@@ -3,11 +3,13 @@ package main
 import (
 	"context"
 	"encoding/json" // Add for redis marshaling
+	"errors"
 	"fmt"
 	"iris-broker-service/pkg/alpaca"
 	"log"
 	"net/http"
 	"os"
+	"strings"
 	"sync"
 	"time"
 
@@ -59,6 +61,31 @@ func GetAssetHandler(c *gin.Context) {
 	c.JSON(http.StatusOK, asset)
 }
 
+// ListAssetsHandler returns all active US equity assets (cached for 1 hour)
+func ListAssetsHandler(c *gin.Context) {
+	cacheKey := "assets:us_equity"
+
+	// 1. Check Redis
+	val, err := redisClient.Get(ctx, cacheKey).Result()
+	if err == nil {
+		c.Data(http.StatusOK, "application/json; charset=utf-8", []byte(val))
+		return
+	}
+
+	// 2. Cache Miss - Fetch from Alpaca
+	assets, err := alpacaClient.ListAssets()
+	if err != nil {
+		c.JSON(http.StatusInternalServerError, gin.H{"error": "Failed to list assets: " + err.Error()})
+		return
+	}
+
+	// 3. Set Cache (1 hour) - tradability rarely changes intraday
+	aBytes, _ := json.Marshal(assets)
+	redisClient.Set(ctx, cacheKey, aBytes, time.Hour)
+
+	c.Data(http.StatusOK, "application/json; charset=utf-8", aBytes)
+}
+
 // GetQuoteHandler fetches cached quote
 func GetQuoteHandler(c *gin.Context) {
 	symbol := c.Param("symbol")
@@ -92,6 +119,68 @@ func GetQuoteHandler(c *gin.Context) {
 	c.JSON(http.StatusOK, q)
 }
 
+// maxQuoteSymbols bounds a multi-quote request (Alpaca accepts long symbol lists, we don't need them)
+const maxQuoteSymbols = 50
+
+// GetQuotesHandler fetches cached quotes for ?symbols=AAPL,MSFT,...
+// Cache hits are served from Redis; all misses are fetched in one Alpaca call.
+func GetQuotesHandler(c *gin.Context) {
+	var symbols []string
+	seen := map[string]bool{}
+	for _, s := range strings.Split(c.Query("symbols"), ",") {
+		s = strings.ToUpper(strings.TrimSpace(s))
+		if s != "" && !seen[s] {
+			seen[s] = true
+			symbols = append(symbols, s)
+		}
+	}
+	if len(symbols) == 0 || len(symbols) > maxQuoteSymbols {
+		c.JSON(http.StatusBadRequest, gin.H{"error": fmt.Sprintf("symbols must list 1-%d tickers", maxQuoteSymbols)})
+		return
+	}
+
+	quotes := make(map[string]alpaca.Quote, len(symbols))
+
+	// 1. Check Redis (one round trip)
+	keys := make([]string, len(symbols))
+	for i, s := range symbols {
+		keys[i] = "quote:" + s
+	}
+	var missing []string
+	vals, err := redisClient.MGet(ctx, keys...).Result()
+	for i, s := range symbols {
+		if err == nil && vals[i] != nil {
+			var q alpaca.Quote
+			if json.Unmarshal([]byte(vals[i].(string)), &q) == nil {
+				quotes[s] = q
+				continue
+			}
+		}
+		missing = append(missing, s)
+	}
+
+	// 2. Cache Misses - one multi-symbol Alpaca call
+	if len(missing) > 0 {
+		fetched, err := alpacaClient.GetQuotes(missing)
+		if err != nil {
+			c.JSON(http.StatusInternalServerError, gin.H{"error": "Failed to fetch quotes: " + err.Error()})
+			return
+		}
+
+		// 3. Set Cache (same 1 hour TTL as the single-quote endpoint)
+		pipe := redisClient.Pipeline()
+		for s, q := range fetched {
+			qBytes, _ := json.Marshal(q)
+			pipe.Set(ctx, "quote:"+s, qBytes, time.Hour)
+			quotes[s] = q
+		}
+		pipe.Exec(ctx)
+	}
+
+	// Unknown symbols are simply absent from the response
+	c.JSON(http.StatusOK, quotes)
+}
+
 func main() {
 	r := gin.Default()
 
@@ -107,7 +196,9 @@ func main() {
 		v1.POST("/funds", FundAccountHandler)
 
 		// New Endpoints
+		v1.GET("/assets", ListAssetsHandler)
 		v1.GET("/assets/:symbol", GetAssetHandler)
+		v1.GET("/quotes", GetQuotesHandler)
 		v1.GET("/quotes/:symbol", GetQuoteHandler)
 	}
 
@@ -121,12 +212,13 @@ func main() {
 }
 
 type TradeRequest struct {
-	AccountID   string          `json:"account_id"`
-	Symbol      string          `json:"symbol"`
-	Qty         decimal.Decimal `json:"qty"`
-	Side        string          `json:"side"` // "buy" or "sell"
-	Type        string          `json:"type"`
-	TimeInForce string          `json:"time_in_force"`
+	AccountID     string          `json:"account_id"`
+	Symbol        string          `json:"symbol"`
+	Qty           decimal.Decimal `json:"qty"`
+	Side          string          `json:"side"` // "buy" or "sell"
+	Type          string          `json:"type"`
+	TimeInForce   string          `json:"time_in_force"`
+	ClientOrderID string          `json:"client_order_id"` // Optional; makes retries of the same order safe
 }
 
 // BulkTradeRequest structure for worker pool processing
@@ -184,20 +276,26 @@ func ExecuteTradeHandler(c *gin.Context) {
 	}
 
 	trade := alpaca.TradeReq{
-		Symbol:      req.Symbol,
-		Qty:         req.Qty,
-		Side:        req.Side,
-		Type:        req.Type,
-		TimeInForce: req.TimeInForce,
+		Symbol:        req.Symbol,
+		Qty:           req.Qty,
+		Side:          req.Side,
+		Type:          req.Type,
+		TimeInForce:   req.TimeInForce,
+		ClientOrderID: req.ClientOrderID,
 	}
 
 	err := alpacaClient.SubmitOrderForAccount(req.AccountID, trade)
+	if errors.Is(err, alpaca.ErrDuplicateOrder) {
+		// A retry of an order that already went through: report it, don't place it again
+		c.JSON(http.StatusOK, gin.H{"status": "already_submitted", "symbol": req.Symbol, "side": req.Side, "client_order_id": req.ClientOrderID})
+		return
+	}
 	if err != nil {
 		c.JSON(http.StatusInternalServerError, gin.H{"error": err.Error()})
 		return
 	}
 
-	c.JSON(http.StatusOK, gin.H{"status": "submitted", "symbol": req.Symbol, "side": req.Side})
+	c.JSON(http.StatusOK, gin.H{"status": "submitted", "symbol": req.Symbol, "side": req.Side, "client_order_id": req.ClientOrderID})
 }
 
 // BulkExecuteHandler handles multiple trades using a worker pool
@@ -223,11 +321,12 @@ func BulkExecuteHandler(c *gin.Context) {
 			defer wg.Done()
 			for req := range jobs {
 				trade := alpaca.TradeReq{
-					Symbol:      req.Symbol,
-					Qty:         req.Qty,
-					Side:        req.Side,
-					Type:        "market", // Default to market for bulk
-					TimeInForce: "day",
+					Symbol:        req.Symbol,
+					Qty:           req.Qty,
+					Side:          req.Side,
+					Type:          "market", // Default to market for bulk
+					TimeInForce:   "day",
+					ClientOrderID: req.ClientOrderID,
 				}
 				err := alpacaClient.SubmitOrderForAccount(req.AccountID, trade)
 				if err != nil {
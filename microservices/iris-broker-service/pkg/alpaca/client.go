@@ -4,9 +4,12 @@ import (
 	"bytes"
 	"encoding/base64"
 	"encoding/json"
+	"errors"
 	"fmt"
 	"io"
 	"net/http"
+	"net/url"
+	"strings"
 	"time"
 
 	"github.com/shopspring/decimal"
@@ -181,13 +184,17 @@ func (c *Client) CreateAccount(req CreateAccountReq) (*AccountResp, error) {
 }
 
 type TradeReq struct {
-	Symbol      string          `json:"symbol"`
-	Qty         decimal.Decimal `json:"qty"`
-	Side        string          `json:"side"`          // "buy" or "sell"
-	Type        string          `json:"type"`          // "market" or "limit"
-	TimeInForce string          `json:"time_in_force"` // "day", "gtc"
+	Symbol        string          `json:"symbol"`
+	Qty           decimal.Decimal `json:"qty"`
+	Side          string          `json:"side"`                      // "buy" or "sell"
+	Type          string          `json:"type"`                      // "market" or "limit"
+	TimeInForce   string          `json:"time_in_force"`             // "day", "gtc"
+	ClientOrderID string          `json:"client_order_id,omitempty"` // Idempotency key: Alpaca rejects a reused ID
 }
 
+// ErrDuplicateOrder means an order with the same client_order_id was already placed
+var ErrDuplicateOrder = errors.New("order with this client_order_id already exists")
+
 // SubmitOrderForAccount places a trade for a specific user ID
 func (c *Client) SubmitOrderForAccount(accountID string, trade TradeReq) error {
 	// URL pattern: /trading/accounts/{account_id}/orders
@@ -201,6 +208,9 @@ func (c *Client) SubmitOrderForAccount(accountID string, trade TradeReq) error {
 
 	if resp.StatusCode != 200 && resp.StatusCode != 201 {
 		body, _ := io.ReadAll(resp.Body)
+		if trade.ClientOrderID != "" && resp.StatusCode == 422 && strings.Contains(string(body), "client_order_id") {
+			return ErrDuplicateOrder
+		}
 		return fmt.Errorf("failed to place order, status: %d, body: %s", resp.StatusCode, string(body))
 	}
 	return nil
@@ -329,6 +339,26 @@ func (c *Client) GetAsset(symbol string) (*Asset, error) {
 	return &asset, nil
 }
 
+// ListAssets returns all active US equity assets (used for bulk tradability preloads)
+func (c *Client) ListAssets() ([]Asset, error) {
+	resp, err := c.doRequest("GET", "/assets?status=active&asset_class=us_equity", nil)
+	if err != nil {
+		return nil, err
+	}
+	defer resp.Body.Close()
+
+	if resp.StatusCode != 200 {
+		body, _ := io.ReadAll(resp.Body)
+		return nil, fmt.Errorf("failed to list assets, status: %d, body: %s", resp.StatusCode, string(body))
+	}
+
+	var assets []Asset
+	if err := json.NewDecoder(resp.Body).Decode(&assets); err != nil {
+		return nil, err
+	}
+	return assets, nil
+}
+
 // Quote represents a market quote
 type Quote struct {
 	Symbol    string    `json:"symbol"`
@@ -383,3 +413,42 @@ func (c *Client) GetQuote(symbol string) (*Quote, error) {
 
 	return &q, nil
 }
+
+// GetQuotes returns the latest IEX quotes for several symbols in one Data API call
+func (c *Client) GetQuotes(symbols []string) (map[string]Quote, error) {
+	// Endpoint: /v2/stocks/quotes/latest?symbols=AAPL,MSFT&feed=iex
+	endpoint := fmt.Sprintf("%s/stocks/quotes/latest?symbols=%s&feed=iex", c.dataURL, url.QueryEscape(strings.Join(symbols, ",")))
+
+	req, err := http.NewRequest("GET", endpoint, nil)
+	if err != nil {
+		return nil, err
+	}
+
+	req.Header.Add("APCA-API-KEY-ID", c.apiKey)
+	req.Header.Add("APCA-API-SECRET-KEY", c.apiSecret)
+
+	resp, err := c.httpClient.Do(req)
+	if err != nil {
+		return nil, err
+	}
+	defer resp.Body.Close()
+
+	if resp.StatusCode != 200 {
+		body, _ := io.ReadAll(resp.Body)
+		return nil, fmt.Errorf("Data API Error (%d): %s", resp.StatusCode, string(body))
+	}
+
+	// Response format V2: { "quotes": { "AAPL": { "ap": ..., "bp": ..., "t": ... }, ... } }
+	var result struct {
+		Quotes map[string]Quote `json:"quotes"`
+	}
+	if err := json.NewDecoder(resp.Body).Decode(&result); err != nil {
+		return nil, err
+	}
+
+	for symbol, q := range result.Quotes {
+		q.Symbol = symbol
+		result.Quotes[symbol] = q
+	}
+	return result.Quotes, nil
+}